@@ -0,0 +1,49 @@
+"""Benchmark: process import time and first-greeting latency.
+
+Each sample runs in a fresh interpreter so module imports are cold.
+Run with `python -m benchmarks.bench_cold_start [samples]`.
+"""
+import sys
+import os
+import json
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from src.main import BancoAgilApp
+imported = time.perf_counter()
+app = BancoAgilApp()
+asyncio.run(app.start_conversation())
+greeted = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "greeting_ms": (greeted - imported) * 1000,
+    "total_ms": (greeted - start) * 1000,
+    "providers_loaded": sorted(m for m in ("google.generativeai", "langchain_openai") if m in sys.modules)
+}))
+"""
+
+
+def run_sample() -> dict:
+    """Run one cold start in a subprocess."""
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", SAMPLE],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(samples: int = 5) -> None:
+    """Print median cold-start timings over `samples` runs."""
+    results = [run_sample() for _ in range(samples)]
+    for key in ("import_ms", "greeting_ms", "total_ms"):
+        print(f"{key}: {statistics.median(r[key] for r in results):.1f}")
+    print(f"providers loaded before first reply: {results[-1]['providers_loaded']}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
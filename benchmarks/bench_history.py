@@ -0,0 +1,44 @@
+"""Benchmark: conversation summary time and history memory as conversations grow.
+
+Run with `python -m benchmarks.bench_history [messages ...]`.
+"""
+import sys
+import os
+import time
+import tempfile
+import tracemalloc
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import BancoAgilApp
+
+
+def build_app(messages: int, transcript_dir: str) -> BancoAgilApp:
+    """An app that has exchanged `messages` short messages."""
+    app = BancoAgilApp(transcript_dir=transcript_dir)
+    for i in range(messages):
+        app._add_to_history("user" if i % 2 == 0 else "assistant", f"mensagem número {i} da conversa")
+    return app
+
+
+def main(sizes=(100, 1000, 10000)) -> None:
+    """Print summary latency and retained history memory per conversation size."""
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            tracemalloc.start()
+            app = build_app(size, directory)
+            retained = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            timings = []
+            for _ in range(1000):
+                start = time.perf_counter()
+                app.get_conversation_summary()
+                timings.append(time.perf_counter() - start)
+            print(f"messages: {size:>6}, in memory: {len(app.conversation_history):>4}, "
+                  f"retained: {retained / 1024:.1f} KiB, summary: {statistics.median(timings) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or (100, 1000, 10000))
@@ -0,0 +1,66 @@
+"""Benchmark: prompt build time and size as the conversation grows.
+
+Compares the previous unbounded `+=` assembly with PromptBuilder (default
+budget), for the first call and for a follow-up call one turn later.
+Run with `python -m benchmarks.bench_prompt [messages ...]`.
+"""
+import sys
+import os
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from src.utils.prompt_builder import PromptBuilder, estimate_tokens
+
+
+def concat_prompt(messages) -> str:
+    """The previous GoogleGeminiWrapper._build_prompt."""
+    prompt = ""
+    for msg in messages:
+        if isinstance(msg, HumanMessage):
+            prompt += f"User: {msg.content}\n"
+        elif isinstance(msg, AIMessage):
+            prompt += f"Assistant: {msg.content}\n"
+        else:
+            prompt += f"{msg.content}\n"
+    return prompt
+
+
+def build_chat(size: int):
+    """An instruction message followed by `size` chat turns."""
+    messages = [SystemMessage(content="Você é um agente de crédito bancário do Banco Ágil.")]
+    for i in range(size):
+        text = f"mensagem {i}: quero entender como funciona o limite de crédito e o score"
+        messages.append(HumanMessage(content=text) if i % 2 == 0 else AIMessage(content=text))
+    return messages
+
+
+def time_us(func, samples: int = 50) -> float:
+    """Median time of `func()` in microseconds."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main(sizes=(10, 100, 1000, 10000)) -> None:
+    """Print build time and estimated tokens per history size."""
+    for size in sizes:
+        messages = build_chat(size)
+        follow_up = messages + [HumanMessage(content="e qual é o meu limite agora?")]
+        builder = PromptBuilder()
+        builder.build(messages)  # warms the summary cache, as the previous turn would
+
+        old_tokens = estimate_tokens(concat_prompt(follow_up))
+        new_tokens = estimate_tokens(builder.build(follow_up))
+        print(f"messages: {size:>6} | concat: {time_us(lambda: concat_prompt(follow_up)):>8.1f} us "
+              f"{old_tokens:>7} tokens | builder: {time_us(lambda: builder.build(follow_up)):>8.1f} us "
+              f"{new_tokens:>5} tokens")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or (10, 100, 1000, 10000))
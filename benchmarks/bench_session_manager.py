@@ -0,0 +1,49 @@
+"""Benchmark: many concurrent conversations in one SessionManager.
+
+Every session is greeted, logs in and asks for its credit limit (no LLM
+calls), all sessions interleaved on one event loop.
+Run with `python -m benchmarks.bench_session_manager [sessions]`.
+"""
+import sys
+import os
+import time
+import asyncio
+import resource
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.session_manager import SessionManager
+
+CONVERSATION = ["12345678901", "1990-05-15", "qual é o meu limite?"]
+
+
+async def converse(manager: SessionManager) -> None:
+    session_id, _ = await manager.start_conversation()
+    for message in CONVERSATION:
+        await manager.handle_message(session_id, message)
+
+
+async def run(manager: SessionManager, sessions: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(converse(manager) for _ in range(sessions)))
+    return time.perf_counter() - start
+
+
+def main(sessions: int = 20000) -> None:
+    """Hold `sessions` live conversations and print throughput and memory."""
+    manager = SessionManager()
+    manager.warm_up()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    elapsed = asyncio.run(run(manager, sessions))
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    stats = manager.get_stats()
+
+    messages = sessions * (len(CONVERSATION) + 1)
+    print(f"sessions: {sessions} (live: {stats['active']}, evicted: {stats['evicted_lru'] + stats['evicted_idle']})")
+    print(f"wall time: {elapsed:.2f} s, {messages / elapsed:,.0f} messages/s")
+    print(f"peak RSS growth: {(rss_after - rss_before) / 1024:.1f} MiB")
+    print(f"estimated session memory: {stats['estimated_bytes'] / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
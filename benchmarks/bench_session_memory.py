@@ -0,0 +1,54 @@
+"""Benchmark: memory held per conversation and sessions per GB.
+
+Each session is greeted, authenticated and has visited every agent, then
+kept alive; tracemalloc measures what the live sessions retain.
+Run with `python -m benchmarks.bench_session_memory [sessions]`.
+"""
+import sys
+import os
+import asyncio
+import gc
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import BancoAgilApp
+
+AGENTS = ("triage_agent", "credit_agent", "interview_agent", "exchange_agent")
+
+
+async def open_session() -> BancoAgilApp:
+    """A logged-in session that has reached every agent."""
+    app = BancoAgilApp()
+    await app.start_conversation()
+    await app.process_user_input("12345678901")
+    await app.process_user_input("1990-05-15")
+    for name in AGENTS:
+        getattr(app.router, name)
+    return app
+
+
+async def open_sessions(count: int) -> list:
+    return [await open_session() for _ in range(count)]
+
+
+def main(sessions: int = 1000) -> None:
+    """Open `sessions` conversations and print the memory they retain."""
+    asyncio.run(open_sessions(1))  # imports, CSV index and LLM clients are one-off costs
+
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    apps = asyncio.run(open_sessions(sessions))
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    per_session = retained / len(apps)
+    print(f"sessions: {sessions}")
+    print(f"memory per session: {per_session / 1024:.1f} KiB")
+    print(f"sessions per GB: {2 ** 30 / per_session:,.0f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,31 @@
+"""Benchmark: time to build a new BancoAgilApp session.
+
+Run with `python -m benchmarks.bench_session_startup [sessions]`.
+"""
+import sys
+import os
+import time
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import BancoAgilApp
+
+
+def main(sessions: int = 200) -> None:
+    """Build `sessions` apps and print construction time statistics."""
+    timings = []
+    apps = []
+    for _ in range(sessions):
+        start = time.perf_counter()
+        apps.append(BancoAgilApp())
+        timings.append((time.perf_counter() - start) * 1000)
+
+    print(f"sessions: {sessions}")
+    print(f"first session: {timings[0]:.3f} ms")
+    print(f"median session: {statistics.median(timings):.3f} ms")
+    print(f"p95 session: {sorted(timings)[int(len(timings) * 0.95) - 1]:.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
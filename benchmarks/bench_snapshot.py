@@ -0,0 +1,66 @@
+"""Benchmark: snapshot size and snapshot+restore time for a typical session.
+
+A typical session is logged in and has exchanged `turns` messages.
+Run with `python -m benchmarks.bench_snapshot [turns] [samples]`.
+"""
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.main import BancoAgilApp
+from src.snapshot_store import FileSnapshotStore, SQLiteSnapshotStore
+
+
+def build_app(turns: int) -> BancoAgilApp:
+    """An authenticated session with `turns` extra user messages."""
+    app = BancoAgilApp()
+
+    async def scenario():
+        await app.start_conversation()
+        await app.process_user_input("12345678901")
+        await app.process_user_input("1990-05-15")
+        for _ in range(turns):
+            await app.process_user_input("qual é o meu limite?")
+
+    asyncio.run(scenario())
+    return app
+
+
+def time_us(func, samples: int) -> float:
+    """Median time of `func()` in microseconds."""
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def main(turns: int = 5, samples: int = 1000) -> None:
+    """Print snapshot size and median timings, in memory and through each store."""
+    app = build_app(turns)
+    snapshot = app.snapshot()
+    print(f"messages: {len(app.conversation_history)}, snapshot: {len(snapshot)} bytes")
+    print(f"snapshot+restore: {time_us(lambda: BancoAgilApp.restore(app.snapshot()), samples):.1f} us")
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            "file": FileSnapshotStore(os.path.join(directory, "sessions")),
+            "sqlite": SQLiteSnapshotStore(os.path.join(directory, "sessions.db")),
+        }
+        for name, store in stores.items():
+            def round_trip():
+                store.save("bench", app.snapshot())
+                BancoAgilApp.restore(store.load("bench"))
+            print(f"{name} store save+load+restore: {time_us(round_trip, samples):.1f} us")
+        stores["sqlite"].close()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*args)
@@ -0,0 +1,84 @@
+"""Benchmark: time to first token vs full response for a free-form credit reply.
+
+Uses a simulated Gemini model (0.3 s before the first chunk, then 20 chunks
+40 ms apart) unless `--live` is given with GOOGLE_API_KEY set.
+Run with `python -m benchmarks.bench_streaming [samples] [--live]`.
+"""
+import sys
+import os
+import time
+import asyncio
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents.base_agent import GoogleGeminiWrapper, get_llm_client
+from src.main import BancoAgilApp
+
+MESSAGE = "como funciona o crédito rotativo?"
+
+
+class SimulatedGenerativeModel:
+    """genai.GenerativeModel stand-in with Gemini-like streaming latency."""
+
+    def __init__(self, first_chunk: float = 0.3, chunks: int = 20, chunk_interval: float = 0.04):
+        self.first_chunk = first_chunk
+        self.chunks = chunks
+        self.chunk_interval = chunk_interval
+
+    def _chunks(self):
+        time.sleep(self.first_chunk)
+        for i in range(self.chunks):
+            if i:
+                time.sleep(self.chunk_interval)
+            yield type("Chunk", (), {"text": f"parte {i} "})()
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if stream:
+            return self._chunks()
+        text = "".join(chunk.text for chunk in self._chunks())
+        return type("Result", (), {"text": text})()
+
+
+def build_app(live: bool) -> BancoAgilApp:
+    """An authenticated session whose Credit Agent answers MESSAGE with the LLM."""
+    app = BancoAgilApp()
+    app.is_active = True
+    app.router.authenticated_cpf = "12345678901"
+    if live:
+        app.router.credit_agent.llm = get_llm_client("google")
+    else:
+        wrapper = GoogleGeminiWrapper(model="gemini-1.5-flash", api_key="test")
+        wrapper.model = SimulatedGenerativeModel()
+        app.router.credit_agent.llm = wrapper
+    return app
+
+
+async def measure(app: BancoAgilApp) -> dict:
+    """Time one blocking reply and one streamed reply."""
+    start = time.perf_counter()
+    await app.process_user_input(MESSAGE)
+    blocking = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = None
+    async for _ in app.process_user_input_stream(MESSAGE):
+        if first is None:
+            first = time.perf_counter() - start
+    streamed = time.perf_counter() - start
+
+    return {"full_response_ms": blocking * 1000, "ttft_ms": first * 1000, "stream_total_ms": streamed * 1000}
+
+
+def main(samples: int = 5, live: bool = False) -> None:
+    """Print median timings over `samples` replies."""
+    app = build_app(live)
+    results = [asyncio.run(measure(app)) for _ in range(samples)]
+    print(f"model: {'live gemini' if live else 'simulated'}, samples: {samples}")
+    for key in ("full_response_ms", "ttft_ms", "stream_total_ms"):
+        print(f"{key}: {statistics.median(r[key] for r in results):.1f}")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--live"]
+    main(int(args[0]) if args else 5, live="--live" in sys.argv)
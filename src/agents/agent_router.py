@@ -1,10 +1,12 @@
 """Agent Router - Routes requests between specialized agents."""
-from typing import Optional, Dict, Any, Tuple
+import importlib
+import threading
+from typing import Optional, Dict, Any, AsyncIterator
 from enum import Enum
-from src.agents.triage_agent import TriageAgent
-from src.agents.credit_agent import CreditAgent
-from src.agents.credit_interview_agent import CreditInterviewAgent
-from src.agents.exchange_agent import ExchangeAgent
+from src.agents.base_agent import BaseAgent
+from src.agents.session_state import SessionState
+from src.tools.intent_tools import intent_matcher
+from src.utils.text_utils import parse_brl_amount
 
 
 class AgentType(Enum):
@@ -14,16 +16,110 @@ class AgentType(Enum):
     EXCHANGE = "exchange"
 
 
+# Agent classes by type, imported only when the router first needs them
+AGENT_CLASSES = {
+    AgentType.TRIAGE: ("src.agents.triage_agent", "TriageAgent"),
+    AgentType.CREDIT: ("src.agents.credit_agent", "CreditAgent"),
+    AgentType.INTERVIEW: ("src.agents.credit_interview_agent", "CreditInterviewAgent"),
+    AgentType.EXCHANGE: ("src.agents.exchange_agent", "ExchangeAgent"),
+}
+
+
+CLARIFICATION_MESSAGE = """Desculpe, não entendi direito. Como posso ajudá-lo?
+
+Posso:
+- Consultar ou solicitar aumento de limite de crédito
+- Fornecer cotações de moedas
+- Realizar uma entrevista para atualizar seu score de crédito
+
+O que você gostaria de fazer?"""
+
+# Specialist agent for each routing category
+CATEGORY_AGENTS = {
+    "CREDITO": AgentType.CREDIT,
+    "CAMBIO": AgentType.EXCHANGE,
+    "ENTREVISTA": AgentType.INTERVIEW,
+}
+
+
+# Agents shared by every session, built the first time a message is dispatched to them
+_shared_agents: Dict[AgentType, BaseAgent] = {}
+_shared_agents_lock = threading.Lock()
+
+
+def get_shared_agent(agent_type: AgentType) -> BaseAgent:
+    """Get the process-wide agent for a type, building it on first use."""
+    agent = _shared_agents.get(agent_type)
+    if agent is not None:
+        return agent
+
+    with _shared_agents_lock:
+        agent = _shared_agents.get(agent_type)
+        if agent is None:
+            module_name, class_name = AGENT_CLASSES[agent_type]
+            agent_class = getattr(importlib.import_module(module_name), class_name)
+            agent = agent_class()
+            _shared_agents[agent_type] = agent
+        return agent
+
+
+def clear_shared_agents() -> None:
+    """Forget the shared agents (e.g. after changing LLM configuration)."""
+    with _shared_agents_lock:
+        _shared_agents.clear()
+
+
 class AgentRouter:
-    def __init__(self):
-        self.triage_agent = TriageAgent()
-        self.credit_agent = CreditAgent()
-        self.interview_agent = CreditInterviewAgent()
-        self.exchange_agent = ExchangeAgent()
-        
-        self.current_agent: Optional[AgentType] = None
-        self.authenticated_cpf: Optional[str] = None
-        self.conversation_state: Dict[str, Any] = {}
+    """Routes one conversation's messages to the shared agents, carrying its SessionState."""
+    
+    __slots__ = ("state",)
+    
+    def __init__(self, state: Optional[SessionState] = None):
+        self.state = state if state is not None else SessionState()
+    
+    @property
+    def current_agent(self) -> Optional[AgentType]:
+        return self.state.current_agent
+    
+    @current_agent.setter
+    def current_agent(self, agent_type: Optional[AgentType]) -> None:
+        self.state.current_agent = agent_type
+    
+    @property
+    def authenticated_cpf(self) -> Optional[str]:
+        return self.state.authenticated_cpf
+    
+    @authenticated_cpf.setter
+    def authenticated_cpf(self, cpf: Optional[str]) -> None:
+        self.state.authenticated_cpf = cpf
+    
+    @property
+    def conversation_state(self) -> Dict[str, Any]:
+        return self.state.conversation_state
+    
+    @conversation_state.setter
+    def conversation_state(self, conversation_state: Dict[str, Any]) -> None:
+        self.state.conversation_state = conversation_state
+    
+    def get_agent(self, agent_type: AgentType) -> BaseAgent:
+        """Get the shared agent for a type."""
+        return get_shared_agent(agent_type)
+    
+    @property
+    def triage_agent(self):
+        return self.get_agent(AgentType.TRIAGE)
+    
+    @property
+    def credit_agent(self):
+        return self.get_agent(AgentType.CREDIT)
+    
+    @property
+    def interview_agent(self):
+        return self.get_agent(AgentType.INTERVIEW)
+    
+    @property
+    def exchange_agent(self):
+        return self.get_agent(AgentType.EXCHANGE)
     
     async def process_message(self, user_message: str) -> str:
         # Start with triage if not authenticated
@@ -38,7 +134,7 @@ class AgentRouter:
         # First time - show greeting and ask for CPF
         if self.current_agent != AgentType.TRIAGE:
             self.current_agent = AgentType.TRIAGE
-            greeting = await self.triage_agent.start_greeting()
+            greeting = await self.triage_agent.start_greeting(self.state)
             self.conversation_state["auth_step"] = "awaiting_cpf"
             return greeting + "\n\nPara começar, preciso verificar algumas informações. Qual é o seu CPF? (11 dígitos)"
 
@@ -54,7 +150,7 @@ class AgentRouter:
             birth_date = user_message.strip()
 
             # Attempt authentication
-            success, auth_message = self.triage_agent.authenticate_with_credentials(cpf, birth_date)
+            success, auth_message = self.triage_agent.authenticate_with_credentials(cpf, birth_date, self.state)
 
             if success:
                 self.authenticated_cpf = cpf
@@ -62,7 +158,7 @@ class AgentRouter:
                 return auth_message + "\n\nComo posso ajudá-lo?"
 
             # Failed authentication
-            if self.triage_agent.has_max_attempts_exceeded():
+            if self.triage_agent.has_max_attempts_exceeded(self.state):
                 self.reset()
                 return auth_message
 
@@ -72,47 +168,68 @@ class AgentRouter:
 
         return "Desculpe, algo deu errado. Vamos começar novamente. Qual é o seu CPF?"
     
+    async def _route(self, user_message: str) -> Optional[str]:
+        """
+        Pick the routing category for an authenticated user message.
+        Keywords decide first, in priority order; messages without any go to
+        the agent waiting for an answer, or else through the Triage Agent's
+        tiered classifier (trained model, then LLM).
+        """
+        intent = intent_matcher.match(user_message)
+        if intent is not None:
+            return intent[0]
+        
+        # Amounts and confirmations answer the Credit Agent's questions about the new limit
+        if self.current_agent == AgentType.CREDIT and (
+                self.state.get_context("pending_limit") is not None or parse_brl_amount(user_message) is not None):
+            return "CREDITO"
+        
+        # Answers to the interview's questions
+        if self.current_agent == AgentType.INTERVIEW and self.state.interview_step > 0:
+            return "ENTREVISTA"
+        
+        return await self.triage_agent.classify_intent(user_message, self.state)
+    
     async def route_authenticated_message(self, user_message: str) -> str:
         """Route authenticated user message to appropriate agent."""
-        user_msg_lower = user_message.lower()
-        
+        return await self._dispatch(await self._route(user_message), user_message)
+    
+    async def _dispatch(self, category: Optional[str], user_message: str) -> str:
+        """Hand a routed message to its agent."""
         # Check for farewell
-        if any(word in user_msg_lower for word in ["encerrar", "sair", "fim", "adeus", "tchau"]):
+        if category == "ENCERRAMENTO":
             self.reset()
             return "Obrigado pela preferência no Banco Ágil. Até logo!"
         
-        # Check for credit operations
-        if any(word in user_msg_lower for word in ["crédito", "limite", "aumento", "solicitação", "limite de crédito"]):
-            self.current_agent = AgentType.CREDIT
-            return await self.credit_agent.handle_request(user_message, self.authenticated_cpf)
+        # Credit, exchange and interview operations
+        agent_type = CATEGORY_AGENTS.get(category)
+        if agent_type is not None:
+            self.current_agent = agent_type
+            return await self.get_agent(agent_type).handle_request(user_message, self.state)
         
-        # Check for exchange operations
-        if any(word in user_msg_lower for word in ["câmbio", "cotação", "dólar", "euro", "moeda", "estrangeira"]):
-            self.current_agent = AgentType.EXCHANGE
-            return await self.exchange_agent.handle_request(user_message)
+        # Default: ask for clarification
+        return CLARIFICATION_MESSAGE
+    
+    async def process_message_stream(self, user_message: str) -> AsyncIterator[str]:
+        """Like process_message, yielding the reply in chunks as agents stream it."""
+        if not self.authenticated_cpf:
+            yield await self.handle_triage(user_message)
+            return
         
-        # Check for interview
-        if any(word in user_msg_lower for word in ["entrevista", "score", "análise financeira", "re-análise"]):
-            self.current_agent = AgentType.INTERVIEW
-            return await self.interview_agent.handle_request(user_message, self.authenticated_cpf)
+        category = await self._route(user_message)
+        agent_type = CATEGORY_AGENTS.get(category)
+        if agent_type is None:
+            yield await self._dispatch(category, user_message)
+            return
         
-        # Default: ask for clarification
-        return """Desculpe, não entendi direito. Como posso ajudá-lo?
-
-Posso:
-- Consultar ou solicitar aumento de limite de crédito
-- Fornecer cotações de moedas
-- Realizar uma entrevista para atualizar seu score de crédito
-
-O que você gostaria de fazer?"""
+        self.current_agent = agent_type
+        agent = self.get_agent(agent_type)
+        async for chunk in agent.handle_request_stream(user_message, self.state):
+            yield chunk
     
     def reset(self) -> None:
         """Reset router state (used for logout)."""
-        self.current_agent = None
-        self.authenticated_cpf = None
-        self.conversation_state = {}
-        self.triage_agent.authenticated = False
-        self.triage_agent.auth_attempts = 0
+        self.state.reset()
     
     def is_authenticated(self) -> bool:
         """Check if user is authenticated."""
@@ -1,98 +1,246 @@
 """Base agent class for all specialized agents."""
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
-import google.generativeai as genai
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
-from src.utils.config import OPENAI_API_KEY, GOOGLE_API_KEY, LLM_MODEL, LLM_PROVIDER
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator, Callable
+from langchain_core.messages import BaseMessage
+from src.utils.config import (
+    OPENAI_API_KEY,
+    GOOGLE_API_KEY,
+    LLM_MODEL,
+    LLM_PROVIDER,
+    LLM_MAX_CONCURRENCY
+)
+from src.utils.llm_cache import llm_cache, make_cache_key
+from src.utils.prompt_builder import PromptBuilder
+from src.agents.session_state import SessionState
+
+
+# Bounded pool for LLM clients without native async, shared by all agents
+_llm_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+
+
+async def run_blocking_llm_call(func, *args):
+    """Run a blocking LLM call on the shared pool without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_llm_executor, func, *args)
+
+
+async def stream_blocking_llm_call(func, *args) -> AsyncIterator[str]:
+    """
+    Iterate a blocking LLM stream on the shared pool, yielding chunks as they arrive.
+    If the consumer stops early (error, aclose, Streamlit rerun), the producer
+    stops at the next chunk and is awaited, so no pool thread keeps generating.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def produce():
+        chunks = func(*args)
+        try:
+            for chunk in chunks:
+                if cancelled.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, ("chunk", chunk))
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            loop.call_soon_threadsafe(queue.put_nowait, ("done", None))
+
+    producer = loop.run_in_executor(_llm_executor, produce)
+    try:
+        while True:
+            kind, value = await queue.get()
+            if kind == "done":
+                break
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        cancelled.set()
+        await producer
+
+
+class LLMResponse:
+    """Response object that mimics langchain's AIMessage."""
+
+    def __init__(self, text: str, prompt_stats: Optional[Dict[str, Any]] = None):
+        self.content = text
+        self.prompt_stats = prompt_stats  # size of the prompt sent for this reply, if known
 
 
 class GoogleGeminiWrapper:
     """Wrapper for Google Gemini API that mimics langchain interface."""
 
     def __init__(self, model: str, api_key: str, temperature: float = 0.7):
+        # Imported here so the SDK only loads when Gemini is actually used
+        import google.generativeai as genai
+
         genai.configure(api_key=api_key)
+        self.genai = genai
         self.model = genai.GenerativeModel(model)
         self.temperature = temperature
+        self.prompt_builder = PromptBuilder()
+
+    def _build_prompt(self, messages: List[BaseMessage]) -> str:
+        """Convert langchain messages to text within the prompt token budget."""
+        return self.prompt_builder.build(messages)
 
-    def invoke(self, messages: List[BaseMessage]):
-        """Invoke the model with messages."""
-        # Convert langchain messages to text
-        prompt = ""
-        for msg in messages:
-            if isinstance(msg, HumanMessage):
-                prompt += f"User: {msg.content}\n"
-            elif isinstance(msg, AIMessage):
-                prompt += f"Assistant: {msg.content}\n"
-            else:
-                prompt += f"{msg.content}\n"
-
-        # Generate response
+    def invoke(self, messages: List[BaseMessage]) -> LLMResponse:
+        """Invoke the model with messages; the response carries the size of the prompt sent."""
+        prompt, prompt_stats = self.prompt_builder.build_with_stats(messages)
         response = self.model.generate_content(
             prompt,
-            generation_config=genai.types.GenerationConfig(
+            generation_config=self.genai.types.GenerationConfig(
                 temperature=self.temperature,
             )
         )
 
-        # Create a response object that mimics langchain
-        class Response:
-            def __init__(self, text):
-                self.content = text
+        return LLMResponse(response.text, prompt_stats)
 
-        return Response(response.text)
+    def stream(self, messages: List[BaseMessage]):
+        """Invoke the model in stream mode, yielding text chunks as they are generated."""
+        response = self.model.generate_content(
+            self._build_prompt(messages),
+            generation_config=self.genai.types.GenerationConfig(
+                temperature=self.temperature,
+            ),
+            stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def ainvoke(self, messages: List[BaseMessage]) -> LLMResponse:
+        """
+        Invoke the model without blocking the event loop.
+        generate_content_async keeps a gRPC channel bound to the first event
+        loop, which breaks callers that run one loop per request (asyncio.run
+        in scripts and tests), so the blocking call is offloaded to the shared pool.
+        """
+        return await run_blocking_llm_call(self.invoke, messages)
+
+    async def astream(self, messages: List[BaseMessage]) -> AsyncIterator[str]:
+        """Stream text chunks without blocking the event loop (see ainvoke)."""
+        async for chunk in stream_blocking_llm_call(self.stream, messages):
+            yield chunk
+
+
+# Process-wide LLM clients keyed by (provider, model, temperature)
+_llm_clients: Dict[Tuple[str, str, float], Any] = {}
+_llm_clients_lock = threading.Lock()
+
+
+def get_llm_client(provider: str = LLM_PROVIDER, model: str = LLM_MODEL, temperature: float = 0.7):
+    """
+    Get the shared LLM client for a configuration, creating it on first use.
+    All agents and sessions share the same client and its HTTP connections.
+    """
+    key = (provider, model, temperature)
+    client = _llm_clients.get(key)
+    if client is not None:
+        return client
+
+    with _llm_clients_lock:
+        client = _llm_clients.get(key)
+        if client is None:
+            if provider == "google":
+                # Use custom Google Gemini wrapper
+                client = GoogleGeminiWrapper(
+                    model=model,
+                    api_key=GOOGLE_API_KEY,
+                    temperature=temperature
+                )
+            else:  # default to openai
+                from langchain_openai import ChatOpenAI
+
+                client = ChatOpenAI(
+                    model=model,
+                    api_key=OPENAI_API_KEY,
+                    temperature=temperature
+                )
+            _llm_clients[key] = client
+        return client
+
+
+def clear_llm_clients() -> None:
+    """Forget shared LLM clients (e.g. after changing API keys)."""
+    with _llm_clients_lock:
+        _llm_clients.clear()
 
 
 class BaseAgent(ABC):
-    """Base class for all banking agents."""
+    """
+    Base class for all banking agents.
+    Agents are shared by every session: per-conversation data lives in the
+    SessionState passed to handle_request, never on the agent.
+    """
 
-    def __init__(self, agent_name: str, agent_role: str):
+    def __init__(self, agent_name: str, agent_role: str, temperature: float = 0.7):
         """Initialize base agent."""
         self.agent_name = agent_name
         self.agent_role = agent_role
 
-        # Choose LLM provider based on configuration
-        if LLM_PROVIDER == "google":
-            # Use custom Google Gemini wrapper
-            self.llm = GoogleGeminiWrapper(
-                model=LLM_MODEL,
-                api_key=GOOGLE_API_KEY,
-                temperature=0.7
-            )
-        else:  # default to openai
-            self.llm = ChatOpenAI(
-                model=LLM_MODEL,
-                api_key=OPENAI_API_KEY,
-                temperature=0.7
-            )
-
-        self.context: Dict[str, Any] = {}
-        self.conversation_history: List[BaseMessage] = []
+        # Shared client for the configured provider, resolved on first use
+        self.llm_config = (LLM_PROVIDER, LLM_MODEL, temperature)
+        self._llm = None
+
+    @property
+    def llm(self):
+        """LLM client, taken from the shared registry the first time it is needed."""
+        if self._llm is None:
+            self._llm = get_llm_client(*self.llm_config)
+        return self._llm
+
+    @llm.setter
+    def llm(self, client) -> None:
+        self._llm = client
+
+    async def ainvoke(self, messages: List[BaseMessage], cache: bool = False,
+                      validate: Optional[Callable[[str], bool]] = None):
+        """
+        Invoke the LLM asynchronously so other sessions keep running.
+        With cache=True the reply is served from / stored in the shared LLM
+        cache; only use it for deterministic prompts such as classification.
+        Only replies `validate` accepts are cached, so a malformed reply is
+        not served again.
+        """
+        if cache:
+            prompt = "\n".join(f"{message.type}: {message.content}" for message in messages)
+            key = make_cache_key(*self.llm_config, prompt)
+            reply = await llm_cache.aget(key)
+            if reply is not None and (validate is None or validate(reply)):
+                return LLMResponse(reply)
+
+        if hasattr(self.llm, "ainvoke"):
+            response = await self.llm.ainvoke(messages)
+        else:
+            response = await run_blocking_llm_call(self.llm.invoke, messages)
+
+        if cache and (validate is None or validate(response.content)):
+            await llm_cache.aput(key, response.content)
+        return response
+
+    async def astream(self, messages: List[BaseMessage]) -> AsyncIterator[str]:
+        """Stream the LLM reply as text chunks; clients without streaming yield it whole."""
+        if hasattr(self.llm, "astream"):
+            async for chunk in self.llm.astream(messages):
+                text = getattr(chunk, "content", chunk)
+                if text:
+                    yield text
+        else:
+            response = await self.ainvoke(messages)
+            yield response.content
 
     @abstractmethod
-    async def handle_request(self, user_message: str) -> str:
-        """Handle user request. Must be implemented by subclasses."""
+    async def handle_request(self, user_message: str, state: SessionState) -> str:
+        """Handle user request for a session. Must be implemented by subclasses."""
         pass
 
-    def set_context(self, key: str, value: Any) -> None:
-        """Set context variable."""
-        self.context[key] = value
-
-    def get_context(self, key: str) -> Optional[Any]:
-        """Get context variable."""
-        return self.context.get(key)
-
-    def add_message(self, role: str, content: str) -> None:
-        """Add message to conversation history."""
-        if role == "user":
-            self.conversation_history.append(HumanMessage(content=content))
-        elif role == "assistant":
-            self.conversation_history.append(AIMessage(content=content))
-
-    def get_conversation_history(self) -> List[BaseMessage]:
-        """Get conversation history."""
-        return self.conversation_history
-
-    def clear_history(self) -> None:
-        """Clear history."""
-        self.conversation_history = []
+    async def handle_request_stream(self, user_message: str, state: SessionState) -> AsyncIterator[str]:
+        """Handle user request as a stream of text chunks; agents without LLM text yield one chunk."""
+        yield await self.handle_request(user_message, state)
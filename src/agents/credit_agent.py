@@ -1,10 +1,17 @@
 """Credit Agent - Credit limit consultation and increase requests."""
-from typing import Optional, Dict, Any
-from datetime import datetime
-from langchain_core.messages import HumanMessage
+import re
+from typing import Optional, Dict, Any, List, AsyncIterator
+from langchain_core.messages import BaseMessage, HumanMessage
 from src.agents.base_agent import BaseAgent
-from src.tools.csv_tools import get_cliente_by_cpf, create_credit_limit_request, update_credit_limit_request_status, get_client_latest_request
-from src.tools.score_tools import check_credit_limit_approval
+from src.agents.session_state import SessionState
+from src.tools.csv_tools import get_cliente_by_cpf, create_credit_limit_request
+from src.tools.score_tools import evaluate_credit_limit
+from src.tools.intent_tools import IntentMatcher
+from src.utils.constants import CREDIT_REQUEST_RULES, CONFIRMATION_YES_ANSWERS, CONFIRMATION_NO_ANSWERS
+from src.utils.text_utils import fold_accents, extract_brl_amounts, parse_brl_amount
+
+
+credit_request_matcher = IntentMatcher(CREDIT_REQUEST_RULES)
 
 
 class CreditAgent(BaseAgent):
@@ -13,28 +20,95 @@ class CreditAgent(BaseAgent):
     def __init__(self):
         """Initialize Credit Agent."""
         super().__init__("Agente de Crédito", "Especialista em Crédito")
-        self.current_cpf = None
-        self.current_cliente = None
     
-    async def handle_request(self, user_message: str, cpf: str) -> str:
+    async def handle_request(self, user_message: str, state: SessionState) -> str:
         """Handle credit-related request."""
-        self.current_cpf = cpf
-        self.current_cliente = get_cliente_by_cpf(cpf)
-        
-        if not self.current_cliente:
+        cliente = get_cliente_by_cpf(state.authenticated_cpf)
+        if not cliente:
             return "Desculpe, não consegui recuperar suas informações de crédito."
         
-        return await self.process_credit_request(user_message)
+        return await self.process_credit_request(user_message, state, cliente)
     
-    async def process_credit_request(self, user_message: str) -> str:
-        """Process credit request using LLM."""
+    async def handle_request_stream(self, user_message: str, state: SessionState) -> AsyncIterator[str]:
+        """Handle credit-related request, streaming free-form LLM replies."""
+        cliente = get_cliente_by_cpf(state.authenticated_cpf)
+        if not cliente:
+            yield "Desculpe, não consegui recuperar suas informações de crédito."
+            return
+        
+        answer = await self.answer_locally(user_message, state, cliente)
+        if answer is not None:
+            yield answer
+            return
+        
+        async for chunk in self.astream(self._chat_messages(user_message, cliente)):
+            yield chunk
+    
+    async def process_credit_request(self, user_message: str, state: SessionState, cliente: Dict[str, Any]) -> str:
+        """Process credit request, using the LLM only for free-form chat."""
+        answer = await self.answer_locally(user_message, state, cliente)
+        if answer is not None:
+            return answer
+        
+        return await self.chat_with_llm(user_message, cliente)
+    
+    async def answer_locally(self, user_message: str, state: SessionState, cliente: Dict[str, Any]) -> Optional[str]:
+        """
+        Answer without the LLM when possible.
+        A requested amount is confirmed with the customer before the limit
+        increase is filed, and plain limit questions are answered from
+        templates; None means free-form chat.
+        """
+        cpf = state.authenticated_cpf
+        pending_limit = state.get_context("pending_limit")
+        if pending_limit is not None:
+            state.set_context("pending_limit", None)
+            answer = self._confirmation_answer(user_message)
+            if answer is True:
+                return await self.process_limit_increase_request(cpf, pending_limit)
+            if answer is False:
+                return "Tudo bem, a solicitação não foi enviada. Qual novo limite você gostaria de solicitar?"
+        
+        novo_limite = parse_brl_amount(user_message)
+        if novo_limite is not None:
+            state.set_context("pending_limit", novo_limite)
+            return f"Confirma a solicitação de aumento do seu limite para R$ {novo_limite:.2f}? (sim/não)"
+        
+        amounts = extract_brl_amounts(user_message)
+        if len(amounts) > 1:
+            options = " ou ".join(f"R$ {amount:.2f}" for amount in amounts)
+            return f"Encontrei mais de um valor na sua mensagem ({options}). Qual novo limite você deseja?"
+        
+        request = credit_request_matcher.match(user_message)
+        if request and request[0] == "AUMENTO":
+            limite = cliente.get('limite_credito', 0)
+            return (f"Seu limite atual é de R$ {limite:.2f}. "
+                    "Qual novo limite você gostaria de solicitar? (ex: R$ 10.000,00 ou 10 mil)")
+        if request and request[0] == "CONSULTA":
+            return self.consult_credit_limit(cpf)
+        
+        return None
+    
+    def _confirmation_answer(self, user_message: str) -> Optional[bool]:
+        """True for yes, False for no, None when the message is neither."""
+        words = re.findall(r"\w+", fold_accents(user_message))
+        if not words:
+            return None
+        if words[0] in CONFIRMATION_YES_ANSWERS:
+            return True
+        if words[0] in CONFIRMATION_NO_ANSWERS:
+            return False
+        return None
+    
+    def _chat_messages(self, user_message: str, cliente: Dict[str, Any]) -> List[BaseMessage]:
+        """Prompt for free-form credit messages."""
         prompt = f"""
-        Você é um agente de crédito bancário. Seu cliente, {self.current_cliente.get('nome')}, 
+        Você é um agente de crédito bancário. Seu cliente, {cliente.get('nome')}, 
         fez a seguinte solicitação: "{user_message}"
         
         Dados do cliente:
-        - Limite atual: R$ {self.current_cliente.get('limite_credito', 0):.2f}
-        - Score: {self.current_cliente.get('score', 0)}
+        - Limite atual: R$ {cliente.get('limite_credito', 0):.2f}
+        - Score: {cliente.get('score', 0)}
         
         Se o cliente está solicitando:
         1. CONSULTA DE LIMITE: Informar o limite atual
@@ -44,8 +118,11 @@ class CreditAgent(BaseAgent):
         Responda de forma natural, como um atendente bancário. Se o cliente quer saber o limite, 
         informe o valor atual. Se quer aumentar, peça o novo valor desejado.
         """
-        
-        response = self.llm.invoke([HumanMessage(content=prompt)])
+        return [HumanMessage(content=prompt)]
+    
+    async def chat_with_llm(self, user_message: str, cliente: Dict[str, Any]) -> str:
+        """Answer free-form credit messages with the LLM."""
+        response = await self.ainvoke(self._chat_messages(user_message, cliente))
         return response.content
     
     def consult_credit_limit(self, cpf: str) -> str:
@@ -73,24 +150,21 @@ class CreditAgent(BaseAgent):
             if novo_limite <= limite_atual:
                 return f"O novo limite deve ser maior que o limite atual (R$ {limite_atual:.2f})."
             
-            # Create the request
+            # Decide against the client record already loaded
+            approved, message = evaluate_credit_limit(cliente.get('score', 0), novo_limite)
+            
+            # Persist the request once, with its final status
+            status = "aprovado" if approved else "rejeitado"
             success = create_credit_limit_request(
                 cpf=cpf,
                 limite_atual=limite_atual,
                 novo_limite=novo_limite,
-                status="pendente"
+                status=status
             )
             
             if not success:
                 return "Erro ao criar a solicitação. Tente novamente."
             
-            # Check credit approval
-            approved, message = check_credit_limit_approval(cpf, novo_limite)
-            
-            # Update request status
-            status = "aprovado" if approved else "rejeitado"
-            update_credit_limit_request_status(cpf, status)
-            
             if approved:
                 return f"{message}\nSua solicitação foi aprovada!"
             else:
@@ -1,8 +1,15 @@
 """Exchange Agent - Currency exchange rate queries."""
-from typing import Optional
+import re
+from typing import List, Optional
 from langchain_core.messages import HumanMessage
 from src.agents.base_agent import BaseAgent
-from src.tools.exchange_tools import get_exchange_rate, format_exchange_rate
+from src.agents.session_state import SessionState
+from src.tools.exchange_tools import (
+    aget_multiple_rates,
+    extract_currencies,
+    get_multiple_rates,
+    format_exchange_rate
+)
 
 
 class ExchangeAgent(BaseAgent):
@@ -10,30 +17,24 @@ class ExchangeAgent(BaseAgent):
     
     def __init__(self):
         """Initialize Exchange Agent."""
-        super().__init__("Agente de Câmbio", "Especialista em Câmbio")
+        # The LLM only identifies currencies: temperature 0 so cached replies are reproducible
+        super().__init__("Agente de Câmbio", "Especialista em Câmbio", temperature=0.0)
         self.supported_currencies = ["USD", "EUR", "GBP", "JPY", "CAD", "AUD"]
     
-    async def handle_request(self, user_message: str) -> str:
+    async def handle_request(self, user_message: str, state: Optional[SessionState] = None) -> str:
         """Handle exchange request."""
         return await self.process_exchange_request(user_message)
     
     async def process_exchange_request(self, user_message: str) -> str:
         """Process exchange rate request."""
-        # Use LLM to identify which currency the user wants
-        prompt = f"""
-        O cliente perguntou: "{user_message}"
-        
-        Identifique qual moeda estrangeira o cliente está interessado em consultar a cotação.
-        Moedas suportadas: USD (Dólar), EUR (Euro), GBP (Libra), JPY (Iene), CAD (Dólar Canadense), AUD (Dólar Australiano)
-        
-        Responda APENAS com a sigla da moeda (USD, EUR, etc) ou NENHUMA se não conseguir identificar.
-        """
-        
-        llm_response = self.llm.invoke([HumanMessage(content=prompt)])
-        currency = llm_response.content.strip().upper()
+        # Resolve currencies locally; the LLM only sees messages the gazetteer misses
+        currencies = [currency for currency in extract_currencies(user_message)
+                      if currency in self.supported_currencies]
+        if not currencies:
+            currencies = await self.identify_currencies_with_llm(user_message)
         
         # Validate currency
-        if currency not in self.supported_currencies:
+        if not currencies:
             return """Desculpe, não consegui identificar qual moeda você gostaria de consultar.
 
 Moedas suportadas:
@@ -46,13 +47,23 @@ Moedas suportadas:
 
 Qual delas você gostaria de saber a cotação em relação ao Real (BRL)?"""
         
-        # Get exchange rate
-        exchange_data = get_exchange_rate(currency)
+        # Get exchange rates, all from one rate table
+        rates = await aget_multiple_rates(currencies)
         
-        if not exchange_data:
-            return f"Desculpe, não consegui obter a cotação para {currency} no momento. Tente novamente mais tarde."
+        if not rates:
+            return f"Desculpe, não consegui obter a cotação para {', '.join(currencies)} no momento. Tente novamente mais tarde."
         
-        exchange_message = format_exchange_rate(exchange_data)
+        if len(currencies) == 1:
+            exchange_message = format_exchange_rate(rates[currencies[0]])
+        else:
+            lines = []
+            for currency in currencies:
+                rate_data = rates.get(currency)
+                if rate_data:
+                    lines.append(f"• {currency}: {format_exchange_rate(rate_data)}")
+                else:
+                    lines.append(f"• {currency}: cotação não disponível no momento")
+            exchange_message = "Cotações atuais (BRL como base):\n\n" + "\n".join(lines)
         
         follow_up = """
 
@@ -60,12 +71,33 @@ Posso ajudá-lo com outra consulta de câmbio? Caso contrário, posso redirecion
         
         return exchange_message + follow_up
     
+    async def identify_currencies_with_llm(self, user_message: str) -> List[str]:
+        """Use LLM to identify the currencies in a message the gazetteer did not resolve."""
+        prompt = f"""
+        O cliente perguntou: "{user_message}"
+        
+        Identifique quais moedas estrangeiras o cliente está interessado em consultar a cotação.
+        Moedas suportadas: USD (Dólar), EUR (Euro), GBP (Libra), JPY (Iene), CAD (Dólar Canadense), AUD (Dólar Australiano)
+        
+        Responda APENAS com as siglas das moedas separadas por vírgula (USD, EUR, etc) ou NENHUMA se não conseguir identificar.
+        """
+        
+        llm_response = await self.ainvoke([HumanMessage(content=prompt)], cache=True,
+                                          validate=lambda reply: bool(self._parse_currencies(reply)))
+        return self._parse_currencies(llm_response.content)
+    
+    def _parse_currencies(self, reply: str) -> List[str]:
+        """Supported currency codes in an LLM reply, in order, without repeats."""
+        codes = re.findall(r"\b[A-Z]{3}\b", reply.upper())
+        return [currency for currency in dict.fromkeys(codes) if currency in self.supported_currencies]
+    
     def get_all_rates(self) -> str:
         """Get all supported exchange rates."""
         message = "Cotações atuais (BRL como base):\n\n"
         
+        rates = get_multiple_rates(self.supported_currencies)
         for currency in self.supported_currencies:
-            rate_data = get_exchange_rate(currency)
+            rate_data = rates.get(currency)
             if rate_data:
                 message += f"• {rate_data['moeda']}: {format_exchange_rate(rate_data)}\n"
         
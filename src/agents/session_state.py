@@ -0,0 +1,64 @@
+"""Per-conversation state handed to the shared agents."""
+from typing import Any, Dict, Optional
+
+
+class SessionState:
+    """
+    Everything one conversation needs between messages. Agents are shared by
+    all sessions and keep no per-customer data; AgentRouter passes this object
+    to them instead. Dicts are created on first use to keep idle sessions small.
+    """
+
+    __slots__ = (
+        "current_agent",
+        "authenticated_cpf",
+        "conversation_state",
+        "auth_attempts",
+        "authenticated",
+        "authenticated_client",
+        "interview_step",
+        "interview_data",
+        "context",
+    )
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the conversation (logout)."""
+        self.current_agent = None  # AgentType of the agent handling the conversation
+        self.authenticated_cpf: Optional[str] = None
+        self.conversation_state: Dict[str, Any] = {}  # router authentication steps
+        self.auth_attempts = 0
+        self.authenticated = False
+        self.authenticated_client: Optional[Dict[str, Any]] = None
+        self.interview_step = 0
+        self.interview_data: Optional[Dict[str, Any]] = None
+        self.context: Optional[Dict[str, Any]] = None
+
+    def set_context(self, key: str, value: Any) -> None:
+        """Set context variable."""
+        if self.context is None:
+            self.context = {}
+        self.context[key] = value
+
+    def get_context(self, key: str) -> Optional[Any]:
+        """Get context variable."""
+        return self.context.get(key) if self.context else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Fields that differ from a fresh session, for snapshots."""
+        fresh = SessionState()
+        return {
+            name: getattr(self, name)
+            for name in self.__slots__
+            if getattr(self, name) != getattr(fresh, name)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SessionState":
+        """Rebuild a session from to_dict output."""
+        state = cls()
+        for name, value in data.items():
+            setattr(state, name, value)
+        return state
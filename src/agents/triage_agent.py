@@ -1,47 +1,49 @@
 """Triage Agent - Customer authentication and routing."""
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple
 from langchain_core.messages import HumanMessage
 from src.agents.base_agent import BaseAgent
+from src.agents.session_state import SessionState
 from src.tools.auth_tools import authenticate_client, validate_cpf_format, validate_date_format
+from src.tools.intent_tools import intent_classifier
 from src.utils.constants import MESSAGES
 
+ROUTING_CATEGORIES = ("CREDITO", "ENTREVISTA", "CAMBIO", "ENCERRAMENTO", "OUTRO")
+
 
 class TriageAgent(BaseAgent):
     """Agent responsible for customer authentication and initial triage."""
     
     def __init__(self):
         """Initialize Triage Agent."""
-        super().__init__("Agente de Triagem", "Recepcionista bancário")
-        self.auth_attempts = 0
+        # Classification only: temperature 0 so cached replies are reproducible
+        super().__init__("Agente de Triagem", "Recepcionista bancário", temperature=0.0)
         self.max_attempts = 3
-        self.authenticated = False
-        self.authenticated_client: Optional[Dict[str, Any]] = None
     
-    async def handle_request(self, user_message: str) -> str:
+    async def handle_request(self, user_message: str, state: SessionState) -> str:
         """Handle triage request."""
-        return await self.process_message(user_message)
+        return await self.process_message(user_message, state)
     
-    async def process_message(self, user_message: str) -> str:
+    async def process_message(self, user_message: str, state: SessionState) -> str:
         """Process user message in triage flow."""
         
         # If not authenticated yet, proceed with authentication
-        if not self.authenticated:
-            return await self.authenticate()
+        if not state.authenticated:
+            return await self.authenticate(state)
         
         # If authenticated, identify next step
-        return await self.identify_next_agent(user_message)
+        return await self.identify_next_agent(user_message, state)
     
-    async def start_greeting(self) -> str:
+    async def start_greeting(self, state: SessionState) -> str:
         """Start the conversation with greeting."""
-        self.set_context("step", "greeting")
+        state.set_context("step", "greeting")
         return MESSAGES["greeting"]
     
-    async def authenticate(self) -> str:
+    async def authenticate(self, state: SessionState) -> str:
         """Conduct authentication process."""
-        step = self.get_context("step")
+        step = state.get_context("step")
         
         if step is None:
-            self.set_context("step", "ask_cpf")
+            state.set_context("step", "ask_cpf")
             return "Para iniciar, preciso verificar algumas informações. Qual é o seu CPF?"
         
         if step == "ask_cpf":
@@ -52,7 +54,7 @@ class TriageAgent(BaseAgent):
             # Will be handled in the main flow
             return ""
     
-    def authenticate_with_credentials(self, cpf: str, data_nascimento: str) -> Tuple[bool, str]:
+    def authenticate_with_credentials(self, cpf: str, data_nascimento: str, state: SessionState) -> Tuple[bool, str]:
         """Authenticate customer with CPF and birth date."""
         # Validate formats
         if not validate_cpf_format(cpf):
@@ -65,26 +67,46 @@ class TriageAgent(BaseAgent):
         success, client_data = authenticate_client(cpf, data_nascimento)
         
         if success:
-            self.authenticated = True
-            self.authenticated_client = client_data
-            self.set_context("authenticated_client", client_data)
-            self.set_context("cpf", cpf)
+            state.authenticated = True
+            state.authenticated_client = client_data
             return True, f"{MESSAGES['auth_success']} Bem-vindo, {client_data.get('nome')}!"
         
         # Track failed attempt
-        self.auth_attempts += 1
+        state.auth_attempts += 1
         
-        if self.auth_attempts < self.max_attempts:
-            remaining = self.max_attempts - self.auth_attempts
+        if state.auth_attempts < self.max_attempts:
+            remaining = self.max_attempts - state.auth_attempts
             return False, f"{MESSAGES['auth_failed']} Você tem mais {remaining} tentativa(s)."
         
         return False, MESSAGES["max_attempts"]
     
-    async def identify_next_agent(self, user_message: str) -> str:
+    async def classify_intent(self, user_message: str, state: SessionState) -> str:
+        """
+        Classify a message into a routing category.
+        Local tiers (rules, then the trained model) answer first; the LLM is
+        only asked when they are not confident.
+        """
+        category, tier, confidence = await intent_classifier.classify(user_message, self.classify_with_llm)
+        
+        state.set_context("next_agent", category)
+        state.set_context("classification_tier", tier)
+        return category
+    
+    async def identify_next_agent(self, user_message: str, state: SessionState) -> str:
         """
-        Use LLM to identify which agent should handle the request.
+        Identify which agent should handle the request.
         Returns routing instruction or response.
         """
+        category = await self.classify_intent(user_message, state)
+        
+        if category == "ENCERRAMENTO":
+            return f"{MESSAGES['farewell']}"
+        
+        # Return category for router to handle
+        return f"ROUTE:{category}"
+    
+    async def classify_with_llm(self, user_message: str) -> str:
+        """Use LLM to classify the message into a routing category."""
         prompt = f"""
         Você é um assistente de triagem bancário. Com base na mensagem do cliente abaixo, 
         classifique qual tipo de atendimento é necessário:
@@ -101,21 +123,19 @@ class TriageAgent(BaseAgent):
         Responda APENAS com: CREDITO, ENTREVISTA, CAMBIO, ENCERRAMENTO ou OUTRO
         """
         
-        response = self.llm.invoke([HumanMessage(content=prompt)])
-        category = response.content.strip().upper()
-        
-        self.set_context("next_agent", category)
-        
-        if category == "ENCERRAMENTO":
-            return f"{MESSAGES['farewell']}"
-        
-        # Return category for router to handle
-        return f"ROUTE:{category}"
+        try:
+            response = await self.ainvoke([HumanMessage(content=prompt)], cache=True,
+                                           validate=lambda reply: reply.strip().upper() in ROUTING_CATEGORIES)
+            category = response.content.strip().upper()
+            return category if category in ROUTING_CATEGORIES else "OUTRO"
+        except Exception as e:
+            print(f"Error classifying message with LLM: {e}")
+            return "OUTRO"
     
-    def is_authenticated(self) -> bool:
+    def is_authenticated(self, state: SessionState) -> bool:
         """Check if customer is authenticated."""
-        return self.authenticated
+        return state.authenticated
     
-    def has_max_attempts_exceeded(self) -> bool:
+    def has_max_attempts_exceeded(self, state: SessionState) -> bool:
         """Check if max authentication attempts exceeded."""
-        return self.auth_attempts >= self.max_attempts
+        return state.auth_attempts >= self.max_attempts
@@ -1,32 +1,71 @@
 """Main application orchestrator."""
 import asyncio
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, asdict
+import json
+import os
+import time
+import uuid
+from collections import deque
+from typing import List, Dict, Any, Optional, AsyncIterator, Deque
 from datetime import datetime
-from src.agents.agent_router import AgentRouter
+from src.agents.agent_router import AgentRouter, AgentType
+from src.agents.session_state import SessionState
+from src.utils.config import HISTORY_MAX_MESSAGES, HISTORY_TRANSCRIPT_DIR
+
+
+# Bump when the snapshot layout changes; restore() rejects other versions
+SNAPSHOT_VERSION = 2
 
 
-@dataclass
 class Message:
     """Message data structure."""
-    role: str  # "user" or "assistant"
-    content: str
-    timestamp: str
+
+    __slots__ = ("role", "content", "timestamp")
+
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role  # "user" or "assistant"
+        self.content = content
+        self.timestamp = timestamp  # seconds since the epoch
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Message as a dict with an ISO timestamp."""
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat()
+        }
 
 
 class BancoAgilApp:
     """Main application for Banco Ágil."""
     
-    def __init__(self):
-        """Initialize the application."""
+    def __init__(self, max_history: int = HISTORY_MAX_MESSAGES, transcript_dir: str = HISTORY_TRANSCRIPT_DIR):
+        """
+        Initialize the application. Only the latest `max_history` messages are
+        kept in memory; older ones are appended to a transcript in `transcript_dir`.
+        """
         self.router = AgentRouter()
-        self.conversation_history: List[Message] = []
+        self.max_history = max_history
+        self.transcript_dir = transcript_dir
         self.is_active = False
+        self._clear_history()
+    
+    def _clear_history(self) -> None:
+        if getattr(self, "transcript_path", None) is not None:
+            try:
+                os.remove(self.transcript_path)
+            except OSError as e:
+                print(f"Error deleting transcript: {e}")
+        self.conversation_history: Deque[Message] = deque()
+        self.transcript_path: Optional[str] = None  # created when messages first spill
+        self.history_chars = 0  # characters of the in-memory messages, for memory accounting
+        # Running totals, including spilled messages, so the summary is O(1)
+        self.message_counts: Dict[str, int] = {}
+        self.start_time: Optional[float] = None
     
     async def start_conversation(self) -> str:
         """Start a new conversation."""
         self.is_active = True
-        self.conversation_history = []
+        self._clear_history()
         
         # Trigger greeting from triage agent
         greeting = await self.router.handle_triage("")
@@ -53,6 +92,32 @@ class BancoAgilApp:
         # Process through router
         response = await self.router.process_message(user_input)
         
+        return self._finish_response(response)
+    
+    async def process_user_input_stream(self, user_input: str) -> AsyncIterator[str]:
+        """
+        Process user input, yielding the agent response in chunks as it is generated.
+        The full response is recorded in the history once the stream ends.
+        """
+        if not self.is_active:
+            yield "Conversa não iniciada. Por favor, inicie uma nova conversa."
+            return
+        
+        self._add_to_history("user", user_input)
+        
+        chunks = []
+        async for chunk in self.router.process_message_stream(user_input):
+            if not chunks and chunk.startswith("ROUTE:"):
+                # Routing instructions arrive whole, never streamed
+                yield self._finish_response(chunk)
+                return
+            chunks.append(chunk)
+            yield chunk
+        
+        self._finish_response("".join(chunks))
+    
+    def _finish_response(self, response: str) -> str:
+        """Record a complete agent response and return the text shown to the user."""
         # Handle special routing instructions
         if response.startswith("ROUTE:"):
             # Extract agent type
@@ -72,12 +137,43 @@ class BancoAgilApp:
     
     def _add_to_history(self, role: str, content: str) -> None:
         """Add message to conversation history."""
-        message = Message(
-            role=role,
-            content=content,
-            timestamp=datetime.now().isoformat()
-        )
+        message = Message(role, content, time.time())
+        if len(self.conversation_history) >= self.max_history:
+            self._spill_history()
         self.conversation_history.append(message)
+        self.history_chars += len(content)
+        
+        self.message_counts[role] = self.message_counts.get(role, 0) + 1
+        if self.start_time is None:
+            self.start_time = message.timestamp
+    
+    def _spill_history(self) -> None:
+        """Move the oldest quarter of the in-memory history to the transcript file."""
+        count = max(1, self.max_history // 4)
+        spilled = [self.conversation_history.popleft() for _ in range(min(count, len(self.conversation_history)))]
+        self.history_chars -= sum(len(msg.content) for msg in spilled)
+        try:
+            if self.transcript_path is None:
+                os.makedirs(self.transcript_dir, exist_ok=True)
+                self.transcript_path = os.path.join(self.transcript_dir, f"{uuid.uuid4().hex}.jsonl")
+            with open(self.transcript_path, "a", encoding="utf-8") as f:
+                f.writelines(
+                    json.dumps([msg.role, msg.content, msg.timestamp], ensure_ascii=False) + "\n"
+                    for msg in spilled
+                )
+        except OSError as e:
+            print(f"Error writing transcript: {e}")
+    
+    def _read_transcript(self) -> List[Message]:
+        """Messages spilled from memory, oldest first."""
+        if self.transcript_path is None:
+            return []
+        try:
+            with open(self.transcript_path, encoding="utf-8") as f:
+                return [Message(*json.loads(line)) for line in f]
+        except (OSError, ValueError) as e:
+            print(f"Error reading transcript: {e}")
+            return []
     
     def _get_agent_transition_message(self, agent_type: str) -> str:
         """Get message for agent transition."""
@@ -89,9 +185,64 @@ class BancoAgilApp:
         }
         return messages.get(agent_type, "Processando solicitação...")
     
+    def snapshot(self) -> bytes:
+        """
+        Serialize the conversation (session state and history) to compact JSON,
+        so it can be resumed by restore() in another process. Spilled messages
+        stay in the transcript, referenced by file name within the transcript
+        directory, which must be shared storage for other hosts to read them.
+        """
+        state = self.router.state.to_dict()
+        if "current_agent" in state:
+            state["current_agent"] = state["current_agent"].value
+        
+        return json.dumps({
+            "v": SNAPSHOT_VERSION,
+            "active": self.is_active,
+            "state": state,
+            "history": [[msg.role, msg.content, msg.timestamp] for msg in self.conversation_history],
+            "counts": self.message_counts,
+            "start": self.start_time,
+            "transcript": os.path.basename(self.transcript_path) if self.transcript_path else None
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    
+    @classmethod
+    def restore(cls, snapshot: bytes, transcript_dir: str = HISTORY_TRANSCRIPT_DIR) -> "BancoAgilApp":
+        """Rebuild an app from snapshot() output, with its transcript looked up in `transcript_dir`."""
+        data = json.loads(snapshot)
+        if data.get("v") != SNAPSHOT_VERSION:
+            raise ValueError(f"unsupported snapshot version {data.get('v')}")
+        
+        state = data["state"]
+        if "current_agent" in state:
+            state["current_agent"] = AgentType(state["current_agent"])
+        
+        app = cls(transcript_dir=transcript_dir)
+        app.router = AgentRouter(SessionState.from_dict(state))
+        app.is_active = data["active"]
+        app.conversation_history = deque(Message(*message) for message in data["history"])
+        app.history_chars = sum(len(msg.content) for msg in app.conversation_history)
+        app.message_counts = data["counts"]
+        app.start_time = data["start"]
+        # Older snapshots hold an absolute path, which join() keeps as is
+        app.transcript_path = os.path.join(transcript_dir, data["transcript"]) if data["transcript"] else None
+        return app
+    
+    @staticmethod
+    def delete_transcript(snapshot: bytes, transcript_dir: str = HISTORY_TRANSCRIPT_DIR) -> None:
+        """Delete the transcript a snapshot refers to (for snapshots that will never be restored)."""
+        try:
+            name = json.loads(snapshot).get("transcript")
+            if name:
+                os.remove(os.path.join(transcript_dir, name))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Error deleting transcript: {e}")
+    
     def get_conversation_history(self) -> List[Dict[str, Any]]:
-        """Get full conversation history."""
-        return [asdict(msg) for msg in self.conversation_history]
+        """Get full conversation history, including messages spilled to the transcript."""
+        return [msg.to_dict() for msg in self._read_transcript() + list(self.conversation_history)]
     
     def get_conversation_summary(self) -> Dict[str, Any]:
         """Get conversation summary."""
@@ -102,25 +253,23 @@ class BancoAgilApp:
                 "duration": "0s"
             }
         
-        start_time = datetime.fromisoformat(self.conversation_history[0].timestamp)
-        end_time = datetime.fromisoformat(self.conversation_history[-1].timestamp)
-        duration = (end_time - start_time).total_seconds()
+        end_time = self.conversation_history[-1].timestamp
         
         return {
-            "total_messages": len(self.conversation_history),
-            "user_messages": sum(1 for msg in self.conversation_history if msg.role == "user"),
-            "assistant_messages": sum(1 for msg in self.conversation_history if msg.role == "assistant"),
+            "total_messages": sum(self.message_counts.values()),
+            "user_messages": self.message_counts.get("user", 0),
+            "assistant_messages": self.message_counts.get("assistant", 0),
             "authenticated": self.router.is_authenticated(),
             "authenticated_cpf": self.router.get_authenticated_cpf(),
-            "duration_seconds": duration,
-            "start_time": start_time.isoformat(),
-            "end_time": end_time.isoformat()
+            "duration_seconds": end_time - self.start_time,
+            "start_time": datetime.fromtimestamp(self.start_time).isoformat(),
+            "end_time": datetime.fromtimestamp(end_time).isoformat()
         }
     
     def reset(self) -> None:
         """Reset application state."""
         self.router.reset()
-        self.conversation_history = []
+        self._clear_history()
         self.is_active = False
     
     def is_conversation_active(self) -> bool:
@@ -143,6 +292,7 @@ async def main():
         "1990-05-15",
         "Gostaria de saber meu limite de crédito",
         "Quero aumentar para 10000",
+        "sim",
         "Encerrar"
     ]
     
@@ -0,0 +1,350 @@
+"""Session manager hosting many Banco Ágil conversations in one process."""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from src.agents.agent_router import AgentType, get_shared_agent
+from src.main import BancoAgilApp
+from src.snapshot_store import SnapshotStore
+from src.tools.exchange_tools import start_rate_refresher
+from src.utils.config import (
+    EXCHANGE_BACKGROUND_REFRESH,
+    HISTORY_TRANSCRIPT_DIR,
+    SESSION_IDLE_TIMEOUT,
+    SESSION_MAX_COUNT,
+    SESSION_MEMORY_BUDGET_MB,
+    SESSION_SWEEP_INTERVAL
+)
+
+
+# Rough retained size of a fresh logged-in session and of each history message
+# (see benchmarks/bench_session_memory.py); used to enforce the memory budget
+SESSION_BASE_BYTES = 2048
+MESSAGE_OVERHEAD_BYTES = 300
+
+
+def _session_size(app: BancoAgilApp) -> int:
+    """Estimated retained size of a session: the base plus its in-memory history."""
+    return SESSION_BASE_BYTES + MESSAGE_OVERHEAD_BYTES * len(app.conversation_history) + app.history_chars
+
+
+class _Session:
+    """One hosted conversation with its lock and bookkeeping."""
+
+    __slots__ = ("app", "lock", "last_used", "size", "pending_saves")
+
+    def __init__(self, app: BancoAgilApp):
+        self.app = app
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.size = _session_size(app)
+        self.pending_saves = 0  # snapshots of this session being written to the store
+
+
+class SessionManager:
+    """
+    Hosts conversations by session id. Agents, LLM clients and data caches are
+    process-wide and shared; each session only holds its BancoAgilApp.
+    Sessions idle for `idle_timeout` seconds are evicted, and the least recently
+    used ones go first when `max_sessions` or the memory budget is exceeded.
+    Messages for one session are handled one at a time; the per-session locks
+    are asyncio locks, so drive the coroutines from one event loop (the
+    Streamlit UI keeps a single loop thread for this).
+    With a `store`, sessions evicted to stay within `max_sessions` or the memory
+    budget are snapshotted and transparently restored on their next message,
+    also by another process sharing the store, as long as that comes within
+    `idle_timeout` of their last use. Idle sessions simply end. A restored
+    snapshot is removed from the store, so one manager owns a session at a time.
+    """
+
+    def __init__(self, max_sessions: int = SESSION_MAX_COUNT, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 memory_budget: int = SESSION_MEMORY_BUDGET_MB * 1024 * 1024,
+                 store: Optional[SnapshotStore] = None, transcript_dir: str = HISTORY_TRANSCRIPT_DIR):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.memory_budget = memory_budget
+        self.store = store
+        self.transcript_dir = transcript_dir
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()  # least recently used first
+        self._saving: Dict[str, _Session] = {}  # evicted, snapshot not yet in the store
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "closed": 0, "evicted_idle": 0, "evicted_lru": 0, "restored": 0}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def warm_up() -> None:
+        """Build the shared agents up front so no session pays for them, and start the rate refresher."""
+        for agent_type in AgentType:
+            get_shared_agent(agent_type)
+        if EXCHANGE_BACKGROUND_REFRESH:
+            start_rate_refresher()
+
+    def _add(self, session_id: str, session: _Session, counter: str) -> None:
+        with self._lock:
+            self._sessions[session_id] = session
+            self._bytes += session.size
+            self._stats[counter] += 1
+            victims = self._evict_locked()
+        self._save_evicted(victims)
+
+    def create_session(self) -> str:
+        """Open a new conversation and return its id."""
+        session_id = uuid.uuid4().hex
+        self._add(session_id, _Session(BancoAgilApp(transcript_dir=self.transcript_dir)), "created")
+        return session_id
+
+    def _get_session(self, session_id: str) -> Optional[_Session]:
+        """Get a live session, restoring it from the store if it was evicted."""
+        session = self._sessions.get(session_id)
+        if session is not None or self.store is None:
+            return session
+
+        # Evicted moments ago: its snapshot may not be in the store yet
+        with self._lock:
+            session = self._saving.get(session_id)
+        if session is not None:
+            self._add(session_id, session, "restored")
+            return self._sessions.get(session_id, session)
+
+        try:
+            snapshot = self.store.load(session_id, max_age=self.idle_timeout)
+            if snapshot is None:
+                return None
+            session = _Session(BancoAgilApp.restore(snapshot, self.transcript_dir))
+            # This manager owns the session now; no other one may revive the copy
+            self.store.delete(session_id)
+        except Exception as e:
+            print(f"Error restoring session {session_id}: {e}")
+            return None
+        self._add(session_id, session, "restored")
+        return self._sessions.get(session_id, session)
+
+    async def _aget_session(self, session_id: str) -> Optional[_Session]:
+        """_get_session for coroutines: restoring from the store runs on the default executor."""
+        session = self._sessions.get(session_id)
+        if session is not None or self.store is None:
+            return session
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_session, session_id)
+
+    def get_app(self, session_id: str) -> Optional[BancoAgilApp]:
+        """Get a session's app, or None if it does not exist or expired."""
+        session = self._get_session(session_id)
+        return session.app if session else None
+
+    def close_session(self, session_id: str) -> bool:
+        """End a conversation, free its memory and drop its snapshot and transcript."""
+        app = None
+        if self.store is not None:
+            try:
+                snapshot = self.store.load(session_id)
+                if snapshot is not None:
+                    app = BancoAgilApp.restore(snapshot, self.transcript_dir)
+            except Exception as e:
+                print(f"Error restoring session {session_id}: {e}")
+            self.store.delete(session_id)
+        with self._lock:
+            pending = self._saving.pop(session_id, None)
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
+                self._bytes -= session.size
+                self._stats["closed"] += 1
+        session = session or pending
+        if session is not None:
+            app = session.app
+        if app is not None:
+            app.reset()  # deletes the transcript file
+        return app is not None
+
+    async def aclose_session(self, session_id: str) -> bool:
+        """close_session for coroutines: the store and transcript I/O runs on the default executor."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.close_session, session_id)
+
+    @staticmethod
+    def _last_used_at(session: _Session) -> float:
+        """When the session was last used, in seconds since the epoch (the snapshot's age starts there)."""
+        return time.time() - (time.monotonic() - session.last_used)
+
+    def _save_snapshot(self, session_id: str, snapshot: bytes, saved_at: float) -> None:
+        try:
+            self.store.save(session_id, snapshot, saved_at)
+        except Exception as e:
+            print(f"Error saving session {session_id}: {e}")
+
+    def _write_evicted(self, victims: List[Tuple[str, _Session, Optional[bytes], float]]) -> None:
+        """Write evicted sessions' snapshots to the store; runs off the event loop."""
+        for session_id, session, snapshot, saved_at in victims:
+            if snapshot is not None:
+                self._save_snapshot(session_id, snapshot, saved_at)
+            with self._lock:
+                session.pending_saves -= 1
+                if session.pending_saves:
+                    continue  # a newer write of this session follows and decides
+                # Closed, or revived in the meantime: the store must not keep a copy.
+                # Rare, so the delete is done under the lock to order it with new evictions
+                stale = self._saving.get(session_id) is not session or self._sessions.get(session_id) is session
+                if self._saving.get(session_id) is session:
+                    del self._saving[session_id]
+                if stale:
+                    self.store.delete(session_id)
+
+    def _save_evicted(self, victims: List[Tuple[str, _Session]]) -> None:
+        """
+        Snapshot sessions evicted under the lock, after releasing it. On an
+        event loop the store writes go to the default executor so one sweep
+        over many sessions does not block other conversations.
+        """
+        if not victims:
+            return
+        snapshots = []
+        for session_id, session in victims:
+            try:
+                snapshots.append((session_id, session, session.app.snapshot(), self._last_used_at(session)))
+            except Exception as e:
+                print(f"Error saving session {session_id}: {e}")
+                snapshots.append((session_id, session, None, 0.0))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_evicted(snapshots)
+        else:
+            loop.run_in_executor(None, self._write_evicted, snapshots)
+
+    def persist_all(self) -> None:
+        """Snapshot every live session to the store (e.g. before shutting down)."""
+        if self.store is None:
+            return
+        for session_id, session in list(self._sessions.items()):
+            self._save_snapshot(session_id, session.app.snapshot(), self._last_used_at(session))
+
+    def _touch(self, session_id: str, session: _Session) -> None:
+        """Mark a session as just used and recompute its size from its current history."""
+        victims: List[Tuple[str, _Session]] = []
+        with self._lock:
+            session.last_used = time.monotonic()
+            if session_id in self._sessions:
+                self._sessions.move_to_end(session_id)
+                size = _session_size(session.app)
+                self._bytes += size - session.size
+                session.size = size
+                victims = self._evict_locked()
+        self._save_evicted(victims)
+
+    async def start_conversation(self, session_id: Optional[str] = None) -> Tuple[str, str]:
+        """Start (or restart) a conversation; returns (session_id, greeting)."""
+        session = await self._aget_session(session_id) if session_id is not None else None
+        if session is None:
+            session_id = self.create_session()
+            session = self._sessions[session_id]
+        async with session.lock:
+            greeting = await session.app.start_conversation()
+        self._touch(session_id, session)
+        return session_id, greeting
+
+    async def handle_message(self, session_id: str, user_input: str) -> Optional[str]:
+        """Process a message for a session; None if the session does not exist or expired."""
+        session = await self._aget_session(session_id)
+        if session is None:
+            return None
+        async with session.lock:
+            response = await session.app.process_user_input(user_input)
+        self._touch(session_id, session)
+        return response
+
+    async def stream_message(self, session_id: str, user_input: str) -> AsyncIterator[str]:
+        """Like handle_message, yielding the reply in chunks; yields nothing for unknown sessions."""
+        session = await self._aget_session(session_id)
+        if session is None:
+            return
+        async with session.lock:
+            async for chunk in session.app.process_user_input_stream(user_input):
+                yield chunk
+        self._touch(session_id, session)
+
+    def _evict(self, session_id: str, reason: str, victims: List[Tuple[str, _Session]]) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+        self._stats[reason] += 1
+        if self.store is not None and reason == "evicted_lru":
+            session.pending_saves += 1
+            self._saving[session_id] = session
+            victims.append((session_id, session))
+
+    def _evict_locked(self) -> List[Tuple[str, _Session]]:
+        """
+        Drop idle sessions, then least recently used ones while over a limit.
+        Caller holds _lock and passes the returned sessions to _save_evicted
+        once it has released it.
+        """
+        victims: List[Tuple[str, _Session]] = []
+        now = time.monotonic()
+        expired: List[str] = []
+        for session_id, session in self._sessions.items():
+            if now - session.last_used < self.idle_timeout:
+                break  # LRU order: everything after was used more recently
+            if not session.lock.locked():
+                expired.append(session_id)
+        for session_id in expired:
+            self._evict(session_id, "evicted_idle", victims)
+
+        while len(self._sessions) > self.max_sessions or self._bytes > self.memory_budget:
+            victim = next((sid for sid, s in self._sessions.items() if not s.lock.locked()), None)
+            if victim is None:
+                break
+            self._evict(victim, "evicted_lru", victims)
+        return victims
+
+    def evict_idle(self) -> None:
+        """Apply idle-timeout and budget eviction now."""
+        with self._lock:
+            victims = self._evict_locked()
+        self._save_evicted(victims)
+
+    async def _sweep(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+            if self.store is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self.purge_expired)
+
+    def purge_expired(self) -> int:
+        """Delete snapshots of sessions unused for longer than the idle timeout, with their transcripts."""
+        if self.store is None:
+            return 0
+        try:
+            snapshots = self.store.purge(self.idle_timeout)
+        except Exception as e:
+            print(f"Error purging session snapshots: {e}")
+            return 0
+        for snapshot in snapshots:
+            BancoAgilApp.delete_transcript(snapshot, self.transcript_dir)
+        return len(snapshots)
+
+    def start_sweeper(self, interval: float = SESSION_SWEEP_INTERVAL) -> None:
+        """Evict idle sessions and purge expired snapshots periodically on the running event loop."""
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep(interval))
+
+    def stop_sweeper(self) -> None:
+        """Stop periodic eviction."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        """Whether the session is live in memory (evicted ones may still be restorable)."""
+        return session_id in self._sessions
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get session counts, evictions and estimated memory use."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["active"] = len(self._sessions)
+            stats["estimated_bytes"] = self._bytes
+        stats["memory_budget"] = self.memory_budget
+        return stats
@@ -0,0 +1,150 @@
+"""Local stores for conversation snapshots (BancoAgilApp.snapshot)."""
+import os
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+
+class SnapshotStore(ABC):
+    """
+    Keeps snapshots by session id, with the time each one was saved (or the
+    session last used), so stale ones can be refused and purged.
+    """
+
+    @abstractmethod
+    def save(self, session_id: str, snapshot: bytes, saved_at: Optional[float] = None) -> None:
+        """Store (or replace) a session's snapshot; saved_at defaults to now (seconds since the epoch)."""
+
+    @abstractmethod
+    def load(self, session_id: str, max_age: Optional[float] = None) -> Optional[bytes]:
+        """
+        Get a session's snapshot, or None. Snapshots older than max_age seconds
+        are refused and left for purge(), which hands them to the caller.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Forget a session's snapshot."""
+
+    @abstractmethod
+    def purge(self, max_age: float) -> List[bytes]:
+        """
+        Delete snapshots older than max_age seconds and return them, so the
+        caller can release what they reference (transcript files).
+        """
+
+
+_SESSION_ID_RE = re.compile(r"^[\w-]+$")
+
+
+class FileSnapshotStore(SnapshotStore):
+    """
+    One file per session in a directory; writes are atomic (write, then rename).
+    The save time is kept as the file's modification time.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id: str) -> str:
+        if not _SESSION_ID_RE.match(session_id):
+            raise ValueError(f"invalid session id {session_id!r}")
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    def save(self, session_id: str, snapshot: bytes, saved_at: Optional[float] = None) -> None:
+        path = self._path(session_id)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(snapshot)
+        if saved_at is not None:
+            os.utime(temp_path, (saved_at, saved_at))
+        os.replace(temp_path, path)
+
+    def load(self, session_id: str, max_age: Optional[float] = None) -> Optional[bytes]:
+        path = self._path(session_id)
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, session_id: str) -> None:
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def purge(self, max_age: float) -> List[bytes]:
+        cutoff = time.time() - max_age
+        purged = []
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+                    with open(entry.path, "rb") as f:
+                        snapshot = f.read()
+                    os.remove(entry.path)
+                    purged.append(snapshot)
+            except FileNotFoundError:
+                pass  # purged or restored by another process meanwhile
+        return purged
+
+
+class SQLiteSnapshotStore(SnapshotStore):
+    """All sessions in one SQLite table; safe to share between threads and processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots (session_id TEXT PRIMARY KEY, data BLOB, saved_at REAL)"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(snapshots)")]
+        if "saved_at" not in columns:
+            # Tables from before snapshots expired: their rows count as saved now
+            self._db.execute("ALTER TABLE snapshots ADD COLUMN saved_at REAL")
+            self._db.execute("UPDATE snapshots SET saved_at = ?", (time.time(),))
+
+    def save(self, session_id: str, snapshot: bytes, saved_at: Optional[float] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots (session_id, data, saved_at) VALUES (?, ?, ?)",
+                (session_id, snapshot, saved_at if saved_at is not None else time.time())
+            )
+
+    def load(self, session_id: str, max_age: Optional[float] = None) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, saved_at FROM snapshots WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row and max_age is not None and time.time() - row[1] > max_age:
+                return None
+        return row[0] if row else None
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM snapshots WHERE session_id = ?", (session_id,))
+
+    def purge(self, max_age: float) -> List[bytes]:
+        cutoff = time.time() - max_age
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute("SELECT data FROM snapshots WHERE saved_at < ?", (cutoff,)).fetchall()
+                self._db.execute("DELETE FROM snapshots WHERE saved_at < ?", (cutoff,))
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        return [row[0] for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
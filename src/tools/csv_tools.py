@@ -1,9 +1,33 @@
 """Tools for reading and writing CSV files."""
 import pandas as pd
+import csv
+import io
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
-from src.utils.config import CLIENTES_CSV, SCORE_LIMITE_CSV, SOLICITACOES_CSV
+from typing import Dict, Iterator, List, Optional, Any, Tuple
+from src.utils.config import CLIENTES_CSV, SCORE_LIMITE_CSV, SOLICITACOES_CSV, CSV_FSYNC_EVERY
+from src.utils.file_utils import copy_file_mode
+
+
+# Process-wide client index: CPF -> client record, reloaded when the file changes
+_clientes_lock = threading.RLock()
+_clientes_index: Dict[str, Any] = {
+    "path": None,
+    "signature": None,
+    "columns": [],
+    "records": {},
+    "frame": None
+}
+
+# Appends are serialized so concurrent writers never interleave partial lines;
+# read-modify-write rewrites of an append-only file must hold it too
+_append_lock = threading.Lock()
+_unsynced_appends: Dict[str, int] = {}
+# Byte range of the last row appended to each file, for in-place status updates
+_last_appends: Dict[str, Dict[str, Any]] = {}
 
 
 def read_csv(file_path: str) -> pd.DataFrame:
@@ -15,42 +39,199 @@ def read_csv(file_path: str) -> pd.DataFrame:
 
 
 def write_csv(file_path: str, data: pd.DataFrame) -> bool:
-    """Write DataFrame to CSV file."""
+    """Write DataFrame to CSV file atomically (temporary file, then rename)."""
     try:
-        data.to_csv(file_path, index=False)
+        directory = os.path.dirname(os.path.abspath(file_path))
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False,
+                                         newline="", encoding="utf-8") as f:
+            temp_path = f.name
+            data.to_csv(f, index=False)
+        copy_file_mode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+        # Offsets of earlier appends are meaningless after a full rewrite
+        _last_appends.pop(file_path, None)
         return True
     except Exception as e:
         print(f"Error writing to CSV: {e}")
+        if "temp_path" in locals() and os.path.exists(temp_path):
+            os.remove(temp_path)
         return False
 
 
-def append_to_csv(file_path: str, new_row: Dict[str, Any]) -> bool:
-    """Append a new row to CSV file."""
+@contextmanager
+def csv_rewrite_lock() -> Iterator[None]:
+    """
+    Hold off appends while rewriting an append-only CSV (read, modify, write),
+    so rows appended in between are not lost.
+    """
+    with _append_lock:
+        yield
+
+
+def _read_csv_header(file_path: str) -> Tuple[List[str], bool]:
+    """Return the header columns and whether the file ends with a newline."""
+    with open(file_path, "r", newline="", encoding="utf-8") as f:
+        columns = next(csv.reader(f), [])
+    with open(file_path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        ends_with_newline = f.read(1) in (b"\n", b"\r")
+    return columns, ends_with_newline
+
+
+def _encode_csv_row(columns: List[str], row: Optional[Dict[str, Any]] = None) -> bytes:
+    """Encode a single CSV line (the header when `row` is None)."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+    if row is None:
+        writer.writeheader()
+    else:
+        writer.writerow(row)
+    return buffer.getvalue().encode("utf-8")
+
+
+def append_to_csv(file_path: str, new_row: Dict[str, Any], fsync_every: Optional[int] = None) -> bool:
+    """
+    Append a new row to CSV file without rewriting it.
+    The header is written only when the file is new; existing files keep
+    their column order. Rows are fsynced every `fsync_every` appends
+    (defaults to CSV_FSYNC_EVERY, 0 disables).
+    """
+    if fsync_every is None:
+        fsync_every = CSV_FSYNC_EVERY
     try:
-        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-            df = pd.read_csv(file_path)
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-        else:
-            df = pd.DataFrame([new_row])
-        
-        return write_csv(file_path, df)
+        with _append_lock:
+            is_new = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+            if is_new:
+                columns, ends_with_newline = list(new_row.keys()), True
+            else:
+                columns, ends_with_newline = _read_csv_header(file_path)
+
+            prefix = b"" if ends_with_newline else b"\n"
+            if is_new:
+                prefix += _encode_csv_row(columns)
+            line = _encode_csv_row(columns, new_row)
+
+            with open(file_path, "ab") as f:
+                start = f.tell() + len(prefix)
+                f.write(prefix + line)
+                f.flush()
+
+                if fsync_every > 0:
+                    pending = _unsynced_appends.get(file_path, 0) + 1
+                    if pending >= fsync_every:
+                        os.fsync(f.fileno())
+                        pending = 0
+                    _unsynced_appends[file_path] = pending
+
+            _last_appends[file_path] = {
+                "start": start,
+                "end": start + len(line),
+                "columns": columns,
+                "row": dict(new_row)
+            }
+        return True
     except Exception as e:
         print(f"Error appending to CSV: {e}")
         return False
 
 
+def _rewrite_last_appended_row(file_path: str, match: Dict[str, Any], updates: Dict[str, Any]) -> bool:
+    """
+    Rewrite the last appended row in place when it is still the file's tail
+    and matches `match`. Returns False when a full rewrite is needed.
+    """
+    with _append_lock:
+        last = _last_appends.get(file_path)
+        if last is None or not os.path.exists(file_path):
+            return False
+        if os.path.getsize(file_path) != last["end"]:
+            return False
+        if any(str(last["row"].get(key)) != str(value) for key, value in match.items()):
+            return False
+
+        row = dict(last["row"], **updates)
+        line = _encode_csv_row(last["columns"], row)
+        with open(file_path, "r+b") as f:
+            f.seek(last["start"])
+            f.write(line)
+            f.truncate()
+            f.flush()
+
+        last["row"] = row
+        last["end"] = last["start"] + len(line)
+        return True
+
+
+def sync_csv(file_path: str) -> bool:
+    """Force appended rows still waiting for a batched fsync to disk."""
+    try:
+        with _append_lock:
+            if _unsynced_appends.get(file_path, 0) and os.path.exists(file_path):
+                with open(file_path, "rb") as f:
+                    os.fsync(f.fileno())
+            _unsynced_appends[file_path] = 0
+        return True
+    except Exception as e:
+        print(f"Error syncing CSV: {e}")
+        return False
+
+
+def get_file_signature(file_path: str) -> Tuple[int, int]:
+    """Return (mtime_ns, size) used to detect changes to a data file."""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _load_clientes_index() -> Dict[str, Dict[str, Any]]:
+    """Return the client index, (re)loading it if clientes.csv changed on disk."""
+    with _clientes_lock:
+        signature = get_file_signature(CLIENTES_CSV)
+        if (_clientes_index["path"] != CLIENTES_CSV
+                or _clientes_index["signature"] != signature):
+            df = read_csv(CLIENTES_CSV)
+            df['cpf'] = df['cpf'].astype(str)
+            _clientes_index["columns"] = list(df.columns)
+            # A CPF listed twice resolves to its first row, like a row-by-row lookup
+            records: Dict[str, Dict[str, Any]] = {}
+            for record in df.to_dict('records'):
+                records.setdefault(record['cpf'], record)
+            _clientes_index["records"] = records
+            _clientes_index["frame"] = df
+            _clientes_index["path"] = CLIENTES_CSV
+            _clientes_index["signature"] = signature
+        return _clientes_index["records"]
+
+
+def invalidate_clientes_index() -> None:
+    """Drop the cached client index so the next lookup reloads the file."""
+    with _clientes_lock:
+        _clientes_index["path"] = None
+        _clientes_index["signature"] = None
+        _clientes_index["columns"] = []
+        _clientes_index["records"] = {}
+        _clientes_index["frame"] = None
+
+
+def get_clientes_frame() -> Optional[pd.DataFrame]:
+    """Get all clients as a DataFrame backed by the client index (treat as read-only)."""
+    try:
+        with _clientes_lock:
+            _load_clientes_index()
+            return _clientes_index["frame"]
+    except Exception as e:
+        print(f"Error retrieving clients: {e}")
+        return None
+
+
 def get_cliente_by_cpf(cpf: str) -> Optional[Dict[str, Any]]:
     """Retrieve client data by CPF."""
     try:
-        df = read_csv(CLIENTES_CSV)
-        # Ensure CPF is string for comparison
-        df['cpf'] = df['cpf'].astype(str)
-        cliente = df[df['cpf'] == str(cpf)]
+        cliente = _load_clientes_index().get(str(cpf))
 
-        if cliente.empty:
+        if cliente is None:
             return None
 
-        return cliente.iloc[0].to_dict()
+        return dict(cliente)
     except Exception as e:
         print(f"Error retrieving client: {e}")
         return None
@@ -59,15 +240,27 @@ def get_cliente_by_cpf(cpf: str) -> Optional[Dict[str, Any]]:
 def update_cliente_score(cpf: str, new_score: float) -> bool:
     """Update client's credit score."""
     try:
-        df = read_csv(CLIENTES_CSV)
-        df['cpf'] = df['cpf'].astype(str)
-        mask = df['cpf'] == str(cpf)
+        with _clientes_lock:
+            records = _load_clientes_index()
+            cliente = records.get(str(cpf))
 
-        if not mask.any():
-            return False
+            if cliente is None:
+                return False
+
+            # Every row of the CPF is updated and all other rows are kept as they are
+            df = _clientes_index["frame"].copy()
+            if df['score'].dtype.kind in "iu" and new_score != int(new_score):
+                df['score'] = df['score'].astype(float)
+            df.loc[df['cpf'] == cliente['cpf'], 'score'] = new_score
 
-        df.loc[mask, 'score'] = new_score
-        return write_csv(CLIENTES_CSV, df)
+            if not write_csv(CLIENTES_CSV, df):
+                return False
+
+            # Keep readers on the written data without a reload
+            records[cliente['cpf']] = dict(cliente, score=new_score)
+            _clientes_index["frame"] = df
+            _clientes_index["signature"] = get_file_signature(CLIENTES_CSV)
+            return True
     except Exception as e:
         print(f"Error updating score: {e}")
         return False
@@ -102,18 +295,23 @@ def get_score_limits() -> Optional[pd.DataFrame]:
 def update_credit_limit_request_status(cpf: str, new_status: str) -> bool:
     """Update the status of a credit limit request."""
     try:
-        df = read_csv(SOLICITACOES_CSV)
-        
-        # Get the most recent request for this CPF
-        cpf_requests = df[df['cpf_cliente'] == cpf]
-        if cpf_requests.empty:
-            return False
-        
-        # Update the last (most recent) request
-        last_request_idx = cpf_requests.index[-1]
-        df.loc[last_request_idx, 'status_pedido'] = new_status
-        
-        return write_csv(SOLICITACOES_CSV, df)
+        # Fast path: the request is still the last line we appended
+        if _rewrite_last_appended_row(SOLICITACOES_CSV, {'cpf_cliente': cpf}, {'status_pedido': new_status}):
+            return True
+
+        with csv_rewrite_lock():
+            df = read_csv(SOLICITACOES_CSV)
+            
+            # Get the most recent request for this CPF
+            cpf_requests = df[df['cpf_cliente'] == cpf]
+            if cpf_requests.empty:
+                return False
+            
+            # Update the last (most recent) request
+            last_request_idx = cpf_requests.index[-1]
+            df.loc[last_request_idx, 'status_pedido'] = new_status
+            
+            return write_csv(SOLICITACOES_CSV, df)
     except Exception as e:
         print(f"Error updating request status: {e}")
         return False
@@ -1,50 +1,572 @@
 """Tools for currency exchange rates."""
+import asyncio
+import aiohttp
+import json
+import os
+import re
 import requests
-from typing import Optional, Dict, Tuple
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, List, Tuple, Any, Callable, Set
 from datetime import datetime
+from src.utils.config import (
+    EXCHANGE_API_URL,
+    EXCHANGE_RATE_TTL,
+    EXCHANGE_HTTP_MAX_CONNECTIONS,
+    EXCHANGE_HTTP_MAX_PER_HOST,
+    EXCHANGE_HTTP_KEEPALIVE,
+    EXCHANGE_BREAKER_FAILURES,
+    EXCHANGE_BREAKER_RESET,
+    EXCHANGE_REFRESH_AHEAD,
+    EXCHANGE_SNAPSHOT_PATH
+)
+from src.utils.constants import CURRENCY_ALIASES
+from src.utils.file_utils import copy_file_mode
+from src.utils.text_utils import fold_accents
 
 
-def get_exchange_rate(currency: str = "USD") -> Optional[Dict[str, any]]:
+class CircuitBreaker:
+    """
+    Circuit breaker for the rate provider.
+    Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    seconds it lets a single probe through (half-open) and closes on success.
     """
-    Get current exchange rate for specified currency.
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self) -> None:
+        """Close the breaker and forget past failures."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._opened_at = 0.0
+            self._probe_in_flight = False
+            self.times_opened = 0
+    
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the timeout elapsed."""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            return self._state
+    
+    def allow_request(self) -> bool:
+        """Check whether a call to the provider may be attempted now."""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        """Record a successful call."""
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self) -> None:
+        """Record a failed call, opening the breaker when the threshold is reached."""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get breaker state and counters."""
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self.times_opened
+            }
+
+
+# One BRL rate table serves every currency until it expires
+_rate_cache_lock = threading.Lock()
+_rate_cache: Dict[str, Any] = {
+    "rates": None,
+    "fetched_at": 0.0,
+    "timestamp": None,
+    "snapshot_loaded": False
+}
+_cache_stats = {"hits": 0, "misses": 0}
+_fetch_stats = {"fetches": 0, "failures": 0, "coalesced": 0, "short_circuited": 0, "stale_served": 0}
+
+circuit_breaker = CircuitBreaker(EXCHANGE_BREAKER_FAILURES, EXCHANGE_BREAKER_RESET)
+
+
+class _Flight:
+    """A provider fetch in progress, shared by every thread waiting on it."""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+
+
+# In-flight fetches: one per process for threads, one task per event loop
+_sync_flight: Dict[str, Optional[_Flight]] = {"flight": None}
+_async_flight: Dict[str, Any] = {"task": None, "loop": None}
+
+# Shared keep-alive HTTP pool for the async path, bound to one event loop
+_http_session: Dict[str, Any] = {"session": None, "loop": None, "guard": None}
+
+# Background thread refreshing the table before it expires (started by the app)
+_refresher: Dict[str, Any] = {"thread": None, "stop": None}
+
+# Revalidation tasks of the async path, referenced until they finish
+_revalidation_tasks: Set[asyncio.Task] = set()
+
+
+def fetch_rate_table() -> Dict[str, float]:
+    """
+    Download the full BRL rate table in a single request.
     Uses exchangerate-api.com free tier.
     """
+    # Using free API that doesn't require authentication
+    response = requests.get(EXCHANGE_API_URL, timeout=5)
+    response.raise_for_status()
+    
+    data = response.json()
+    return data.get('rates', {})
+
+
+async def _close_with_loop(session: aiohttp.ClientSession):
+    """
+    Async generator parked on the session's loop. asyncio.run closes pending
+    async generators before closing the loop, which runs this finally and
+    closes the session with its loop. The Streamlit UI keeps one loop for
+    its lifetime, so there the pool lives as long as the server.
+    """
     try:
-        # Using free API that doesn't require authentication
-        url = f"https://api.exchangerate-api.com/v4/latest/BRL"
-        
-        response = requests.get(url, timeout=5)
+        yield
+    finally:
+        if not session.closed:
+            await session.close()
+
+
+async def _get_http_session() -> aiohttp.ClientSession:
+    """
+    Get the pooled HTTP session for the running event loop.
+    Connections are kept alive and capped per host, so concurrent quotes
+    reuse sockets instead of paying a TCP+TLS handshake each. The session is
+    closed when its loop shuts down, or when another loop takes over the pool.
+    """
+    loop = asyncio.get_running_loop()
+    session = _http_session["session"]
+    if session is None or session.closed or _http_session["loop"] is not loop:
+        previous, previous_loop = session, _http_session["loop"]
+        if previous is not None and not previous.closed and not previous_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(previous.close(), previous_loop)
+
+        connector = aiohttp.TCPConnector(
+            limit=EXCHANGE_HTTP_MAX_CONNECTIONS,
+            limit_per_host=EXCHANGE_HTTP_MAX_PER_HOST,
+            keepalive_timeout=EXCHANGE_HTTP_KEEPALIVE
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=5))
+        guard = _close_with_loop(session)
+        await guard.__anext__()
+        _http_session["session"] = session
+        _http_session["loop"] = loop
+        _http_session["guard"] = guard
+    return session
+
+
+async def close_http_session() -> None:
+    """Close the pooled HTTP session now (it is also closed with its event loop)."""
+    session = _http_session["session"]
+    _http_session["session"] = None
+    _http_session["loop"] = None
+    _http_session["guard"] = None
+    if session is not None and not session.closed:
+        await session.close()
+
+
+async def afetch_rate_table() -> Dict[str, float]:
+    """Download the full BRL rate table through the pooled async client."""
+    session = await _get_http_session()
+    async with session.get(EXCHANGE_API_URL) as response:
         response.raise_for_status()
-        
-        data = response.json()
-        rates = data.get('rates', {})
-        
-        if currency == "USD":
-            rate = rates.get('USD')
-            if rate:
-                return {
-                    "moeda": "USD",
-                    "taxa": 1 / rate if rate > 0 else None,  # BRL to USD
-                    "timestamp": datetime.now().isoformat(),
-                    "origem": "BRL"
-                }
-        elif currency == "EUR":
-            rate = rates.get('EUR')
-            if rate:
-                return {
-                    "moeda": "EUR",
-                    "taxa": 1 / rate if rate > 0 else None,
-                    "timestamp": datetime.now().isoformat(),
-                    "origem": "BRL"
-                }
-        
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange rate: {e}")
+        data = await response.json(content_type=None)
+    return data.get('rates', {})
+
+
+def _save_snapshot(rates: Dict[str, float], timestamp: str) -> None:
+    """Persist the table atomically so a cold start can serve it at once."""
+    tmp_path = None
+    try:
+        directory = os.path.dirname(os.path.abspath(EXCHANGE_SNAPSHOT_PATH))
+        with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False, encoding="utf-8") as f:
+            tmp_path = f.name
+            json.dump({"rates": rates, "timestamp": timestamp, "saved_at": time.time()}, f)
+        copy_file_mode(EXCHANGE_SNAPSHOT_PATH, tmp_path)
+        os.replace(tmp_path, EXCHANGE_SNAPSHOT_PATH)
+    except Exception as e:
+        print(f"Error saving exchange rate snapshot: {e}")
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _load_snapshot() -> None:
+    """Seed an empty cache from the on-disk snapshot, keeping its real age."""
+    with _rate_cache_lock:
+        if _rate_cache["snapshot_loaded"]:
+            return
+        _rate_cache["snapshot_loaded"] = True
+        if _rate_cache["rates"] is not None or not os.path.exists(EXCHANGE_SNAPSHOT_PATH):
+            return
+        try:
+            with open(EXCHANGE_SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            age = max(0.0, time.time() - snapshot["saved_at"])
+            _rate_cache["rates"] = snapshot["rates"]
+            _rate_cache["timestamp"] = snapshot["timestamp"]
+            _rate_cache["fetched_at"] = time.monotonic() - age
+        except Exception as e:
+            print(f"Error loading exchange rate snapshot: {e}")
+
+
+def _get_table_age() -> Optional[float]:
+    """Seconds since the cached table was fetched, or None without a table."""
+    with _rate_cache_lock:
+        if _rate_cache["rates"] is None:
+            return None
+        return time.monotonic() - _rate_cache["fetched_at"]
+
+
+def _get_cached_table(ttl: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Return the cached table if younger than `ttl`, counting the hit or miss."""
+    ttl = EXCHANGE_RATE_TTL if ttl is None else ttl
+    with _rate_cache_lock:
+        if _rate_cache["rates"] is not None and time.monotonic() - _rate_cache["fetched_at"] < ttl:
+            _cache_stats["hits"] += 1
+            return {"rates": _rate_cache["rates"], "timestamp": _rate_cache["timestamp"]}
+        _cache_stats["misses"] += 1
         return None
+
+
+def _get_stale_table() -> Optional[Dict[str, Any]]:
+    """Return the last known good table regardless of age."""
+    with _rate_cache_lock:
+        if _rate_cache["rates"] is None:
+            return None
+        _fetch_stats["stale_served"] += 1
+        return {"rates": _rate_cache["rates"], "timestamp": _rate_cache["timestamp"]}
+
+
+def _store_rate_table(rates: Dict[str, float], save_snapshot: bool = True) -> Dict[str, Any]:
+    """Store a freshly fetched table in the cache (and the on-disk snapshot)."""
+    circuit_breaker.record_success()
+    with _rate_cache_lock:
+        _fetch_stats["fetches"] += 1
+        _rate_cache["rates"] = rates
+        _rate_cache["fetched_at"] = time.monotonic()
+        _rate_cache["timestamp"] = datetime.now().isoformat()
+        table = {"rates": rates, "timestamp": _rate_cache["timestamp"]}
+    if save_snapshot:
+        _save_snapshot(rates, table["timestamp"])
+    return table
+
+
+def _record_fetch_failure(error: Exception) -> Optional[Dict[str, Any]]:
+    """Count a failed fetch and fall back to the last known good table."""
+    if isinstance(error, (requests.exceptions.RequestException, aiohttp.ClientError, asyncio.TimeoutError)):
+        print(f"Error fetching exchange rate: {error}")
+    else:
+        print(f"Unexpected error in exchange rate: {error}")
+    circuit_breaker.record_failure()
+    with _rate_cache_lock:
+        _fetch_stats["failures"] += 1
+    return _get_stale_table()
+
+
+def _short_circuit() -> Optional[Dict[str, Any]]:
+    """Serve the last known good table without calling an unhealthy provider."""
+    with _rate_cache_lock:
+        _fetch_stats["short_circuited"] += 1
+    return _get_stale_table()
+
+
+def _fetch_coalesced() -> Optional[Dict[str, Any]]:
+    """Fetch the table once for all threads asking at the same time."""
+    with _rate_cache_lock:
+        flight = _sync_flight["flight"]
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _sync_flight["flight"] = flight
+        else:
+            _fetch_stats["coalesced"] += 1
+    
+    if not leader:
+        flight.done.wait()
+        return flight.result
+    
+    try:
+        flight.result = _store_rate_table(fetch_rate_table())
     except Exception as e:
-        print(f"Unexpected error in exchange rate: {e}")
+        flight.result = _record_fetch_failure(e)
+    finally:
+        with _rate_cache_lock:
+            _sync_flight["flight"] = None
+        flight.done.set()
+    return flight.result
+
+
+async def _afetch_and_store() -> Optional[Dict[str, Any]]:
+    """Fetch and cache the table on the event loop; the snapshot is written off the loop."""
+    try:
+        rates = await afetch_rate_table()
+    except Exception as e:
+        return _record_fetch_failure(e)
+    table = _store_rate_table(rates, save_snapshot=False)
+    await asyncio.get_running_loop().run_in_executor(None, _save_snapshot, rates, table["timestamp"])
+    return table
+
+
+async def _afetch_coalesced() -> Optional[Dict[str, Any]]:
+    """Fetch the table once for all coroutines of this loop asking at the same time."""
+    loop = asyncio.get_running_loop()
+    task = _async_flight["task"]
+    if task is None or task.done() or _async_flight["loop"] is not loop:
+        task = loop.create_task(_afetch_and_store())
+        _async_flight["task"] = task
+        _async_flight["loop"] = loop
+    else:
+        with _rate_cache_lock:
+            _fetch_stats["coalesced"] += 1
+    # Shield so one cancelled waiter does not cancel the fetch for the others
+    return await asyncio.shield(task)
+
+
+def _refresh_in_background() -> None:
+    """Start a one-off refresh thread unless a fetch is already running."""
+    with _rate_cache_lock:
+        if _sync_flight["flight"] is not None:
+            return
+    if circuit_breaker.allow_request():
+        threading.Thread(target=_fetch_coalesced, name="fx-revalidate", daemon=True).start()
+
+
+def _arefresh_in_background() -> None:
+    """Revalidate through the pooled async client on the running loop, unless a fetch is running."""
+    loop = asyncio.get_running_loop()
+    task = _async_flight["task"]
+    if task is not None and not task.done() and _async_flight["loop"] is loop:
+        return
+    if circuit_breaker.allow_request():
+        task = loop.create_task(_afetch_coalesced())
+        _revalidation_tasks.add(task)
+        task.add_done_callback(_revalidation_tasks.discard)
+
+
+def _refresher_loop(stop: threading.Event) -> None:
+    """Refresh the table once it reaches EXCHANGE_REFRESH_AHEAD of its TTL."""
+    while not stop.is_set():
+        refresh_after = EXCHANGE_RATE_TTL * EXCHANGE_REFRESH_AHEAD
+        age = _get_table_age()
+        if age is not None and age < refresh_after:
+            wait = refresh_after - age
+        elif circuit_breaker.allow_request():
+            fetched = _fetch_coalesced() is not None and _get_table_age() < refresh_after
+            wait = refresh_after if fetched else min(1.0, refresh_after)
+        else:
+            wait = circuit_breaker.reset_timeout
+        stop.wait(max(wait, 0.01))
+
+
+def start_rate_refresher() -> None:
+    """
+    Start the background refresher thread (idempotent). Called at app
+    startup (SessionManager.warm_up) when EXCHANGE_BACKGROUND_REFRESH is on.
+    """
+    thread = _refresher["thread"]
+    if thread is not None and thread.is_alive():
+        return
+    stop = threading.Event()
+    thread = threading.Thread(target=_refresher_loop, args=(stop,), name="fx-refresher", daemon=True)
+    _refresher["thread"] = thread
+    _refresher["stop"] = stop
+    thread.start()
+
+
+def stop_rate_refresher() -> None:
+    """Stop the background refresher thread."""
+    stop = _refresher["stop"]
+    thread = _refresher["thread"]
+    if stop is not None:
+        stop.set()
+    if thread is not None and thread is not threading.current_thread():
+        thread.join(timeout=5)
+    _refresher["thread"] = None
+    _refresher["stop"] = None
+
+
+def _serve_table(ttl: Optional[float], wait: bool,
+                 revalidate: Callable[[], None]) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Shared front half of get_rate_table/aget_rate_table.
+    Returns (table, done); when done is False the caller must fetch.
+    """
+    _load_snapshot()
+    
+    table = _get_cached_table(ttl)
+    if table is not None:
+        return table, True
+    
+    # Stale-while-revalidate: answer from the snapshot, refresh off the request path
+    if not wait:
+        table = _get_stale_table()
+        if table is not None:
+            revalidate()
+            return table, True
+    
+    if not circuit_breaker.allow_request():
+        return _short_circuit(), True
+    return None, False
+
+
+def get_rate_table(ttl: Optional[float] = None, wait: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Get the BRL rate table. Returns {"rates": ..., "timestamp": ...}.
+    A table older than `ttl` seconds (defaults to EXCHANGE_RATE_TTL) is still
+    served immediately while a background thread refreshes it; pass
+    wait=True to block on the refresh instead. Only a cold start with no
+    snapshot on disk waits for the provider. Concurrent fetches are
+    coalesced and an unhealthy provider is skipped by the circuit breaker.
+    """
+    table, done = _serve_table(ttl, wait, _refresh_in_background)
+    if done:
+        return table
+    return _fetch_coalesced()
+
+
+async def aget_rate_table(ttl: Optional[float] = None, wait: bool = False) -> Optional[Dict[str, Any]]:
+    """Async get_rate_table: never blocks the event loop on the network or the disk."""
+    if not _rate_cache["snapshot_loaded"]:
+        await asyncio.get_running_loop().run_in_executor(None, _load_snapshot)
+    table, done = _serve_table(ttl, wait, _arefresh_in_background)
+    if done:
+        return table
+    return await _afetch_coalesced()
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """Get rate cache hit/miss counters."""
+    with _rate_cache_lock:
+        return dict(_cache_stats)
+
+
+def get_fx_health() -> Dict[str, Any]:
+    """Get circuit breaker state together with cache and fetch counters."""
+    breaker = circuit_breaker.get_stats()
+    with _rate_cache_lock:
+        return {
+            "breaker": breaker,
+            **_cache_stats,
+            **_fetch_stats,
+            "last_fetch": _rate_cache["timestamp"],
+            "refresher_running": _refresher["thread"] is not None and _refresher["thread"].is_alive()
+        }
+
+
+def clear_rate_cache() -> None:
+    """
+    Drop the in-memory rate table, reset counters and close the breaker.
+    The on-disk snapshot is kept and reloaded on the next access.
+    """
+    with _rate_cache_lock:
+        _rate_cache["rates"] = None
+        _rate_cache["fetched_at"] = 0.0
+        _rate_cache["timestamp"] = None
+        _rate_cache["snapshot_loaded"] = False
+        for stats in (_cache_stats, _fetch_stats):
+            for key in stats:
+                stats[key] = 0
+    circuit_breaker.reset()
+
+
+def _build_exchange_rate(currency: str, table: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Build the quote for one currency from a rate table."""
+    rate = table["rates"].get(currency)
+    if rate:
+        return {
+            "moeda": currency,
+            "taxa": 1 / rate if rate > 0 else None,  # BRL to currency
+            "timestamp": table["timestamp"],
+            "origem": "BRL"
+        }
+    return None
+
+
+def get_exchange_rate(currency: str = "USD") -> Optional[Dict[str, any]]:
+    """Get current exchange rate for specified currency."""
+    table = get_rate_table()
+    if table is None:
+        return None
+    return _build_exchange_rate(currency, table)
+
+
+async def aget_exchange_rate(currency: str = "USD") -> Optional[Dict[str, any]]:
+    """Async get_exchange_rate."""
+    table = await aget_rate_table()
+    if table is None:
         return None
+    return _build_exchange_rate(currency, table)
+
+
+def _alias_pattern(alias: str) -> str:
+    """Regex for one folded alias, each word optionally pluralized."""
+    words = []
+    for word in fold_accents(alias).split():
+        words.append(re.escape(word) + (r"(?:e?s)?" if word[-1].isalpha() else ""))
+    return r"\s+".join(words)
+
+
+def _compile_currency_pattern(aliases: Dict[str, List[str]]) -> Tuple[re.Pattern, List[str]]:
+    """Compile the gazetteer into one regex; group N matches currency N of the returned list."""
+    entries = sorted(
+        ((alias, currency) for currency, names in aliases.items() for alias in names),
+        key=lambda entry: len(entry[0]),
+        reverse=True
+    )
+    pattern = "|".join(f"({_alias_pattern(alias)})" for alias, _ in entries)
+    return re.compile(r"(?<!\w)(?:" + pattern + r")(?!\w)"), [currency for _, currency in entries]
+
+
+_currency_pattern, _currency_groups = _compile_currency_pattern(CURRENCY_ALIASES)
+
+
+def extract_currencies(text: str) -> List[str]:
+    """
+    Find the currencies mentioned in a message ("dólar e euro" -> ["USD", "EUR"]).
+    Returns ISO codes in order of first mention, without duplicates.
+    """
+    currencies = []
+    for match in _currency_pattern.finditer(fold_accents(text)):
+        currency = _currency_groups[match.lastindex - 1]
+        if currency not in currencies:
+            currencies.append(currency)
+    return currencies
 
 
 def format_exchange_rate(exchange_data: Dict) -> str:
@@ -62,10 +584,29 @@ def format_exchange_rate(exchange_data: Dict) -> str:
 
 
 def get_multiple_rates(currencies: list = ["USD", "EUR"]) -> Dict[str, any]:
-    """Get exchange rates for multiple currencies."""
+    """Get exchange rates for multiple currencies from one rate table."""
+    rates = {}
+    table = get_rate_table()
+    if table is None:
+        return rates
+    
+    for currency in currencies:
+        rate = _build_exchange_rate(currency, table)
+        if rate:
+            rates[currency] = rate
+    
+    return rates
+
+
+async def aget_multiple_rates(currencies: list = ["USD", "EUR"]) -> Dict[str, any]:
+    """Async get_multiple_rates."""
     rates = {}
+    table = await aget_rate_table()
+    if table is None:
+        return rates
+    
     for currency in currencies:
-        rate = get_exchange_rate(currency)
+        rate = _build_exchange_rate(currency, table)
         if rate:
             rates[currency] = rate
     
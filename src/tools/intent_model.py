@@ -0,0 +1,282 @@
+"""
+Local intent model for routing customer messages.
+
+Hashed word and character n-gram TF-IDF features feed a softmax linear
+classifier trained offline with NumPy; prediction is a sparse dot product.
+
+Train:  python -m src.tools.intent_model train
+Report: python -m src.tools.intent_model report [--llm]
+"""
+import argparse
+import asyncio
+import csv
+import re
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from src.utils.config import (
+    INTENT_MODEL_PATH, INTENT_TRAIN_CSV, INTENT_TEST_CSV, INTENT_CONFIDENCE_THRESHOLD
+)
+from src.utils.text_utils import fold_accents
+
+
+MODEL_FORMAT_VERSION = 1
+N_FEATURES = 2 ** 14
+CHAR_NGRAMS = (3, 4, 5)
+
+_WORD_RE = re.compile(r"\w+")
+_DIGIT_RE = re.compile(r"\d")
+
+
+def extract_ngrams(text: str) -> List[str]:
+    """Word unigrams, word bigrams and in-word character n-grams of folded text."""
+    words = _WORD_RE.findall(_DIGIT_RE.sub("0", fold_accents(text)))
+    grams = ["w:" + word for word in words]
+    grams.extend("b:" + first + " " + second for first, second in zip(words, words[1:]))
+    for word in words:
+        padded = f" {word} "
+        for n in CHAR_NGRAMS:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def hash_ngrams(text: str, n_features: int = N_FEATURES) -> Tuple[np.ndarray, np.ndarray]:
+    """Hash n-grams into feature indices with log-scaled counts."""
+    counts: Dict[int, int] = {}
+    for gram in extract_ngrams(text):
+        index = zlib.crc32(gram.encode("utf-8")) % n_features
+        counts[index] = counts.get(index, 0) + 1
+    indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+    values = np.log1p(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)))
+    return indices, values
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+
+class IntentModel:
+    """Softmax linear classifier over hashed TF-IDF n-gram features."""
+
+    def __init__(self, labels: List[str], weights: np.ndarray, bias: np.ndarray, idf: np.ndarray):
+        self.labels = list(labels)
+        self.weights = weights
+        self.bias = bias
+        self.idf = idf
+        self.n_features = len(idf)
+
+    def vectorize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Sparse L2-normalised TF-IDF vector as (indices, values)."""
+        indices, values = hash_ngrams(text, self.n_features)
+        values = values * self.idf[indices]
+        norm = np.sqrt(values @ values)
+        return indices, (values / norm if norm else values)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        """Class probabilities, in `labels` order."""
+        indices, values = self.vectorize(text)
+        return _softmax(values @ self.weights[indices] + self.bias)
+
+    def predict(self, text: str) -> Optional[Tuple[str, float]]:
+        """Get the most likely intent and its probability, or None for empty text."""
+        if not _WORD_RE.search(text):
+            return None
+        probabilities = self.predict_proba(text)
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[str], n_features: int = N_FEATURES,
+              epochs: int = 400, learning_rate: float = 2.0, l2: float = 1e-4) -> "IntentModel":
+        """Fit by full-batch gradient descent on the cross-entropy loss."""
+        classes = sorted(set(labels))
+        hashed = [hash_ngrams(text, n_features) for text in texts]
+
+        counts = np.zeros((len(texts), n_features))
+        for row, (indices, values) in enumerate(hashed):
+            counts[row, indices] = values
+
+        document_frequency = np.count_nonzero(counts, axis=0)
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1
+        # Weights of features never seen in training stay zero, so fit only the active columns
+        active = np.flatnonzero(document_frequency)
+        features = counts[:, active] * idf[active]
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        features /= np.where(norms == 0, 1, norms)
+
+        targets = np.zeros((len(texts), len(classes)))
+        targets[np.arange(len(texts)), [classes.index(label) for label in labels]] = 1
+
+        active_weights = np.zeros((len(active), len(classes)))
+        bias = np.zeros(len(classes))
+        for _ in range(epochs):
+            error = (_softmax(features @ active_weights + bias) - targets) / len(texts)
+            active_weights -= learning_rate * (features.T @ error + l2 * active_weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        weights = np.zeros((n_features, len(classes)), dtype=np.float32)
+        weights[active] = active_weights
+        return cls(classes, weights, bias.astype(np.float32), idf.astype(np.float32))
+
+    def save(self, path: str) -> None:
+        """Serialize to a compressed .npz file."""
+        np.savez_compressed(
+            path,
+            version=np.array(MODEL_FORMAT_VERSION),
+            labels=np.array(self.labels),
+            weights=self.weights,
+            bias=self.bias,
+            idf=self.idf
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "IntentModel":
+        """Load a model saved with `save`."""
+        with np.load(path, allow_pickle=False) as data:
+            version = int(data["version"])
+            if version != MODEL_FORMAT_VERSION:
+                raise ValueError(f"unsupported intent model version {version}")
+            return cls([str(label) for label in data["labels"]], data["weights"], data["bias"], data["idf"])
+
+
+_model_state = {"model": None, "loaded": False}
+_model_lock = threading.Lock()
+
+
+def get_intent_model() -> Optional[IntentModel]:
+    """Get the shipped model, loaded on first use; None if it cannot be read."""
+    if not _model_state["loaded"]:
+        with _model_lock:
+            if not _model_state["loaded"]:
+                try:
+                    _model_state["model"] = IntentModel.load(INTENT_MODEL_PATH)
+                except Exception as e:
+                    print(f"Error loading intent model: {e}")
+                _model_state["loaded"] = True
+    return _model_state["model"]
+
+
+def predict_intent(text: str) -> Optional[Tuple[str, float]]:
+    """Classify with the shipped model; None when no model is available."""
+    model = get_intent_model()
+    return model.predict(text) if model else None
+
+
+def load_labelled_csv(path: str) -> Tuple[List[str], List[str]]:
+    """Read a labelled utterance CSV (texto, categoria)."""
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [row["texto"] for row in rows], [row["categoria"] for row in rows]
+
+
+def _evaluate(predict, texts: List[str], labels: List[str]) -> Dict[str, float]:
+    """Accuracy, coverage at the routing threshold and per-message latency of `predict`."""
+    latencies = []
+    correct = covered = covered_correct = 0
+    for text, label in zip(texts, labels):
+        start = time.perf_counter()
+        prediction = predict(text)
+        latencies.append(time.perf_counter() - start)
+        intent, confidence = prediction if prediction else (None, 0.0)
+        correct += intent == label
+        if confidence >= INTENT_CONFIDENCE_THRESHOLD:
+            covered += 1
+            covered_correct += intent == label
+    latencies_us = np.array(latencies) * 1e6
+    return {
+        "accuracy": correct / len(texts),
+        "coverage": covered / len(texts),
+        "covered_accuracy": covered_correct / covered if covered else 0.0,
+        "mean_us": float(latencies_us.mean()),
+        "p95_us": float(np.percentile(latencies_us, 95))
+    }
+
+
+def _evaluate_llm(texts: List[str], labels: List[str]) -> Dict[str, float]:
+    """Accuracy and latency of the Triage Agent's LLM classifier."""
+    from src.agents.triage_agent import TriageAgent
+    agent = TriageAgent()
+
+    async def run():
+        results = []
+        for text in texts:
+            start = time.perf_counter()
+            intent = await agent.classify_with_llm(text)
+            results.append((intent, time.perf_counter() - start))
+        return results
+
+    results = asyncio.run(run())
+    latencies_us = np.array([elapsed for _, elapsed in results]) * 1e6
+    correct = sum(intent == label for (intent, _), label in zip(results, labels))
+    return {
+        "accuracy": correct / len(texts),
+        "coverage": 1.0,
+        "covered_accuracy": correct / len(texts),
+        "mean_us": float(latencies_us.mean()),
+        "p95_us": float(np.percentile(latencies_us, 95))
+    }
+
+
+def report(model: IntentModel, test_path: str, with_llm: bool = False) -> None:
+    """Print accuracy and latency of each classifier on the held-out set."""
+    from src.tools.intent_tools import intent_matcher
+    texts, labels = load_labelled_csv(test_path)
+
+    def tiered(text):
+        prediction = intent_matcher.match(text)
+        if prediction and prediction[1] >= INTENT_CONFIDENCE_THRESHOLD:
+            return prediction
+        return model.predict(text)
+
+    classifiers = [("rules", intent_matcher.match), ("model", model.predict), ("rules+model", tiered)]
+    for text in texts[:5]:
+        model.predict(text)  # warm up
+    results = [(name, _evaluate(predict, texts, labels)) for name, predict in classifiers]
+    if with_llm:
+        try:
+            results.append(("llm", _evaluate_llm(texts, labels)))
+        except Exception as e:
+            print(f"Error evaluating LLM classifier: {e}")
+
+    print(f"Held-out set: {test_path} ({len(texts)} messages, threshold {INTENT_CONFIDENCE_THRESHOLD})")
+    print(f"{'classifier':<12} {'accuracy':>9} {'coverage':>9} {'acc@cov':>8} {'mean us':>10} {'p95 us':>10}")
+    for name, stats in results:
+        print(
+            f"{name:<12} {stats['accuracy']:>9.1%} {stats['coverage']:>9.1%} "
+            f"{stats['covered_accuracy']:>8.1%} {stats['mean_us']:>10.1f} {stats['p95_us']:>10.1f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Train and evaluate the local intent model.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="train on labelled utterances and save the model")
+    train_parser.add_argument("--data", default=INTENT_TRAIN_CSV)
+    train_parser.add_argument("--test", default=INTENT_TEST_CSV)
+    train_parser.add_argument("--output", default=INTENT_MODEL_PATH)
+    train_parser.add_argument("--epochs", type=int, default=400)
+
+    report_parser = commands.add_parser("report", help="accuracy/latency report on the held-out set")
+    report_parser.add_argument("--model", default=INTENT_MODEL_PATH)
+    report_parser.add_argument("--test", default=INTENT_TEST_CSV)
+    report_parser.add_argument("--llm", action="store_true", help="also query the configured LLM")
+
+    args = parser.parse_args(argv)
+    if args.command == "train":
+        texts, labels = load_labelled_csv(args.data)
+        start = time.perf_counter()
+        model = IntentModel.train(texts, labels, epochs=args.epochs)
+        print(f"Trained on {len(texts)} messages in {time.perf_counter() - start:.2f}s")
+        model.save(args.output)
+        print(f"Saved model to {args.output}")
+        report(model, args.test)
+    else:
+        report(IntentModel.load(args.model), args.test, with_llm=args.llm)
+
+
+if __name__ == "__main__":
+    main()
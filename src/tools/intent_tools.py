@@ -0,0 +1,160 @@
+"""Intent matching tools for routing customer messages."""
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Callable, Awaitable, Any
+from src.utils.config import INTENT_CONFIDENCE_THRESHOLD
+from src.utils.constants import INTENT_RULES, NEGATION_WORDS
+from src.tools.intent_model import predict_intent
+from src.utils.text_utils import fold_accents
+
+
+def _keyword_variants(keyword: str) -> List[str]:
+    """Folded keyword plus irregular "-ão" plurals ("cotação" -> "cotacoes")."""
+    folded = fold_accents(keyword)
+    if folded.endswith("ao"):
+        return [folded, folded[:-2] + "oes", folded[:-2] + "aes"]
+    return [folded]
+
+
+class IntentMatcher:
+    """
+    Keyword intent matcher compiled into a single regex over accent-folded text.
+    Keywords match whole words, regular plurals ("s"/"es") and "-ões"/"-ães" included.
+    A keyword up to `negation_window` words after a negation in the same clause
+    is ignored, leaving the message to the next tiers.
+    """
+    
+    def __init__(self, rules: Dict[str, List[str]], negations: List[str] = NEGATION_WORDS,
+                 negation_window: int = 3):
+        """Compile the rules ({intent: [keywords]}, in priority order)."""
+        self.negations = {fold_accents(word) for word in negations}
+        self.negation_window = negation_window
+        self.priority = {intent: position for position, intent in enumerate(rules)}
+        self.keyword_intents: Dict[str, str] = {}
+        for intent, keywords in rules.items():
+            for keyword in keywords:
+                for variant in _keyword_variants(keyword):
+                    self.keyword_intents.setdefault(variant, intent)
+        
+        # Longest first so multi-word keywords win over their prefixes
+        alternatives = sorted(self.keyword_intents, key=len, reverse=True)
+        self.pattern = re.compile(
+            r"\b(" + "|".join(re.escape(keyword) for keyword in alternatives) + r")(?:e?s)?\b"
+        )
+    
+    def _is_negated(self, text: str, position: int) -> bool:
+        """Check whether a negation precedes `position` within the window, in the same clause."""
+        clause = re.split(r"[,.;:!?]", text[:position])[-1]
+        return any(word in self.negations for word in clause.split()[-self.negation_window:])
+    
+    def rank(self, text: str) -> List[Tuple[str, float]]:
+        """
+        Rank matching intents by rule priority, as the router always checked
+        them (farewell first), whatever the number of hits. Negated keywords
+        do not count.
+        Returns [(intent, confidence)], confidence being the intent's share of all hits.
+        """
+        folded = fold_accents(text)
+        hits: Dict[str, int] = {}
+        for match in self.pattern.finditer(folded):
+            if self._is_negated(folded, match.start()):
+                continue
+            intent = self.keyword_intents[match.group(1)]
+            hits[intent] = hits.get(intent, 0) + 1
+        
+        total = sum(hits.values())
+        ranked = sorted(hits.items(), key=lambda item: self.priority[item[0]])
+        return [(intent, count / total) for intent, count in ranked]
+    
+    def match(self, text: str) -> Optional[Tuple[str, float]]:
+        """Get the best intent and its confidence, or None if nothing matched."""
+        ranked = self.rank(text)
+        return ranked[0] if ranked else None
+
+
+intent_matcher = IntentMatcher(INTENT_RULES)
+
+
+class TieredIntentClassifier:
+    """
+    Classify messages with cheap local tiers first and the LLM last.
+    Each local tier returns (intent, confidence) or None; the first one at or
+    above the threshold answers. Per-tier hit counts and latency are recorded.
+    """
+    
+    LLM_TIER = "llm"
+    
+    def __init__(self, tiers: List[Tuple[str, Callable[[str], Optional[Tuple[str, float]]]]],
+                 threshold: float = INTENT_CONFIDENCE_THRESHOLD):
+        self.tiers = list(tiers)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.reset_stats()
+    
+    def add_tier(self, name: str, predict: Callable[[str], Optional[Tuple[str, float]]]) -> None:
+        """Append a local tier, consulted after the existing ones."""
+        self.tiers.append((name, predict))
+        with self._lock:
+            self._stats.setdefault(name, {"attempts": 0, "answered": 0, "total_ms": 0.0})
+    
+    def reset_stats(self) -> None:
+        """Reset per-tier counters."""
+        with self._lock:
+            self._total = 0
+            self._stats: Dict[str, Dict[str, Any]] = {
+                name: {"attempts": 0, "answered": 0, "total_ms": 0.0}
+                for name in [name for name, _ in self.tiers] + [self.LLM_TIER]
+            }
+    
+    def _record(self, tier: str, elapsed: float, answered: bool) -> None:
+        with self._lock:
+            stats = self._stats[tier]
+            stats["attempts"] += 1
+            stats["total_ms"] += elapsed * 1000
+            if answered:
+                stats["answered"] += 1
+                self._total += 1
+    
+    async def classify(self, text: str, llm_classify: Callable[[str], Awaitable[str]]) -> Tuple[str, str, float]:
+        """
+        Classify `text`; `llm_classify` is awaited only when no local tier is confident.
+        Returns (intent, tier, confidence).
+        """
+        for name, predict in self.tiers:
+            start = time.perf_counter()
+            prediction = predict(text)
+            answered = prediction is not None and prediction[1] >= self.threshold
+            self._record(name, time.perf_counter() - start, answered)
+            if answered:
+                return prediction[0], name, prediction[1]
+        
+        start = time.perf_counter()
+        intent = await llm_classify(text)
+        self._record(self.LLM_TIER, time.perf_counter() - start, True)
+        return intent, self.LLM_TIER, 1.0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rate and mean latency per tier, plus LLM calls saved."""
+        with self._lock:
+            total = self._total
+            tiers = {
+                name: {
+                    "attempts": stats["attempts"],
+                    "answered": stats["answered"],
+                    "hit_rate": stats["answered"] / total if total else 0.0,
+                    "avg_latency_ms": stats["total_ms"] / stats["attempts"] if stats["attempts"] else 0.0
+                }
+                for name, stats in self._stats.items()
+            }
+        return {
+            "total": total,
+            "llm_calls_saved": total - tiers[self.LLM_TIER]["answered"],
+            "tiers": tiers
+        }
+
+
+intent_classifier = TieredIntentClassifier([
+    ("rules", intent_matcher.match),
+    ("model", predict_intent)
+])
@@ -1,13 +1,37 @@
 """Score calculation and management tools."""
-from typing import Dict, Tuple, Optional
+import threading
+import numpy as np
+import pandas as pd
+from bisect import bisect_right
+from typing import Dict, Tuple, Optional, Any, Mapping, Union, Iterable
+from src.utils.config import SCORE_LIMITE_CSV, SOLICITACOES_CSV
 from src.utils.constants import SCORE_WEIGHTS
 from src.tools.csv_tools import (
+    csv_rewrite_lock,
     get_cliente_by_cpf, 
+    get_clientes_frame,
     update_cliente_score,
-    get_score_limits
+    read_csv,
+    write_csv,
+    get_file_signature
 )
 
 
+# Answers normalized to "sim" when asked about active debts
+DEBT_YES_ANSWERS = ["sim", "yes", "true", "s"]
+
+# Score bands sorted by score_minimo, reloaded when score_limite.csv changes
+_score_bands_lock = threading.Lock()
+_score_bands: Dict[str, Any] = {
+    "path": None,
+    "signature": None,
+    "score_minimo": [],
+    "score_maximo": [],
+    "limite_minimo": [],
+    "limite_maximo": []
+}
+
+
 def calculate_credit_score(
     renda_mensal: float,
     tipo_emprego: str,
@@ -30,7 +54,7 @@ def calculate_credit_score(
     dependents_key = num_dependentes if num_dependentes in SCORE_WEIGHTS["peso_dependentes"] else "3+"
     
     # Normalize debt status
-    divida_key = "sim" if tem_dividas.lower() in ["sim", "yes", "true", "s"] else "não"
+    divida_key = "sim" if tem_dividas.lower() in DEBT_YES_ANSWERS else "não"
     
     # Calculate components
     income_ratio = min((renda_mensal / (despesas_fixas + 1)) * SCORE_WEIGHTS["peso_renda"], 1000)
@@ -47,6 +71,116 @@ def calculate_credit_score(
     return round(score, 2)
 
 
+def _round_2(values: np.ndarray) -> np.ndarray:
+    """
+    Round to 2 decimals exactly like Python's round(x, 2).
+    np.round scales by 100 first and can round the wrong way (2.675 -> 2.68);
+    here the error of the scaling is recovered with a Dekker split so halfway
+    cases are decided on the exact value, ties going to even.
+    """
+    scaled = values * 100.0
+    split = 134217729.0 * values
+    high = split - (split - values)
+    low = values - high
+    error = (high * 100.0 - scaled) + low * 100.0
+    
+    rounded = np.rint(scaled)
+    half = scaled - rounded
+    rounded += (half == 0.5) & (error > 0)
+    rounded -= (half == -0.5) & (error < 0)
+    return rounded / 100.0
+
+
+def calculate_credit_scores(applicants: Union[pd.DataFrame, Mapping[str, Any]]) -> np.ndarray:
+    """
+    Vectorized calculate_credit_score for many applicants at once.
+    Takes a DataFrame (or mapping of columns) with renda_mensal, tipo_emprego,
+    despesas_fixas, num_dependentes and tem_dividas; returns a float array
+    matching the scalar function row by row.
+    """
+    df = applicants if isinstance(applicants, pd.DataFrame) else pd.DataFrame(applicants)
+    
+    renda = df['renda_mensal'].to_numpy(dtype=float)
+    despesas = df['despesas_fixas'].to_numpy(dtype=float)
+    invalid = (renda <= 0) | (despesas < 0)
+    
+    # Unknown employment types count as unemployed, unknown dependents as "3+"
+    peso_emprego = SCORE_WEIGHTS["peso_emprego"]
+    peso_dependentes = SCORE_WEIGHTS["peso_dependentes"]
+    employment_score = df['tipo_emprego'].map(peso_emprego).fillna(peso_emprego["desempregado"]).to_numpy(dtype=float)
+    dependents_score = df['num_dependentes'].map(peso_dependentes).fillna(peso_dependentes["3+"]).to_numpy(dtype=float)
+    
+    has_debt = df['tem_dividas'].astype(str).str.lower().isin(DEBT_YES_ANSWERS).to_numpy()
+    debt_score = np.where(has_debt, SCORE_WEIGHTS["peso_dividas"]["sim"], SCORE_WEIGHTS["peso_dividas"]["não"])
+    
+    with np.errstate(divide="ignore", invalid="ignore"):
+        income_ratio = np.minimum((renda / (despesas + 1)) * SCORE_WEIGHTS["peso_renda"], 1000)
+    
+    total_score = income_ratio + employment_score + dependents_score + debt_score
+    score = np.maximum(0, np.minimum(1000, total_score))
+    
+    return np.where(invalid, 0.0, _round_2(score))
+
+
+def _load_score_bands() -> Dict[str, Any]:
+    """Return the compiled score band table, reloading it if the file changed."""
+    with _score_bands_lock:
+        signature = get_file_signature(SCORE_LIMITE_CSV)
+        if (_score_bands["path"] != SCORE_LIMITE_CSV
+                or _score_bands["signature"] != signature):
+            df = read_csv(SCORE_LIMITE_CSV).sort_values('score_minimo')
+            for column in ("score_minimo", "score_maximo", "limite_minimo", "limite_maximo"):
+                _score_bands[column] = df[column].tolist()
+            _score_bands["path"] = SCORE_LIMITE_CSV
+            _score_bands["signature"] = signature
+        return _score_bands
+
+
+def _find_score_band(score: float) -> Optional[Tuple[float, float]]:
+    """Binary search the band containing `score`; raises if the table is unreadable."""
+    bands = _load_score_bands()
+    idx = bisect_right(bands["score_minimo"], score) - 1
+    if idx >= 0 and score <= bands["score_maximo"][idx]:
+        return bands["limite_minimo"][idx], bands["limite_maximo"][idx]
+    return None
+
+
+def get_score_band(score: float) -> Optional[Tuple[float, float]]:
+    """Get (limite_minimo, limite_maximo) allowed for a score."""
+    try:
+        return _find_score_band(score)
+    except Exception as e:
+        print(f"Error reading score limits: {e}")
+        return None
+
+
+def max_limit_for_score(score: float) -> Optional[float]:
+    """Get the maximum credit limit allowed for a score."""
+    band = get_score_band(score)
+    return band[1] if band else None
+
+
+def evaluate_credit_limit(client_score: float, novo_limite: float) -> Tuple[bool, str]:
+    """
+    Decide a limit request for an already loaded client score.
+    Returns (approved: bool, message: str)
+    """
+    try:
+        band = _find_score_band(client_score)
+    except Exception as e:
+        print(f"Error reading score limits: {e}")
+        return False, "Erro ao acessar tabela de limites de score."
+    
+    if band is None:
+        return False, "Seu score não permite este limite de crédito."
+    
+    limite_minimo, limite_maximo = band
+    if limite_minimo <= novo_limite <= limite_maximo:
+        return True, f"Crédito aprovado! Novo limite: R$ {novo_limite:.2f}"
+    
+    return False, f"Limite solicitado fora do permitido. Máximo para seu score: R$ {limite_maximo:.2f}"
+
+
 def check_credit_limit_approval(cpf: str, novo_limite: float) -> Tuple[bool, str]:
     """
     Check if the requested credit limit is approved based on client's score.
@@ -57,25 +191,92 @@ def check_credit_limit_approval(cpf: str, novo_limite: float) -> Tuple[bool, str
     if not cliente:
         return False, "Cliente não encontrado."
     
-    client_score = cliente.get('score', 0)
-    
-    # Get score limits table
-    score_limits = get_score_limits()
-    if score_limits is None:
-        return False, "Erro ao acessar tabela de limites de score."
-    
-    # Find applicable limit range
-    for _, row in score_limits.iterrows():
-        if row['score_minimo'] <= client_score <= row['score_maximo']:
-            limite_minimo = row['limite_minimo']
-            limite_maximo = row['limite_maximo']
+    return evaluate_credit_limit(cliente.get('score', 0), novo_limite)
+
+
+def evaluate_credit_limit_requests(
+    requests: Union[pd.DataFrame, Iterable[Tuple[str, float]]]
+) -> Optional[pd.DataFrame]:
+    """
+    Decide many limit requests in one vectorized pass.
+    Takes a DataFrame with cpf/novo_limite columns or (cpf, novo_limite) pairs.
+    Returns one row per request with score, limite_minimo, limite_maximo,
+    aprovado and motivo ("aprovado", "fora_da_faixa", "score_sem_faixa" or
+    "cliente_nao_encontrado").
+    """
+    try:
+        if isinstance(requests, pd.DataFrame):
+            batch = requests[['cpf', 'novo_limite']].reset_index(drop=True)
+        else:
+            batch = pd.DataFrame(list(requests), columns=['cpf', 'novo_limite'])
+        batch['cpf'] = batch['cpf'].astype(str)
+        batch['novo_limite'] = batch['novo_limite'].astype(float)
+        
+        clientes = get_clientes_frame()
+        if clientes is None:
+            return None
+        scores = clientes[['cpf', 'score']].drop_duplicates('cpf', keep='last')
+        result = batch.merge(scores, on='cpf', how='left')
+        
+        # Same bisect as _find_score_band, over the whole score column
+        bands = _load_score_bands()
+        score = result['score'].to_numpy(dtype=float)
+        novo_limite = result['novo_limite'].to_numpy()
+        found = ~np.isnan(score)
+        idx = np.searchsorted(np.asarray(bands["score_minimo"], dtype=float), score, side='right') - 1
+        safe_idx = np.clip(idx, 0, None)
+        in_band = found & (idx >= 0) & (score <= np.asarray(bands["score_maximo"], dtype=float)[safe_idx])
+        
+        limite_minimo = np.where(in_band, np.asarray(bands["limite_minimo"], dtype=float)[safe_idx], np.nan)
+        limite_maximo = np.where(in_band, np.asarray(bands["limite_maximo"], dtype=float)[safe_idx], np.nan)
+        aprovado = in_band & (limite_minimo <= novo_limite) & (novo_limite <= limite_maximo)
+        
+        result['limite_minimo'] = limite_minimo
+        result['limite_maximo'] = limite_maximo
+        result['aprovado'] = aprovado
+        result['motivo'] = np.select(
+            [aprovado, in_band, found],
+            ["aprovado", "fora_da_faixa", "score_sem_faixa"],
+            default="cliente_nao_encontrado"
+        )
+        return result
+    except Exception as e:
+        print(f"Error evaluating limit requests: {e}")
+        return None
+
+
+def review_pending_limit_requests(file_path: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """
+    Batch job: decide every pending request in the request log and
+    write the new statuses back in a single atomic rewrite. Appends wait
+    for the rewrite, so requests filed meanwhile are not lost.
+    Returns counts of approved and rejected requests.
+    """
+    try:
+        file_path = file_path or SOLICITACOES_CSV
+        with csv_rewrite_lock():
+            df = read_csv(file_path)
+            pending = df['status_pedido'] == "pendente"
+            if not pending.any():
+                return {"aprovado": 0, "rejeitado": 0}
             
-            if limite_minimo <= novo_limite <= limite_maximo:
-                return True, f"Crédito aprovado! Novo limite: R$ {novo_limite:.2f}"
-            else:
-                return False, f"Limite solicitado fora do permitido. Máximo para seu score: R$ {limite_maximo:.2f}"
-    
-    return False, "Seu score não permite este limite de crédito."
+            decisions = evaluate_credit_limit_requests(pd.DataFrame({
+                'cpf': df.loc[pending, 'cpf_cliente'],
+                'novo_limite': df.loc[pending, 'novo_limite_solicitado']
+            }))
+            if decisions is None:
+                return None
+            
+            aprovado = decisions['aprovado'].to_numpy()
+            df.loc[pending, 'status_pedido'] = np.where(aprovado, "aprovado", "rejeitado")
+            if not write_csv(file_path, df):
+                return None
+        
+        approved = int(aprovado.sum())
+        return {"aprovado": approved, "rejeitado": len(aprovado) - approved}
+    except Exception as e:
+        print(f"Error reviewing pending requests: {e}")
+        return None
 
 
 def update_score_in_database(cpf: str, new_score: float) -> Tuple[bool, str]:
@@ -8,6 +8,17 @@ LLM_PROVIDER = os.getenv("LLM_PROVIDER", "google")  # "openai" or "google"
 LLM_MODEL = os.getenv("LLM_MODEL", "gemini-1.5-flash")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))  # threads for blocking LLM calls
+# Cache for deterministic (classification) prompts; LLM_CACHE_PATH adds a SQLite tier
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2048"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))  # seconds
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "")
+# Prompt budget for text-only clients (src/utils/prompt_builder.py): the latest
+# PROMPT_WINDOW_MESSAGES chat turns verbatim, older ones summarized
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "8000"))
+PROMPT_WINDOW_MESSAGES = int(os.getenv("PROMPT_WINDOW_MESSAGES", "12"))
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "500"))
 
 # File Paths
 import sys
@@ -17,6 +28,42 @@ DATA_DIR = os.path.join(BASE_DIR, "src", "data")
 CLIENTES_CSV = os.path.join(DATA_DIR, "clientes.csv")
 SCORE_LIMITE_CSV = os.path.join(DATA_DIR, "score_limite.csv")
 SOLICITACOES_CSV = os.path.join(DATA_DIR, "solicitacoes_aumento_limite.csv")
+INTENT_TRAIN_CSV = os.path.join(DATA_DIR, "intent_train.csv")
+INTENT_TEST_CSV = os.path.join(DATA_DIR, "intent_test.csv")
+
+# fsync appended CSV rows every N writes (0 leaves flushing to the OS)
+CSV_FSYNC_EVERY = int(os.getenv("CSV_FSYNC_EVERY", "0"))
+
+# Exchange Rates
+EXCHANGE_API_URL = os.getenv("EXCHANGE_API_URL", "https://api.exchangerate-api.com/v4/latest/BRL")
+EXCHANGE_RATE_TTL = int(os.getenv("EXCHANGE_RATE_TTL", "300"))  # seconds
+EXCHANGE_HTTP_MAX_CONNECTIONS = int(os.getenv("EXCHANGE_HTTP_MAX_CONNECTIONS", "100"))
+EXCHANGE_HTTP_MAX_PER_HOST = int(os.getenv("EXCHANGE_HTTP_MAX_PER_HOST", "10"))
+EXCHANGE_HTTP_KEEPALIVE = int(os.getenv("EXCHANGE_HTTP_KEEPALIVE", "60"))  # seconds
+EXCHANGE_BREAKER_FAILURES = int(os.getenv("EXCHANGE_BREAKER_FAILURES", "3"))
+EXCHANGE_BREAKER_RESET = int(os.getenv("EXCHANGE_BREAKER_RESET", "30"))  # seconds
+# Started by SessionManager.warm_up (app startup), never by a lookup
+EXCHANGE_BACKGROUND_REFRESH = os.getenv("EXCHANGE_BACKGROUND_REFRESH", "true").lower() == "true"
+EXCHANGE_REFRESH_AHEAD = float(os.getenv("EXCHANGE_REFRESH_AHEAD", "0.8"))  # fraction of the TTL
+EXCHANGE_SNAPSHOT_PATH = os.getenv("EXCHANGE_SNAPSHOT_PATH", os.path.join(DATA_DIR, "cotacoes_snapshot.json"))
+
+# Intent Classification
+# Local tiers answer when at least this confident; below it the LLM decides
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join(DATA_DIR, "intent_model.npz"))
+
+# Sessions (src/session_manager.py)
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "50000"))
+SESSION_IDLE_TIMEOUT = int(os.getenv("SESSION_IDLE_TIMEOUT", "1800"))  # seconds
+SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "512"))
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", "60"))  # seconds
+
+# Conversation history: messages kept in memory per conversation; older ones
+# are appended to a JSON-lines transcript in HISTORY_TRANSCRIPT_DIR. Snapshots refer
+# to transcripts by file name, so workers sharing a session store need this
+# directory on shared storage too
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "200"))
+HISTORY_TRANSCRIPT_DIR = os.getenv("HISTORY_TRANSCRIPT_DIR", os.path.join(DATA_DIR, "transcripts"))
 
 # Authentication
 MAX_AUTH_ATTEMPTS = int(os.getenv("MAX_AUTH_ATTEMPTS", "3"))
@@ -27,6 +27,41 @@ MESSAGES = {
     "farewell": "Obrigado pela preferência no Banco Ágil. Até logo!"
 }
 
+# Intent routing rules, in priority order for ties. Keywords are matched as
+# whole words (plurals allowed), ignoring case and accents.
+INTENT_RULES = {
+    "ENCERRAMENTO": ["encerrar", "sair", "fim", "adeus", "tchau"],
+    "CREDITO": ["crédito", "limite", "aumento", "aumentar", "solicitação"],
+    "CAMBIO": ["câmbio", "cotação", "dólar", "euro", "moeda", "estrangeira"],
+    "ENTREVISTA": ["entrevista", "score", "análise financeira", "re-análise", "reanálise"]
+}
+
+# Words that cancel a keyword found a few words after them in the same clause
+# ("não quero sair ainda")
+NEGATION_WORDS = ["não", "nunca"]
+
+# Credit Agent requests answered without the LLM, in priority order for ties
+CREDIT_REQUEST_RULES = {
+    "AUMENTO": ["aumentar", "aumento", "subir", "elevar"],
+    "CONSULTA": ["limite", "consultar", "consulta", "disponível"]
+}
+
+# Answers to "Confirma a solicitação...?", matched on the first word, ignoring accents
+CONFIRMATION_YES_ANSWERS = ["sim", "s", "confirmo", "confirma", "isso", "pode", "ok", "yes"]
+CONFIRMATION_NO_ANSWERS = ["nao", "n", "cancelar", "cancela", "no"]
+
+# Currency gazetteer: ISO code -> names and symbols customers use. Names are
+# matched as whole words (plurals allowed), ignoring case and accents; the
+# longest alias wins, so "dólar canadense" is CAD rather than USD.
+CURRENCY_ALIASES = {
+    "USD": ["usd", "us$", "dólar", "dólar americano", "dólar dos estados unidos", "moeda americana"],
+    "EUR": ["eur", "€", "euro"],
+    "GBP": ["gbp", "£", "libra", "libra esterlina"],
+    "JPY": ["jpy", "¥", "iene", "yen", "iene japonês"],
+    "CAD": ["cad", "c$", "ca$", "dólar canadense", "dólar do canadá"],
+    "AUD": ["aud", "a$", "au$", "dólar australiano", "dólar da austrália"]
+}
+
 # Employment Types
 EMPLOYMENT_TYPES = ["formal", "autônomo", "desempregado"]
 
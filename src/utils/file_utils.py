@@ -0,0 +1,19 @@
+"""File helpers shared by the tools that rewrite data files atomically."""
+import os
+import shutil
+
+# Read once: querying the umask means setting it, which is not thread-safe
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def copy_file_mode(file_path: str, temp_path: str) -> None:
+    """
+    Give a temporary file the permissions of the file it is about to replace.
+    tempfile creates files readable only by their owner (0600); new targets get
+    the mode a plain open() would give them.
+    """
+    try:
+        shutil.copymode(file_path, temp_path)
+    except FileNotFoundError:
+        os.chmod(temp_path, 0o666 & ~_UMASK)
@@ -0,0 +1,169 @@
+"""Exact-match cache for deterministic LLM calls (classification prompts)."""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from src.utils.config import LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL, LLM_CACHE_PATH
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace and case so trivially different phrasings share an entry."""
+    return " ".join(prompt.split()).casefold()
+
+
+def make_cache_key(provider: str, model: str, temperature: float, prompt: str) -> str:
+    """Hash of (provider, model, temperature, normalized prompt)."""
+    payload = json.dumps([provider, model, temperature, normalize_prompt(prompt)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    LRU cache of LLM replies with a TTL and a memory cap.
+    With `disk_path`, entries are also kept in SQLite so they survive restarts.
+    """
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl: float = LLM_CACHE_TTL, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()  # key -> (reply, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk: Optional[sqlite3.Connection] = None
+        self.reset_stats()
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str) -> None:
+        try:
+            self._disk = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, reply TEXT, expires_at REAL)"
+            )
+            self._disk.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+        except sqlite3.Error as e:
+            print(f"Error opening LLM cache at {path}: {e}")
+            self._disk = None
+
+    @staticmethod
+    def _entry_size(key: str, reply: str) -> int:
+        return len(key) + len(reply.encode("utf-8"))
+
+    def _drop(self, key: str) -> None:
+        reply, _ = self._entries.pop(key)
+        self._bytes -= self._entry_size(key, reply)
+
+    def _store(self, key: str, reply: str, expires_at: float) -> None:
+        if key in self._entries:
+            self._drop(key)
+        size = self._entry_size(key, reply)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (reply, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _get_memory(self, key: str, now: float) -> Optional[str]:
+        """Reply from the in-memory tier, counting a hit. Caller holds _lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._drop(key)
+            self._stats["expirations"] += 1
+        return None
+
+    def _get_disk(self, key: str, now: float) -> Optional[str]:
+        """Reply from the SQLite tier (promoted to memory), counting the hit or miss."""
+        with self._lock:
+            row = self._disk.execute(
+                "SELECT reply, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                self._store(key, row[0], row[1])
+                self._stats["hits"] += 1
+                self._stats["disk_hits"] += 1
+                return row[0]
+            self._stats["misses"] += 1
+            return None
+
+    def _put_disk(self, key: str, reply: str, expires_at: float) -> None:
+        with self._lock:
+            try:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, reply, expires_at) VALUES (?, ?, ?)",
+                    (key, reply, expires_at)
+                )
+            except sqlite3.Error as e:
+                print(f"Error writing LLM cache: {e}")
+
+    def get(self, key: str) -> Optional[str]:
+        """Get a cached reply, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            reply = self._get_memory(key, now)
+            if reply is not None or self._disk is None:
+                self._stats["misses"] += reply is None
+                return reply
+        return self._get_disk(key, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() for coroutines: the memory tier is checked inline, the SQLite tier on the default executor."""
+        now = time.time()
+        with self._lock:
+            reply = self._get_memory(key, now)
+            if reply is not None or self._disk is None:
+                self._stats["misses"] += reply is None
+                return reply
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key, now)
+
+    def put(self, key: str, reply: str) -> None:
+        """Cache a reply for `ttl` seconds."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, reply, expires_at)
+        if self._disk is not None:
+            self._put_disk(key, reply, expires_at)
+
+    async def aput(self, key: str, reply: str) -> None:
+        """put() for coroutines: the SQLite write runs on the default executor."""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, reply, expires_at)
+        if self._disk is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._put_disk, key, reply, expires_at)
+
+    def clear(self) -> None:
+        """Drop every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM llm_cache")
+
+    def reset_stats(self) -> None:
+        """Reset hit/miss counters."""
+        self._stats = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expirations": 0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit rate, counters and current memory use."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+llm_cache = LLMResponseCache(disk_path=LLM_CACHE_PATH or None)
@@ -0,0 +1,203 @@
+"""Prompt assembly for text-only LLM clients (GoogleGeminiWrapper) under a token budget."""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from src.utils.config import PROMPT_MAX_TOKENS, PROMPT_WINDOW_MESSAGES, PROMPT_SUMMARY_TOKENS
+
+CHARS_PER_TOKEN = 4  # rough average for Portuguese and English text
+SUMMARY_LINE_CHARS = 160  # each older turn is condensed to at most this many characters
+SUMMARY_CACHE_ENTRIES = 1024
+SUMMARY_HEADER = "Summary of earlier conversation:"
+TRUNCATION_MARK = " [...] "
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), no tokenizer needed."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def format_message(message: BaseMessage) -> str:
+    """One prompt line for a message."""
+    if isinstance(message, HumanMessage):
+        return f"User: {message.content}"
+    if isinstance(message, AIMessage):
+        return f"Assistant: {message.content}"
+    return message.content
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten text to at most max_tokens, keeping its beginning and end."""
+    max_chars = max(0, max_tokens) * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= len(TRUNCATION_MARK):
+        return text[:max_chars]
+    keep = max_chars - len(TRUNCATION_MARK)
+    head = keep // 2
+    return text[:head] + TRUNCATION_MARK + text[len(text) - (keep - head):]
+
+
+def _fit_lines(lines: List[Tuple[int, str]], budget: int) -> Tuple[List[Tuple[int, str]], bool]:
+    """
+    Shorten lines so they cost at most `budget` tokens together (one extra per
+    line for the newline). Short lines are kept whole and the longest ones
+    share what is left equally. Returns the lines and whether any was cut.
+    """
+    costs = [estimate_tokens(line) + 1 for _, line in lines]
+    if sum(costs) <= budget:
+        return lines, False
+    fitted = list(lines)
+    remaining = budget
+    order = sorted(range(len(lines)), key=costs.__getitem__)
+    for done, index in enumerate(order):
+        share = max(0, remaining) // (len(order) - done)
+        if costs[index] > share:
+            position, line = lines[index]
+            fitted[index] = (position, truncate_to_tokens(line, share - 1))
+        remaining -= estimate_tokens(fitted[index][1]) + 1
+    return fitted, True
+
+
+def _summary_line(message: BaseMessage) -> str:
+    line = " ".join(format_message(message).split())
+    return line if len(line) <= SUMMARY_LINE_CHARS else line[:SUMMARY_LINE_CHARS - 3] + "..."
+
+
+class PromptBuilder:
+    """
+    Builds one prompt string per call. Instruction messages (neither user nor
+    assistant) are always kept, shortened only if they alone would not leave a
+    quarter of `max_tokens` for the latest chat turn; of the chat turns, the
+    latest `window_messages` that fit in `max_tokens` are sent verbatim and
+    older ones are condensed into a rolling summary of at most `summary_tokens`. Summaries are cached, so
+    repeated calls over the same history (retries, stream after invoke) reuse them.
+    """
+
+    def __init__(self, max_tokens: int = PROMPT_MAX_TOKENS, window_messages: int = PROMPT_WINDOW_MESSAGES,
+                 summary_tokens: int = PROMPT_SUMMARY_TOKENS):
+        self.max_tokens = max_tokens
+        self.window_messages = window_messages
+        self.summary_tokens = summary_tokens
+        self._summaries: "OrderedDict[bytes, str]" = OrderedDict()  # digest of summarized turns -> summary
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def _summarize(self, older: List[BaseMessage], max_tokens: int) -> str:
+        """
+        Rolling summary of `older`: the most recent turns that fit in
+        `summary_tokens`, condensed to one line each, after a count of the
+        turns dropped before them. Only those turns are read, so the cost does
+        not grow with the conversation.
+        """
+        max_chars = self.summary_tokens * CHARS_PER_TOKEN
+        recent: List[BaseMessage] = []
+        chars = 0
+        for message in reversed(older):
+            chars += min(len(message.content), SUMMARY_LINE_CHARS) + 12
+            if recent and chars > max_chars:
+                break
+            recent.append(message)
+        recent.reverse()
+        omitted = len(older) - len(recent)
+
+        digest = hashlib.blake2b(str(omitted).encode("utf-8"), digest_size=16)
+        for message in recent:
+            digest.update(f"\0{message.type}\0{message.content}".encode("utf-8"))
+        key = digest.digest()
+
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+                self._stats["summary_cache_hits"] += 1
+
+        if summary is None:
+            lines = [f"({omitted} earlier messages omitted)"] if omitted else []
+            lines.extend(_summary_line(message) for message in recent)
+            summary = truncate_to_tokens("\n".join(lines), self.summary_tokens)
+            with self._lock:
+                self._summaries[key] = summary
+                if len(self._summaries) > SUMMARY_CACHE_ENTRIES:
+                    self._summaries.popitem(last=False)
+        return truncate_to_tokens(summary, max_tokens)
+
+    def build(self, messages: List[BaseMessage]) -> str:
+        """Assemble the prompt for `messages`."""
+        return self.build_with_stats(messages)[0]
+
+    def build_with_stats(self, messages: List[BaseMessage]) -> Tuple[str, Dict[str, Any]]:
+        """
+        Assemble the prompt for `messages` and return it with its size (chars,
+        estimated tokens, summarized messages...). The builder is shared by
+        every session, so the size is returned per call rather than kept.
+        """
+        pinned: List[Tuple[int, str]] = []
+        chat: List[Tuple[int, BaseMessage]] = []
+        for position, message in enumerate(messages):
+            if isinstance(message, (HumanMessage, AIMessage)):
+                chat.append((position, message))
+            else:
+                pinned.append((position, format_message(message)))
+
+        # Instructions may not crowd out the latest turn entirely
+        latest_room = min(estimate_tokens(format_message(chat[-1][1])) + 1, self.max_tokens // 4) if chat else 0
+        pinned, truncated = _fit_lines(pinned, self.max_tokens - latest_room)
+
+        budget = self.max_tokens - sum(estimate_tokens(line) + 1 for _, line in pinned)
+        window: List[Tuple[int, str]] = []
+        if chat:
+            # Room is reserved for the summary only when there will be one
+            reserve = self.summary_tokens if len(chat) > self.window_messages else 0
+            for position, message in reversed(chat[-self.window_messages:]):
+                line = format_message(message)
+                cost = estimate_tokens(line) + 1
+                if cost > budget - reserve:
+                    if window:
+                        break
+                    # The latest message always goes, shortened if needed (the summary then gets no room)
+                    line = truncate_to_tokens(line, budget - 1)
+                    cost = estimate_tokens(line) + 1
+                    truncated = True
+                window.append((position, line))
+                budget -= cost
+            window.reverse()
+
+        older = [message for _, message in chat[:len(chat) - len(window)]]
+        lines = sorted(pinned + window)
+        prompt_lines = [line for _, line in lines]
+        if older and budget > estimate_tokens(SUMMARY_HEADER) + 2:
+            summary = self._summarize(older, budget - estimate_tokens(SUMMARY_HEADER) - 2)
+            # The summary goes right before the first verbatim chat turn
+            index = lines.index(window[0]) if window else len(lines)
+            prompt_lines[index:index] = [SUMMARY_HEADER, summary]
+
+        prompt = "\n".join(prompt_lines) + "\n"
+        stats = {
+            "chars": len(prompt),
+            "tokens": estimate_tokens(prompt),
+            "messages": len(messages),
+            "window_messages": len(window),
+            "summarized_messages": len(older),
+            "truncated": truncated,
+        }
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["total_tokens"] += stats["tokens"]
+            self._stats["max_tokens_sent"] = max(self._stats["max_tokens_sent"], stats["tokens"])
+            self._stats["summarized_calls"] += bool(older)
+            self._stats["truncated_calls"] += truncated
+        return prompt, stats
+
+    def reset_stats(self) -> None:
+        """Reset prompt size counters."""
+        self._stats = {"calls": 0, "total_tokens": 0, "max_tokens_sent": 0, "summarized_calls": 0,
+                       "truncated_calls": 0, "summary_cache_hits": 0}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prompt size counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_tokens"] = stats["total_tokens"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
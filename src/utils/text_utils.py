@@ -0,0 +1,86 @@
+"""Text normalization helpers."""
+import re
+import unicodedata
+from typing import List, Optional
+
+
+def fold_accents(text: str) -> str:
+    """Lowercase and strip accents ("Câmbio" -> "cambio")."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+AMOUNT_MULTIPLIERS = {"mil": 1_000, "k": 1_000, "mi": 1_000_000, "milhao": 1_000_000, "milhoes": 1_000_000}
+
+# "R$ 10.000,00", "10000", "10.5 mil", "10k": dots group thousands unless
+# followed by one or two digits, the comma is the decimal separator
+_AMOUNT_RE = re.compile(
+    r"(?<![\w.,])(?:r\$\s*)?(\d{1,3}(?:\.\d{3})+|\d+)(?:,(\d+)|\.(\d{1,2}))?(?![\d.,]\d)"
+    r"(?:\s*(mil|k|milhao|milhoes|mi)\b)?"
+)
+
+
+# Words after which a number is never money ("dia 15", "cartão final 4321")
+NON_AMOUNT_WORDS = {"dia", "final", "cpf", "cartao"}
+# A number after "para"/"de" is money when one of these words comes shortly before
+LIMIT_WORDS = {"limite", "aumentar", "aumento"}
+AMOUNT_PREPOSITIONS = {"para", "pra", "de"}
+# A number right after one of these words is the amount asked for ("quero 15.000")
+REQUEST_WORDS = {"quero", "solicito", "peco"}
+
+_WORD_RE = re.compile(r"[\w$]+")
+_PERCENT_RE = re.compile(r"\s*(?:%|por\s*cento\b)")
+_REAIS_RE = re.compile(r"\s*(?:reais|real)\b")
+_BARE_AMOUNT_RE = re.compile(r"\s*" + _AMOUNT_RE.pattern + r"\s*(?:reais)?\s*[.!]?\s*")
+
+
+def _match_value(match: "re.Match") -> float:
+    integer, comma_decimals, dot_decimals, multiplier = match.groups()
+    value = float(integer.replace(".", "") + "." + (comma_decimals or dot_decimals or "0"))
+    return value * AMOUNT_MULTIPLIERS.get(multiplier, 1)
+
+
+def extract_brl_amounts(text: str) -> List[float]:
+    """
+    Find the amounts of money in a message, in order of mention.
+    A number counts when it has an "R$" prefix, a mil/k multiplier or "reais"
+    after it, directly follows "quero"/"solicito"/"peço" ("quero 15.000"), or
+    follows "para"/"de" right after a limit word ("limite de 10.000",
+    "aumentar para 10000") or an earlier amount ("de 5 mil para 12.000").
+    Percentages and numbers after "dia", "final", "cpf" or "cartão"
+    never count.
+    """
+    folded = fold_accents(text)
+    amounts = []
+    for match in _AMOUNT_RE.finditer(folded):
+        previous_words = _WORD_RE.findall(folded[:match.start()])[-3:]
+        after = folded[match.end():]
+        if _PERCENT_RE.match(after) or (previous_words and previous_words[-1] in NON_AMOUNT_WORDS):
+            continue
+
+        is_money = (
+            match.group(0).startswith("r$")
+            or match.group(4) is not None
+            or _REAIS_RE.match(after) is not None
+            or (bool(previous_words) and previous_words[-1] in REQUEST_WORDS)
+            or (
+                bool(previous_words) and previous_words[-1] in AMOUNT_PREPOSITIONS
+                and (bool(amounts) or any(word in LIMIT_WORDS for word in previous_words[:-1]))
+            )
+        )
+        if is_money:
+            amounts.append(_match_value(match))
+    return amounts
+
+
+def parse_brl_amount(text: str) -> Optional[float]:
+    """
+    Get the amount a message asks for: its only amount of money, or the
+    message itself when it is just a number ("10000" answering "qual valor?").
+    None when there is no amount or several (the caller should ask which).
+    """
+    bare = _BARE_AMOUNT_RE.fullmatch(fold_accents(text))
+    if bare is not None:
+        return _match_value(_AMOUNT_RE.search(bare.group(0).strip()))
+    amounts = extract_brl_amounts(text)
+    return amounts[0] if len(amounts) == 1 else None
@@ -0,0 +1,16 @@
+"""Shared test fixtures."""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools import csv_tools
+
+
+@pytest.fixture
+def solicitacoes_tmp(tmp_path, monkeypatch):
+    """Point the limit request log at an empty temporary file."""
+    path = tmp_path / "solicitacoes_aumento_limite.csv"
+    monkeypatch.setattr(csv_tools, "SOLICITACOES_CSV", str(path))
+    return path
@@ -0,0 +1,86 @@
+"""Local stub of the exchangerate-api endpoint for offline tests.
+
+Run standalone with `python -m tests.fx_stub_server` and point
+EXCHANGE_API_URL at the printed URL.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+DEFAULT_RATES = {"BRL": 1.0, "USD": 0.2, "EUR": 0.18, "GBP": 0.16, "JPY": 30.0, "CAD": 0.27, "AUD": 0.3}
+
+
+class FxStubServer:
+    """Threaded HTTP server answering /v4/latest/BRL with a fixed rate table."""
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, delay: float = 0.0):
+        self.rates = dict(rates or DEFAULT_RATES)
+        self.delay = delay
+        self.status = 200
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v4/latest/BRL"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                body = json.dumps({"base": "BRL", "rates": stub.rates}).encode("utf-8")
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FxStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FxStubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    server = FxStubServer().start()
+    print(f"Serving stub rates at {server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
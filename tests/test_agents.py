@@ -1,24 +1,91 @@
 """Tests for Agent components."""
 import pytest
+import asyncio
+import time
+import threading
 import sys
 import os
 
 # Add src to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from src.agents.base_agent import GoogleGeminiWrapper, get_llm_client, stream_blocking_llm_call
+from src.agents import exchange_agent
+from src.agents.exchange_agent import ExchangeAgent
+from src.agents import agent_router
+from src.agents.agent_router import AgentRouter, AgentType, clear_shared_agents
+from src.agents.session_state import SessionState
+from src.tools.intent_tools import TieredIntentClassifier, intent_classifier, intent_matcher
+from src.agents import triage_agent
 from src.agents.triage_agent import TriageAgent
+from src.main import BancoAgilApp
+from src.session_manager import SESSION_BASE_BYTES, SessionManager
+from src.snapshot_store import FileSnapshotStore, SQLiteSnapshotStore
+from src.agents.credit_agent import CreditAgent
+from src.tools.csv_tools import read_csv
+from src.utils.constants import MESSAGES
+from src.utils.llm_cache import LLMResponseCache, llm_cache, make_cache_key
+from src.utils.prompt_builder import PromptBuilder, estimate_tokens, truncate_to_tokens
 from src.tools.auth_tools import validate_cpf_format, validate_date_format, authenticate_client
 
 
+@pytest.fixture(autouse=True)
+def fresh_shared_agents():
+    """Give every test its own shared agents, so swapped LLMs do not leak."""
+    clear_shared_agents()
+    yield
+    clear_shared_agents()
+
+
+@pytest.fixture(autouse=True)
+def empty_llm_cache():
+    """Start every test without cached LLM replies."""
+    llm_cache.clear()
+    llm_cache.reset_stats()
+    yield
+    llm_cache.clear()
+
+
+class FakeBlockingLLM:
+    """LLM stub whose invoke blocks like a real network call."""
+
+    def __init__(self, reply: str, delay: float = 0.2):
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        time.sleep(self.delay)
+        return type("Response", (), {"content": self.reply})()
+
+
+class FakeGenerativeModel:
+    """Stand-in for genai.GenerativeModel; stream mode yields three chunks 50 ms apart."""
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        if stream:
+            return self._stream()
+        time.sleep(0.2)
+        return type("Result", (), {"text": f"echo:{prompt.strip()}"})()
+
+    def _stream(self):
+        for text in ["Olá, ", "posso ", "ajudar."]:
+            time.sleep(0.05)
+            yield type("Chunk", (), {"text": text})()
+
+
 class TestTriageAgent:
     """Test Triage Agent functionality."""
     
     def test_triage_agent_initialization(self):
         """Test agent initialization."""
         agent = TriageAgent()
+        state = SessionState()
         assert agent.agent_name == "Agente de Triagem"
-        assert agent.authenticated is False
-        assert agent.auth_attempts == 0
+        assert agent.is_authenticated(state) is False
+        assert state.auth_attempts == 0
     
     def test_cpf_validation(self):
         """Test CPF format validation."""
@@ -65,14 +132,827 @@ class TestTriageAgent:
     def test_authentication_limits(self):
         """Test max attempts limit."""
         agent = TriageAgent()
-        assert agent.has_max_attempts_exceeded() is False
+        state = SessionState()
+        assert agent.has_max_attempts_exceeded(state) is False
         
         # Simulate failed attempts
         for _ in range(3):
-            agent.auth_attempts += 1
+            agent.authenticate_with_credentials("12345678900", "1990-05-15", state)
         
-        assert agent.has_max_attempts_exceeded() is True
+        assert agent.has_max_attempts_exceeded(state) is True
+        assert agent.has_max_attempts_exceeded(SessionState()) is False
+
+    def test_sessions_do_not_share_authentication(self):
+        """Test one agent serves two customers without mixing their state."""
+        agent = TriageAgent()
+        joao, maria = SessionState(), SessionState()
+
+        assert agent.authenticate_with_credentials("12345678901", "1990-05-15", joao)[0] is True
+        assert agent.authenticate_with_credentials("98765432100", "1990-01-01", maria)[0] is False
+        assert joao.authenticated and joao.auth_attempts == 0
+        assert not maria.authenticated and maria.auth_attempts == 1
+
+
+class TestTieredClassification:
+    """Test local-first intent classification in the Triage Agent."""
+
+    def test_rules_answer_without_llm(self):
+        """Test clear messages never reach the LLM."""
+        intent_classifier.reset_stats()
+        agent = TriageAgent()
+        agent.llm = FakeBlockingLLM("OUTRO", delay=0)
+        state = SessionState()
+
+        assert asyncio.run(agent.identify_next_agent("cotação do dólar", state)) == "ROUTE:CAMBIO"
+        assert asyncio.run(agent.identify_next_agent("quero aumentar meu limite", state)) == "ROUTE:CREDITO"
+        assert asyncio.run(agent.identify_next_agent("tchau", state)) == MESSAGES["farewell"]
+        assert agent.llm.calls == 0
+        assert state.get_context("classification_tier") == "rules"
+
+    def test_model_answers_what_rules_miss(self):
+        """Test the local model classifies messages without keywords."""
+        intent_classifier.reset_stats()
+        agent = TriageAgent()
+        agent.llm = FakeBlockingLLM("CREDITO", delay=0)
+        state = SessionState()
+
+        assert asyncio.run(agent.identify_next_agent("bom dia", state)) == "ROUTE:OUTRO"
+        assert state.get_context("classification_tier") == "model"
+        assert agent.llm.calls == 0
+
+    def test_ambiguous_messages_fall_back_to_llm(self, monkeypatch):
+        """Test low-confidence and unmatched messages are sent to the LLM by the rules tier."""
+        rules_only = TieredIntentClassifier([("rules", intent_matcher.match)])
+        monkeypatch.setattr(triage_agent, "intent_classifier", rules_only)
+        agent = TriageAgent()
+        agent.llm = FakeBlockingLLM("ENTREVISTA", delay=0)
+
+        # One credit and one interview keyword: 50% confidence
+        assert asyncio.run(agent.identify_next_agent("score e limite", SessionState())) == "ROUTE:ENTREVISTA"
+        assert asyncio.run(agent.identify_next_agent("bom dia", SessionState())) == "ROUTE:ENTREVISTA"
+        assert asyncio.run(agent.identify_next_agent("câmbio", SessionState())) == "ROUTE:CAMBIO"
+        assert agent.llm.calls == 2
+
+        stats = rules_only.get_stats()
+        assert stats["total"] == 3
+        assert stats["llm_calls_saved"] == 1
+        assert stats["tiers"]["rules"]["attempts"] == 3
+        assert stats["tiers"]["rules"]["hit_rate"] == pytest.approx(1 / 3)
+        assert stats["tiers"]["llm"]["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_messages_no_local_tier_knows_reach_llm(self):
+        """Test messages neither the rules nor the model are confident about are sent to the LLM."""
+        intent_classifier.reset_stats()
+        agent = TriageAgent()
+        agent.llm = FakeBlockingLLM("ENTREVISTA", delay=0)
+
+        assert asyncio.run(agent.identify_next_agent("asdf qwer", SessionState())) == "ROUTE:ENTREVISTA"
+        assert asyncio.run(agent.identify_next_agent("xyz", SessionState())) == "ROUTE:ENTREVISTA"
+        assert asyncio.run(agent.identify_next_agent("câmbio", SessionState())) == "ROUTE:CAMBIO"
+        assert agent.llm.calls == 2
+
+        stats = intent_classifier.get_stats()
+        assert stats["tiers"]["model"]["attempts"] == 2
+        assert stats["tiers"]["model"]["answered"] == 0
+
+
+class TestAgentRouter:
+    """Test Agent Router dispatch."""
+
+    def test_agents_built_on_first_dispatch(self):
+        """Test only the agents a conversation reaches are constructed."""
+        router = AgentRouter()
+        assert agent_router._shared_agents == {}
+
+        asyncio.run(router.handle_triage(""))
+        assert set(agent_router._shared_agents) == {AgentType.TRIAGE}
+        assert router.get_agent(AgentType.TRIAGE) is router.triage_agent
+
+    def test_reset_does_not_build_agents(self):
+        """Test logging out of an untouched router stays lazy."""
+        router = AgentRouter()
+        router.reset()
+        assert agent_router._shared_agents == {}
+
+    def test_sessions_share_agents_not_state(self):
+        """Test routers share agent instances but keep their own session state."""
+        first, second = AgentRouter(), AgentRouter()
+        assert first.credit_agent is second.credit_agent
+
+        first.authenticated_cpf = "12345678901"
+        assert second.authenticated_cpf is None
+        assert first.state.authenticated_cpf == "12345678901"
+
+    def test_bare_amount_continues_credit_request(self, solicitacoes_tmp):
+        """Test answering the Credit Agent's question with just an amount."""
+        router = AgentRouter()
+        router.authenticated_cpf = "12345678901"
+
+        assert "Qual novo limite" in asyncio.run(router.process_message("quero aumentar meu limite"))
+        assert "Confirma" in asyncio.run(router.process_message("10 mil"))
+        assert not solicitacoes_tmp.exists()
+        assert "aprovada" in asyncio.run(router.process_message("sim"))
+
+    def test_messages_without_keywords_classified(self):
+        """Test the router sends messages the keywords miss through the tiered classifier."""
+        router = AgentRouter()
+        router.authenticated_cpf = "12345678901"
+        router.triage_agent.llm = FakeBlockingLLM("ENTREVISTA", delay=0)
+
+        assert "Obrigado pela preferência" in asyncio.run(router.process_message("valeu, até mais"))
+        assert router.state.get_context("classification_tier") is None  # reset by the farewell
+
+        router.authenticated_cpf = "12345678901"
+        asyncio.run(router.process_message("asdf qwer"))
+        assert router.state.get_context("classification_tier") == "llm"
+        assert router.current_agent == AgentType.INTERVIEW
+
+    def test_negated_farewell_does_not_end_conversation(self):
+        """Test "não quero sair" is left to the classifier instead of ending the session."""
+        router = AgentRouter()
+        router.authenticated_cpf = "12345678901"
+        router.triage_agent.llm = FakeBlockingLLM("OUTRO", delay=0)
+
+        reply = asyncio.run(router.process_message("não quero sair ainda"))
+        assert "Obrigado pela preferência" not in reply
+        assert router.authenticated_cpf == "12345678901"
+        assert router.state.get_context("classification_tier") == "llm"
+
+    def test_interview_answers_stay_in_interview(self):
+        """Test a bare answer goes to the interview in progress, not the classifier."""
+        router = AgentRouter()
+        router.authenticated_cpf = "12345678901"
+        asyncio.run(router.process_message("quero fazer a entrevista"))
+
+        asyncio.run(router.process_message("5000"))
+        assert router.state.interview_step == 2
+        assert router.state.interview_data == {"renda_mensal": 5000.0}
+
+    def test_agent_llm_resolved_lazily(self):
+        """Test building an agent does not create an LLM client."""
+        agent = TriageAgent()
+        assert agent._llm is None
+        assert agent.llm is get_llm_client(*agent.llm_config)
+
+
+class TestLLMClients:
+    """Test the shared LLM client registry."""
+
+    def test_agents_share_one_client(self):
+        """Test agents with the same configuration reuse the same client."""
+        classifiers = [TriageAgent(), ExchangeAgent(), TriageAgent()]
+        assert all(agent.llm is classifiers[0].llm for agent in classifiers)
+        assert CreditAgent().llm is CreditAgent().llm is get_llm_client()
+
+    def test_clients_keyed_by_configuration(self):
+        """Test different temperatures or models get their own client."""
+        base = get_llm_client("google", "gemini-1.5-flash", 0.7)
+        assert get_llm_client("google", "gemini-1.5-flash", 0.7) is base
+        assert get_llm_client("google", "gemini-1.5-flash", 0.0) is not base
+        assert get_llm_client("google", "gemini-1.5-pro", 0.7) is not base
+
+
+class TestLLMCache:
+    """Test the exact-match LLM response cache."""
+
+    def test_key_normalizes_prompt(self):
+        """Test whitespace and case do not split entries, configuration does."""
+        key = make_cache_key("google", "gemini-1.5-flash", 0.7, "Cotação   do\nDÓLAR")
+        assert key == make_cache_key("google", "gemini-1.5-flash", 0.7, "cotação do dólar")
+        assert key != make_cache_key("google", "gemini-1.5-flash", 0.0, "cotação do dólar")
+        assert key != make_cache_key("openai", "gemini-1.5-flash", 0.7, "cotação do dólar")
+
+    def test_lru_ttl_and_memory_cap(self, monkeypatch):
+        """Test least recently used entries are evicted and expired ones dropped."""
+        cache = LLMResponseCache(max_entries=2, max_bytes=1000, ttl=60)
+        cache.put("a", "CAMBIO")
+        cache.put("b", "CREDITO")
+        assert cache.get("a") == "CAMBIO"
+        cache.put("c", "OUTRO")
+        assert cache.get("b") is None
+        assert cache.get("a") == "CAMBIO"
+
+        cache.put("big", "x" * 2000)
+        assert cache.get("big") is None
+        assert cache.get_stats()["bytes"] <= 1000
+
+        now = time.time()
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        assert cache.get("a") is None
+        stats = cache.get_stats()
+        assert stats["expirations"] == 1
+        assert stats["evictions"] == 1
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """Test replies persisted to SQLite are served by a new cache."""
+        path = str(tmp_path / "llm_cache.sqlite")
+        LLMResponseCache(disk_path=path).put("key", "CAMBIO")
+
+        restarted = LLMResponseCache(disk_path=path)
+        assert restarted.get("key") == "CAMBIO"
+        assert restarted.get_stats()["disk_hits"] == 1
+
+    def test_async_lookups_read_disk_off_the_loop(self, tmp_path, monkeypatch):
+        """Test aget/aput serve the memory tier inline and reach SQLite from the executor."""
+        cache = LLMResponseCache(disk_path=str(tmp_path / "llm_cache.sqlite"))
+        threads = []
+        original = cache._get_disk
+        monkeypatch.setattr(cache, "_get_disk", lambda *args: threads.append(threading.current_thread()) or original(*args))
+
+        async def scenario():
+            await cache.aput("key", "CAMBIO")
+            first = await cache.aget("key")
+            cache._entries.clear()
+            cache._bytes = 0
+            return first, await cache.aget("key"), await cache.aget("outra")
+
+        assert asyncio.run(scenario()) == ("CAMBIO", "CAMBIO", None)
+        assert len(threads) == 2 and threading.main_thread() not in threads
+        assert cache.get_stats()["disk_hits"] == 1
+
+    def test_classification_prompts_cached(self):
+        """Test repeated classifications reach the LLM once."""
+        intent_classifier.reset_stats()
+        agent = TriageAgent()
+        agent.llm = FakeBlockingLLM("ENTREVISTA", delay=0)
+
+        for message in ["asdf qwer", "ASDF   qwer", "asdf qwer"]:
+            assert asyncio.run(agent.identify_next_agent(message, SessionState())) == "ROUTE:ENTREVISTA"
+        assert agent.llm.calls == 1
+        assert llm_cache.get_stats()["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_invalid_classifications_not_cached(self):
+        """Test a reply outside the routing categories is not served again from the cache."""
+        intent_classifier.reset_stats()
+        agent = TriageAgent()
+        assert agent.llm_config[2] == 0.0
+        agent.llm = FakeBlockingLLM("Claro! A categoria é crédito.", delay=0)
+
+        for _ in range(2):
+            assert asyncio.run(agent.identify_next_agent("asdf qwer", SessionState())) == "ROUTE:OUTRO"
+        assert agent.llm.calls == 2
+        assert llm_cache.get_stats()["entries"] == 0
+
+    def test_free_form_replies_not_cached(self):
+        """Test call sites that do not opt in always reach the LLM."""
+        agent = CreditAgent()
+        cliente = {"nome": "Ana", "limite_credito": 5000.0, "score": 600}
+        agent.llm = FakeBlockingLLM("resposta livre", delay=0)
+
+        asyncio.run(agent.chat_with_llm("como funciona o crédito?", cliente))
+        asyncio.run(agent.chat_with_llm("como funciona o crédito?", cliente))
+        assert agent.llm.calls == 2
+
+
+class TestAsyncLLM:
+    """Test LLM calls do not block the event loop."""
+
+    def test_concurrent_sessions_overlap_llm_waits(self):
+        """Test four sessions waiting on a slow LLM run concurrently."""
+        agents = [TriageAgent() for _ in range(4)]
+        for agent in agents:
+            agent.llm = FakeBlockingLLM("OUTRO")
+
+        async def scenario():
+            start = time.perf_counter()
+            results = await asyncio.gather(*(agent.identify_next_agent("preciso de ajuda", SessionState()) for agent in agents))
+            return results, time.perf_counter() - start
+
+        results, elapsed = asyncio.run(scenario())
+        assert results == ["ROUTE:OUTRO"] * 4
+        assert all(agent.llm.calls == 1 for agent in agents)
+        assert elapsed < 0.5
+
+    def test_gemini_wrapper_ainvoke(self):
+        """Test the Gemini wrapper offloads generate_content."""
+        wrapper = GoogleGeminiWrapper(model="gemini-1.5-flash", api_key="test")
+        wrapper.model = FakeGenerativeModel()
+
+        async def scenario():
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(wrapper.ainvoke([HumanMessage(content=str(i))]) for i in range(3)))
+            return responses, time.perf_counter() - start
+
+        responses, elapsed = asyncio.run(scenario())
+        assert [r.content for r in responses] == ["echo:User: 0", "echo:User: 1", "echo:User: 2"]
+        assert elapsed < 0.5
+
+
+class TestPromptBuilder:
+    """Test prompt assembly under a token budget."""
+
+    @staticmethod
+    def long_chat(turns):
+        messages = [SystemMessage(content="Você é um atendente bancário.")]
+        for i in range(turns):
+            messages.append(HumanMessage(content=f"pergunta {i} sobre o meu limite de crédito"))
+            messages.append(AIMessage(content=f"resposta {i} com os detalhes do limite"))
+        return messages
+
+    def test_window_and_rolling_summary(self):
+        """Test older turns are summarized, instructions and recent turns kept verbatim."""
+        builder = PromptBuilder(max_tokens=400, window_messages=4, summary_tokens=80)
+        messages = self.long_chat(30)
+        prompt, stats = builder.build_with_stats(messages)
+
+        assert prompt.startswith("Você é um atendente bancário.\nSummary of earlier conversation:")
+        assert prompt.endswith("Assistant: resposta 29 com os detalhes do limite\n")
+        assert "pergunta 0 " not in prompt
+        assert stats["window_messages"] == 4 and stats["summarized_messages"] == 56
+        assert stats["tokens"] <= 400
+
+        assert builder.build(messages) == prompt
+        assert builder.get_stats()["summary_cache_hits"] == 1
+
+    def test_budget_truncates_latest_message(self):
+        """Test a message larger than the budget is shortened instead of overflowing."""
+        builder = PromptBuilder(max_tokens=100)
+        prompt, stats = builder.build_with_stats([HumanMessage(content="x" * 5000)])
+        assert estimate_tokens(prompt) <= 101
+        assert stats["truncated"]
+
+    def test_budget_holds_with_large_instructions(self):
+        """Test oversized instructions are shortened so the prompt fits and keeps part of the user's turn."""
+        builder = PromptBuilder(max_tokens=100)
+        prompt, stats = builder.build_with_stats([SystemMessage(content="s" * 800),
+                                                  HumanMessage(content="quero aumentar meu limite " * 20)])
+        assert estimate_tokens(prompt) <= 100
+        assert "User: quero aumentar meu limite" in prompt
+        assert stats["truncated"]
+
+        assert truncate_to_tokens("x" * 100, 1) == "xxxx"
+        assert all(len(truncate_to_tokens("x" * 100, n)) <= 4 * n for n in range(30))
+
+    def test_gemini_wrapper_reports_prompt_size(self):
+        """Test the wrapper sends the built prompt and returns its size with the response."""
+        wrapper = GoogleGeminiWrapper(model="gemini-1.5-flash", api_key="test")
+        wrapper.model = FakeGenerativeModel()
+        wrapper.prompt_builder = PromptBuilder(max_tokens=200, window_messages=2, summary_tokens=40)
+
+        response = wrapper.invoke(self.long_chat(50))
+        assert response.content.endswith("Assistant: resposta 49 com os detalhes do limite")
+        assert response.prompt_stats["messages"] == 101
+        assert response.prompt_stats["tokens"] <= 200
+
+
+class TestStreaming:
+    """Test streaming replies from the LLM to the app."""
+
+    def test_gemini_wrapper_astream(self):
+        """Test chunks arrive as they are generated, not after the whole reply."""
+        wrapper = GoogleGeminiWrapper(model="gemini-1.5-flash", api_key="test")
+        wrapper.model = FakeGenerativeModel()
+
+        async def scenario():
+            start = time.perf_counter()
+            arrivals = []
+            async for chunk in wrapper.astream([HumanMessage(content="oi")]):
+                arrivals.append((chunk, time.perf_counter() - start))
+            return arrivals
+
+        arrivals = asyncio.run(scenario())
+        assert [chunk for chunk, _ in arrivals] == ["Olá, ", "posso ", "ajudar."]
+        assert arrivals[0][1] < arrivals[-1][1] - 0.05
+
+    def test_producer_stops_when_consumer_leaves(self):
+        """Test closing the stream early stops the producer thread at the next chunk."""
+        produced = []
+
+        def slow_chunks():
+            for index in range(100):
+                time.sleep(0.01)
+                produced.append(index)
+                yield str(index)
+
+        async def scenario():
+            stream = stream_blocking_llm_call(slow_chunks)
+            first = await stream.__anext__()
+            await stream.aclose()
+            return first
+
+        assert asyncio.run(scenario()) == "0"
+        count = len(produced)
+        time.sleep(0.05)
+        assert len(produced) == count < 100
+
+    def test_app_streams_free_form_credit_chat(self):
+        """Test the app yields the Credit Agent's chunks and records the full reply."""
+        wrapper = GoogleGeminiWrapper(model="gemini-1.5-flash", api_key="test")
+        wrapper.model = FakeGenerativeModel()
+        app = BancoAgilApp()
+        app.is_active = True
+        app.router.authenticated_cpf = "12345678901"
+        app.router.credit_agent.llm = wrapper
+
+        async def collect():
+            return [chunk async for chunk in app.process_user_input_stream("como funciona o crédito?")]
+
+        assert asyncio.run(collect()) == ["Olá, ", "posso ", "ajudar."]
+        assert app.conversation_history[-1].content == "Olá, posso ajudar."
+
+    def test_local_replies_stream_whole(self):
+        """Test replies without LLM text arrive as one chunk."""
+        app = BancoAgilApp()
+        asyncio.run(app.start_conversation())
+
+        async def collect(message):
+            return [chunk async for chunk in app.process_user_input_stream(message)]
+
+        assert asyncio.run(collect("12345678901")) == [
+            "Agora, qual é a sua data de nascimento? (formato: YYYY-MM-DD, ex: 1990-05-15)"
+        ]
+        app.router.authenticated_cpf = "12345678901"
+        assert asyncio.run(collect("encerrar")) == [MESSAGES["farewell"]]
+        assert not app.is_conversation_active()
+
+
+class TestCreditAgent:
+    """Test Credit Agent limit increase pipeline."""
+
+    def test_limit_increase_approved(self, solicitacoes_tmp):
+        """Test an approved request is persisted once with its final status."""
+        agent = CreditAgent()
+        response = asyncio.run(agent.process_limit_increase_request("12345678901", 10000))
+        assert "aprovada" in response
+
+        df = read_csv(str(solicitacoes_tmp))
+        assert len(df) == 1
+        assert df.iloc[0]['status_pedido'] == "aprovado"
+
+    def test_limit_increase_rejected(self, solicitacoes_tmp):
+        """Test a request above the score band is rejected."""
+        agent = CreditAgent()
+        response = asyncio.run(agent.process_limit_increase_request("55544433322", 15000))
+        assert "Máximo para seu score: R$ 10000.00" in response
+
+        df = read_csv(str(solicitacoes_tmp))
+        assert list(df['status_pedido']) == ["rejeitado"]
+
+    def test_limit_increase_below_current(self, solicitacoes_tmp):
+        """Test nothing is persisted for an invalid amount."""
+        agent = CreditAgent()
+        response = asyncio.run(agent.process_limit_increase_request("12345678901", 4000))
+        assert "maior que o limite atual" in response
+        assert not solicitacoes_tmp.exists()
+
+    def test_amount_in_message_dispatches_increase(self, solicitacoes_tmp):
+        """Test "Quero aumentar para 10000" is confirmed and decided without the LLM."""
+        agent = CreditAgent()
+        agent.llm = FakeBlockingLLM("resposta livre", delay=0)
+
+        state = SessionState()
+        state.authenticated_cpf = "12345678901"
+
+        response = asyncio.run(agent.handle_request("Quero aumentar para R$ 10.000,00", state))
+        assert "Confirma a solicitação de aumento do seu limite para R$ 10000.00" in response
+        assert not solicitacoes_tmp.exists()
+
+        assert "aprovada" in asyncio.run(agent.handle_request("sim", state))
+        assert read_csv(str(solicitacoes_tmp)).iloc[0]['novo_limite_solicitado'] == 10000
+        assert agent.llm.calls == 0
+
+    def test_unclear_amounts_are_not_filed(self, solicitacoes_tmp):
+        """Test declined and ambiguous amounts never become a request."""
+        agent = CreditAgent()
+        agent.llm = FakeBlockingLLM("resposta livre", delay=0)
+
+        state = SessionState()
+        state.authenticated_cpf = "12345678901"
+
+        assert "Confirma" in asyncio.run(agent.handle_request("limite de 10.000 no cartão final 4321", state))
+        assert "não foi enviada" in asyncio.run(agent.handle_request("não", state))
+        response = asyncio.run(agent.handle_request("quero aumentar de 5 mil para 12.000", state))
+        assert "R$ 5000.00 ou R$ 12000.00" in response
+        assert not solicitacoes_tmp.exists()
+
+    def test_limit_query_from_template(self):
+        """Test plain limit questions and increases without an amount skip the LLM."""
+        agent = CreditAgent()
+        agent.llm = FakeBlockingLLM("resposta livre", delay=0)
+
+        state = SessionState()
+        state.authenticated_cpf = "12345678901"
+
+        assert "limite de crédito atual" in asyncio.run(agent.handle_request("qual meu limite?", state))
+        assert "Qual novo limite" in asyncio.run(agent.handle_request("quero aumentar meu limite", state))
+        assert agent.llm.calls == 0
+
+        assert asyncio.run(agent.handle_request("como funciona o crédito?", state)) == "resposta livre"
+        assert agent.llm.calls == 1
+
+
+@pytest.fixture
+def fake_rates(monkeypatch):
+    """Serve fixed quotes to the Exchange Agent, recording each lookup."""
+    lookups = []
+
+    async def fake_aget_multiple_rates(currencies):
+        lookups.append(list(currencies))
+        return {
+            currency: {"moeda": currency, "taxa": 0.2, "timestamp": "2024-01-01", "origem": "BRL"}
+            for currency in currencies
+        }
+
+    monkeypatch.setattr(exchange_agent, "aget_multiple_rates", fake_aget_multiple_rates)
+    return lookups
+
+
+class TestExchangeAgent:
+    """Test Exchange Agent currency resolution."""
+
+    def test_currency_resolved_without_llm(self, fake_rates):
+        """Test a named currency is quoted without asking the LLM."""
+        agent = ExchangeAgent()
+        agent.llm = FakeBlockingLLM("GBP", delay=0)
+
+        response = asyncio.run(agent.handle_request("quanto está o euro?"))
+        assert "1 BRL = 0.2000 EUR" in response
+        assert agent.llm.calls == 0
+
+    def test_several_currencies_in_one_message(self, fake_rates):
+        """Test every currency in a message is answered from one lookup."""
+        agent = ExchangeAgent()
+        agent.llm = FakeBlockingLLM("GBP", delay=0)
+
+        response = asyncio.run(agent.handle_request("dólar e euro"))
+        assert "• USD:" in response and "• EUR:" in response
+        assert fake_rates == [["USD", "EUR"]]
+        assert agent.llm.calls == 0
+
+    def test_llm_resolves_leftovers(self, fake_rates):
+        """Test messages without a known currency fall back to the LLM."""
+        agent = ExchangeAgent()
+        agent.llm = FakeBlockingLLM("GBP, NENHUMA", delay=0)
+
+        response = asyncio.run(agent.handle_request("a moeda da rainha"))
+        assert "GBP" in response
+        assert agent.llm.calls == 1
+
+class TestSessionManager:
+    """Test hosting many conversations in one process."""
+
+    def test_sessions_are_isolated(self):
+        """Test two sessions authenticate independently."""
+        manager = SessionManager()
+
+        async def scenario():
+            joao, _ = await manager.start_conversation()
+            maria, _ = await manager.start_conversation()
+            await manager.handle_message(joao, "12345678901")
+            await manager.handle_message(joao, "1990-05-15")
+            await manager.handle_message(maria, "98765432100")
+            return joao, maria
+
+        joao, maria = asyncio.run(scenario())
+        assert manager.get_app(joao).router.is_authenticated()
+        assert not manager.get_app(maria).router.is_authenticated()
+        assert asyncio.run(manager.handle_message("desconhecida", "oi")) is None
+
+    def test_messages_for_one_session_do_not_interleave(self, monkeypatch):
+        """Test the per-session lock serializes one session but not others."""
+        manager = SessionManager()
+        running = {"now": 0, "max": 0}
+
+        async def slow_reply(self, user_input):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.05)
+            running["now"] -= 1
+            return "ok"
+
+        monkeypatch.setattr(BancoAgilApp, "process_user_input", slow_reply)
+        first, second = manager.create_session(), manager.create_session()
+
+        async def burst(*session_ids):
+            await asyncio.gather(*(manager.handle_message(sid, "oi") for sid in session_ids))
+
+        asyncio.run(burst(first, first, first))
+        assert running["max"] == 1
+        asyncio.run(burst(first, second))
+        assert running["max"] == 2
+
+    def test_idle_sessions_evicted(self):
+        """Test sessions unused for longer than the idle timeout are dropped."""
+        manager = SessionManager(idle_timeout=60)
+        old, recent = manager.create_session(), manager.create_session()
+        manager._sessions[old].last_used -= 120
+
+        manager.evict_idle()
+        assert old not in manager and recent in manager
+        assert manager.get_stats()["evicted_idle"] == 1
+
+    def test_lru_eviction_under_limits(self):
+        """Test the least recently used session goes when the count or memory budget is exceeded."""
+        manager = SessionManager(max_sessions=2)
+        first, second = manager.create_session(), manager.create_session()
+        asyncio.run(manager.start_conversation(first))
+        third = manager.create_session()
+        assert list(manager._sessions) == [first, third]
+
+        manager = SessionManager(memory_budget=3 * 2048)
+        sessions = [manager.create_session() for _ in range(4)]
+        assert len(manager) == 3 and sessions[0] not in manager
+        assert manager.get_stats()["evicted_lru"] == 1
+
+    def test_session_size_follows_history(self):
+        """Test a session's accounted size shrinks again when its history is cleared."""
+        manager = SessionManager()
+        session_id, _ = asyncio.run(manager.start_conversation())
+        asyncio.run(manager.handle_message(session_id, "12345678901"))
+        assert manager.get_stats()["estimated_bytes"] > SESSION_BASE_BYTES
+
+        manager.get_app(session_id).reset()
+        asyncio.run(manager.handle_message(session_id, "oi"))
+        assert manager.get_stats()["estimated_bytes"] == SESSION_BASE_BYTES
+
+    def test_evicted_sessions_saved_off_the_loop(self, tmp_path):
+        """Test snapshots of evicted sessions are written outside the manager lock and the event loop."""
+        writes = []
+
+        class RecordingStore(FileSnapshotStore):
+            def save(self, session_id, snapshot, saved_at=None):
+                writes.append((threading.current_thread(), manager._lock.locked()))
+                super().save(session_id, snapshot, saved_at)
+
+        manager = SessionManager(max_sessions=1, store=RecordingStore(str(tmp_path)))
+
+        async def scenario():
+            first, _ = await manager.start_conversation()
+            await manager.start_conversation()
+            return first
+
+        first = asyncio.run(scenario())
+        assert writes == [(writes[0][0], False)]
+        assert writes[0][0] is not threading.main_thread()
+        assert manager.store.load(first) is not None
+
+    def test_restores_run_off_the_loop(self, tmp_path):
+        """Test coroutines restore and close sessions without store I/O on the event loop."""
+        loads = []
+
+        class RecordingStore(FileSnapshotStore):
+            def load(self, session_id, max_age=None):
+                loads.append(threading.current_thread())
+                return super().load(session_id, max_age)
+
+        manager = SessionManager(max_sessions=1, store=RecordingStore(str(tmp_path)))
+
+        async def scenario():
+            first, _ = await manager.start_conversation()
+            await manager.start_conversation()
+            await asyncio.sleep(0.1)  # the evicted session's snapshot is written meanwhile
+            await manager.handle_message(first, "12345678901")
+            return await manager.aclose_session(first)
+
+        assert asyncio.run(scenario())
+        assert loads and threading.main_thread() not in loads
+
+
+class TestSnapshots:
+    """Test saving and resuming conversations."""
+
+    def test_snapshot_round_trip(self):
+        """Test a restored app resumes the conversation where it stopped."""
+        app = BancoAgilApp()
+
+        async def scenario():
+            await app.start_conversation()
+            await app.process_user_input("12345678901")
+            await app.process_user_input("1990-05-15")
+
+        asyncio.run(scenario())
+        app.router.state.interview_step = 2
+        app.router.state.interview_data = {"renda_mensal": 5000.0}
+
+        restored = BancoAgilApp.restore(app.snapshot())
+        assert restored.router.is_authenticated()
+        assert restored.router.authenticated_cpf == app.router.authenticated_cpf
+        assert restored.router.current_agent == app.router.current_agent
+        assert restored.router.state.interview_data == {"renda_mensal": 5000.0}
+        assert restored.get_conversation_summary() == app.get_conversation_summary()
+        assert restored.snapshot() == app.snapshot()
+
+    def test_unknown_version_rejected(self):
+        """Test restoring a snapshot from another format version fails loudly."""
+        with pytest.raises(ValueError):
+            BancoAgilApp.restore(b'{"v": 999}')
+
+    def test_stores(self, tmp_path):
+        """Test file and SQLite stores save, load and delete snapshots."""
+        for store in (FileSnapshotStore(str(tmp_path / "sessions")), SQLiteSnapshotStore(str(tmp_path / "s.db"))):
+            assert store.load("abc") is None
+            store.save("abc", b"1")
+            store.save("abc", b"2")
+            assert store.load("abc") == b"2"
+            store.delete("abc")
+            assert store.load("abc") is None
+
+        with pytest.raises(ValueError):
+            FileSnapshotStore(str(tmp_path)).save("../fora", b"x")
+
+    def test_manager_restores_evicted_session(self, tmp_path):
+        """Test a session evicted under pressure is resumed from the store by one manager at a time."""
+        store = SQLiteSnapshotStore(str(tmp_path / "sessions.db"))
+        manager = SessionManager(max_sessions=1, idle_timeout=60, store=store)
+
+        async def login():
+            session_id, _ = await manager.start_conversation()
+            await manager.handle_message(session_id, "12345678901")
+            await manager.handle_message(session_id, "1990-05-15")
+            return session_id
+
+        session_id = asyncio.run(login())
+        manager.create_session()
+        assert session_id not in manager
+        assert store.load(session_id) is not None
+
+        assert manager.get_app(session_id).router.is_authenticated()
+        assert manager.get_stats()["restored"] == 1
+        assert store.load(session_id) is None
+
+        other = SessionManager(store=store)
+        assert other.get_app(session_id) is None
+        manager.close_session(session_id)
+        assert store.load(session_id) is None
+
+    def test_idle_sessions_and_old_snapshots_expire(self, tmp_path):
+        """Test idle eviction ends the session; expired snapshots are refused, then purged with their transcripts."""
+        for store in (FileSnapshotStore(str(tmp_path / "sessions")), SQLiteSnapshotStore(str(tmp_path / "s.db"))):
+            manager = SessionManager(idle_timeout=60, store=store)
+            session_id = manager.create_session()
+            manager._sessions[session_id].last_used -= 120
+            manager.evict_idle()
+            assert manager.get_app(session_id) is None
+
+            transcripts = tmp_path / f"transcripts-{type(store).__name__}"
+            manager.transcript_dir = str(transcripts)
+            old = BancoAgilApp(max_history=4, transcript_dir=str(transcripts))
+            for i in range(10):
+                old._add_to_history("user", f"mensagem {i}")
+            store.save("velha", old.snapshot(), saved_at=time.time() - 120)
+            store.save("antiga", b"x", saved_at=time.time() - 120)
+            assert manager.get_app("velha") is None
+            assert store.load("velha", max_age=60) is None
+            assert store.load("velha") is not None  # left for purge, which cleans up after it
+
+            assert manager.purge_expired() == 2
+            assert store.load("velha") is None and store.load("antiga") is None
+            assert os.listdir(transcripts) == []
+
+
+class TestConversationHistory:
+    """Test bounded conversation history."""
+
+    def test_old_messages_spill_to_transcript(self, tmp_path):
+        """Test the in-memory history is capped while the summary and export see every message."""
+        app = BancoAgilApp(max_history=8, transcript_dir=str(tmp_path))
+        for i in range(20):
+            app._add_to_history("user" if i % 2 == 0 else "assistant", f"mensagem {i}")
+
+        assert len(app.conversation_history) <= 8
+        assert app.conversation_history[-1].content == "mensagem 19"
+        summary = app.get_conversation_summary()
+        assert summary["total_messages"] == 20
+        assert summary["user_messages"] == 10 and summary["assistant_messages"] == 10
+        history = app.get_conversation_history()
+        assert [msg["content"] for msg in history] == [f"mensagem {i}" for i in range(20)]
+
+        restored = BancoAgilApp.restore(app.snapshot(), transcript_dir=str(tmp_path))
+        assert restored.get_conversation_summary() == summary
+        assert len(restored.get_conversation_history()) == 20
+
+        # Another host mounts the shared transcript directory elsewhere
+        moved = tmp_path / "elsewhere"
+        moved.mkdir()
+        os.replace(app.transcript_path, moved / os.path.basename(app.transcript_path))
+        restored = BancoAgilApp.restore(app.snapshot(), transcript_dir=str(moved))
+        assert len(restored.get_conversation_history()) == 20
+
+    def test_transcript_deleted_with_the_conversation(self, tmp_path):
+        """Test resetting the app or closing its session removes the spilled transcript."""
+        app = BancoAgilApp(max_history=4, transcript_dir=str(tmp_path))
+        for i in range(10):
+            app._add_to_history("user", f"mensagem {i}")
+        assert os.path.exists(app.transcript_path)
+        app.reset()
+        assert app.transcript_path is None and os.listdir(tmp_path) == []
+
+        manager = SessionManager()
+        session_id = manager.create_session()
+        app = manager.get_app(session_id)
+        app.transcript_dir = str(tmp_path)
+        app.max_history = 4
+        for i in range(10):
+            app._add_to_history("user", f"mensagem {i}")
+        assert os.listdir(tmp_path) != []
+        assert manager.close_session(session_id)
+        assert os.listdir(tmp_path) == []
 
+    def test_shared_agents_keep_no_history(self):
+        """Test shared agents hold no messages; history lives only in each session's app."""
+        agent = CreditAgent()
+        assert not hasattr(agent, "conversation_history")
+        assert not hasattr(agent, "add_message")
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -1,15 +1,63 @@
 """Tests for Tool components."""
 import pytest
+import asyncio
+import time
+import threading
 import sys
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
 
 # Add src to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.tools.auth_tools import validate_cpf_format, validate_date_format
-from src.tools.score_tools import calculate_credit_score
-from src.tools.csv_tools import get_cliente_by_cpf, read_csv
-from src.utils.config import CLIENTES_CSV
+from src.tools import score_tools
+from src.tools.score_tools import (
+    calculate_credit_score,
+    calculate_credit_scores,
+    check_credit_limit_approval,
+    evaluate_credit_limit_requests,
+    review_pending_limit_requests,
+    get_score_band,
+    max_limit_for_score
+)
+from src.tools import csv_tools, exchange_tools
+from src.tools.csv_tools import (
+    get_cliente_by_cpf,
+    read_csv,
+    update_cliente_score,
+    append_to_csv,
+    create_credit_limit_request,
+    update_credit_limit_request_status
+)
+from src.tools.intent_tools import IntentMatcher, intent_matcher
+from src.tools.intent_model import IntentModel, extract_ngrams, get_intent_model, load_labelled_csv
+from src.utils.config import CLIENTES_CSV, INTENT_TEST_CSV
+from src.utils.text_utils import fold_accents, extract_brl_amounts, parse_brl_amount
+from tests.fx_stub_server import FxStubServer
+
+
+@pytest.fixture(autouse=True)
+def isolated_rate_snapshot(tmp_path, monkeypatch):
+    """Keep rate snapshots out of src/data and stop any refresher a test started."""
+    monkeypatch.setattr(exchange_tools, "EXCHANGE_SNAPSHOT_PATH", str(tmp_path / "cotacoes_snapshot.json"))
+    exchange_tools.clear_rate_cache()
+    yield
+    exchange_tools.stop_rate_refresher()
+    exchange_tools.clear_rate_cache()
+
+
+@pytest.fixture
+def clientes_copy(tmp_path, monkeypatch):
+    """Point the client store at a temporary copy of clientes.csv."""
+    path = tmp_path / "clientes.csv"
+    shutil.copy(CLIENTES_CSV, path)
+    monkeypatch.setattr(csv_tools, "CLIENTES_CSV", str(path))
+    yield path
+    csv_tools.invalidate_clientes_index()
 
 
 class TestAuthTools:
@@ -26,6 +74,119 @@ class TestAuthTools:
         assert validate_date_format("invalid") is False
 
 
+class TestIntentTools:
+    """Test keyword intent matching."""
+
+    def test_fold_accents(self):
+        """Test accent and case folding."""
+        assert fold_accents("Câmbio CRÉDITO Cotação") == "cambio credito cotacao"
+
+    def test_accent_insensitive_matching(self):
+        """Test messages typed without accents still route."""
+        assert intent_matcher.match("qual meu limite de credito?") == ("CREDITO", 1.0)
+        assert intent_matcher.match("Quero ver o cambio") == ("CAMBIO", 1.0)
+        assert intent_matcher.match("cotacoes de hoje") == ("CAMBIO", 1.0)
+        assert intent_matcher.match("quanto estão os dólares?") == ("CAMBIO", 1.0)
+        assert intent_matcher.match("quero fazer a reanalise") == ("ENTREVISTA", 1.0)
+        assert intent_matcher.match("Tchau!") == ("ENCERRAMENTO", 1.0)
+
+    def test_whole_words_only(self):
+        """Test keywords inside other words do not match."""
+        assert intent_matcher.match("confirmar meu endereço") is None
+        assert intent_matcher.match("bom dia") is None
+
+    def test_ranked_with_confidence(self):
+        """Test mixed messages are ranked by rule order, confidence by share of hits."""
+        ranked = intent_matcher.rank("quero aumentar o limite, e o score?")
+        assert ranked == [("CREDITO", pytest.approx(2 / 3)), ("ENTREVISTA", pytest.approx(1 / 3))]
+        assert intent_matcher.match("score de crédito")[0] == "CREDITO"
+
+    def test_farewell_has_priority(self):
+        """Test a farewell wins even when other intents have more hits."""
+        assert intent_matcher.match("quero sair, não preciso mais do limite de crédito")[0] == "ENCERRAMENTO"
+
+    def test_negated_keywords_ignored(self):
+        """Test keywords shortly after a negation in the same clause do not match."""
+        assert intent_matcher.match("não quero sair ainda") is None
+        assert intent_matcher.match("nunca pedi aumento") is None
+        assert intent_matcher.match("não quero sair, qual a cotação do dólar?") == ("CAMBIO", 1.0)
+        assert intent_matcher.match("não, pode encerrar") == ("ENCERRAMENTO", 1.0)
+        assert intent_matcher.match("não sei se é melhor aumentar o limite")[0] == "CREDITO"
+
+    def test_rules_are_data_driven(self):
+        """Test a matcher compiled from custom rules."""
+        matcher = IntentMatcher({"PIX": ["pix", "transferência"], "CARTAO": ["cartão"]})
+        assert matcher.match("fazer uma transferencia via PIX") == ("PIX", 1.0)
+        assert matcher.match("cartoes") == ("CARTAO", 1.0)
+
+
+class TestAmountParsing:
+    """Test Brazilian amount parsing."""
+
+    def test_brazilian_formats(self):
+        """Test currency, thousands separators, decimals and multipliers."""
+        assert parse_brl_amount("R$ 10.000,00") == 10000
+        assert parse_brl_amount("Quero aumentar para 10000") == 10000
+        assert parse_brl_amount("10 mil") == 10000
+        assert parse_brl_amount("10k") == 10000
+        assert parse_brl_amount("R$1.500,50") == 1500.5
+        assert parse_brl_amount("2,5 mil reais") == 2500
+        assert parse_brl_amount("1 milhão") == 1000000
+        assert parse_brl_amount("quero 15.000") == 15000
+        assert parse_brl_amount("Solicito 8000 por favor") == 8000
+
+    def test_several_amounts_are_ambiguous(self):
+        """Test a message with more than one amount is not resolved to any of them."""
+        assert extract_brl_amounts("de 5 mil para 12.000") == [5000, 12000]
+        assert parse_brl_amount("de 5 mil para 12.000") is None
+        assert parse_brl_amount("quero saber meu limite") is None
+
+    def test_numbers_that_are_not_money(self):
+        """Test card digits, days, percentages and CPFs are not read as amounts."""
+        assert parse_brl_amount("quero limite de 10.000 no cartão final 4321") == 10000
+        assert parse_brl_amount("quero aumentar o limite para 10 mil até dia 15") == 10000
+        assert parse_brl_amount("aumentar em 50%") is None
+        assert extract_brl_amounts("meu cpf é 123.456.789-01") == []
+        assert extract_brl_amounts("tenho 2 cartões") == []
+
+
+class TestIntentModel:
+    """Test the local trained intent model."""
+
+    def test_extract_ngrams_folds_text(self):
+        """Test features ignore accents, case and specific digits."""
+        assert extract_ngrams("Câmbio 10") == extract_ngrams("cambio 99")
+        assert "w:cambio" in extract_ngrams("Câmbio")
+
+    def test_train_and_predict(self):
+        """Test a model trained on a few messages generalizes to variants."""
+        model = IntentModel.train(
+            ["cotação do dólar", "valor do euro", "meu limite", "aumentar limite do cartão"],
+            ["CAMBIO", "CAMBIO", "CREDITO", "CREDITO"]
+        )
+        assert model.labels == ["CAMBIO", "CREDITO"]
+        assert model.predict("cotacao do euro")[0] == "CAMBIO"
+        assert model.predict("limite do cartao")[0] == "CREDITO"
+        assert model.predict("?!") is None
+
+    def test_save_and_load(self, tmp_path):
+        """Test a saved model reloads with identical predictions."""
+        model = IntentModel.train(["tchau", "dólar"], ["ENCERRAMENTO", "CAMBIO"], epochs=50)
+        path = str(tmp_path / "model.npz")
+        model.save(path)
+
+        loaded = IntentModel.load(path)
+        assert loaded.labels == model.labels
+        np.testing.assert_allclose(loaded.predict_proba("tchau"), model.predict_proba("tchau"))
+
+    def test_shipped_model_held_out_accuracy(self):
+        """Test the shipped model on the held-out set."""
+        model = get_intent_model()
+        texts, labels = load_labelled_csv(INTENT_TEST_CSV)
+        correct = sum(model.predict(text)[0] == label for text, label in zip(texts, labels))
+        assert correct / len(texts) >= 0.9
+
+
 class TestScoreTools:
     """Test score calculation tools."""
     
@@ -75,6 +236,118 @@ class TestScoreTools:
         )
         assert 0 <= score <= 1000
 
+    def test_batch_scores_match_scalar(self):
+        """Test vectorized scoring matches the scalar function row by row."""
+        rows = pd.DataFrame({
+            'renda_mensal': [5000, 4000, 0, 5000, 2.675, 1234.56, 800, 3000, 9999.99, -10],
+            'tipo_emprego': ["formal", "autônomo", "desempregado", "formal", "outro", "formal", "autônomo", "desempregado", "formal", "formal"],
+            'despesas_fixas': [2000, 1500, 1000, 2000, 0, 333.3, 0, -1, 0.01, 100],
+            'num_dependentes': [1, 0, 2, 5, 3, 2, 0, 1, 4, 0],
+            'tem_dividas': ["não", "sim", "sim", "não", "S", "Yes", "n", "TRUE", "no", "sim"]
+        })
+        expected = [calculate_credit_score(**row) for row in rows.to_dict('records')]
+        
+        scores = calculate_credit_scores(rows)
+        assert isinstance(scores, np.ndarray)
+        assert scores.tolist() == expected
+        assert calculate_credit_scores(rows.to_dict('list')).tolist() == expected
+
+
+class TestScoreBands:
+    """Test score band lookups."""
+
+    def test_band_boundaries(self):
+        """Test scores on and between band boundaries."""
+        assert get_score_band(0) == (500, 1000)
+        assert get_score_band(300) == (500, 1000)
+        assert get_score_band(301) == (1000, 5000)
+        assert get_score_band(750) == (5000, 20000)
+        assert get_score_band(1000) == (10000, 50000)
+        assert get_score_band(300.5) is None
+        assert get_score_band(1001) is None
+        assert get_score_band(-1) is None
+
+    def test_max_limit_for_score(self):
+        """Test direct maximum limit lookup."""
+        assert max_limit_for_score(600) == 10000
+        assert max_limit_for_score(1200) is None
+
+    def test_check_credit_limit_approval(self):
+        """Test approval against the client's band."""
+        approved, _ = check_credit_limit_approval("12345678901", 20000)
+        assert approved is True
+        approved, message = check_credit_limit_approval("12345678901", 20001)
+        assert approved is False
+        assert "R$ 20000.00" in message
+        approved, message = check_credit_limit_approval("99999999999", 1000)
+        assert approved is False
+
+    def test_bulk_approval_matches_single(self):
+        """Test the bulk engine agrees with check_credit_limit_approval."""
+        pairs = [
+            ("12345678901", 20000), ("12345678901", 20001), ("55544433322", 1500),
+            ("55544433322", 8000), ("66677788899", 5000), ("99999999999", 1000)
+        ]
+        result = evaluate_credit_limit_requests(pairs)
+        assert list(result['cpf']) == [cpf for cpf, _ in pairs]
+        assert list(result['aprovado']) == [check_credit_limit_approval(cpf, limite)[0] for cpf, limite in pairs]
+        assert list(result['motivo']) == [
+            "aprovado", "fora_da_faixa", "fora_da_faixa",
+            "aprovado", "aprovado", "cliente_nao_encontrado"
+        ]
+        assert result['limite_maximo'].iloc[0] == 20000
+        assert np.isnan(result['limite_maximo'].iloc[-1])
+
+    def test_review_pending_limit_requests(self, tmp_path):
+        """Test the batch job decides only pending requests."""
+        path = tmp_path / "solicitacoes.csv"
+        pd.DataFrame({
+            'cpf_cliente': ["12345678901", "55544433322", "98765432100"],
+            'data_hora_solicitacao': ["2026-01-01T10:00:00"] * 3,
+            'limite_atual': [5000.0, 3000.0, 8000.0],
+            'novo_limite_solicitado': [15000.0, 20000.0, 60000.0],
+            'status_pedido': ["pendente", "pendente", "rejeitado"]
+        }).to_csv(path, index=False)
+
+        assert review_pending_limit_requests(str(path)) == {"aprovado": 1, "rejeitado": 1}
+        assert list(read_csv(str(path))['status_pedido']) == ["aprovado", "rejeitado", "rejeitado"]
+
+    def test_review_keeps_requests_appended_meanwhile(self, tmp_path, monkeypatch):
+        """Test a request filed while the batch job runs survives its rewrite."""
+        path = tmp_path / "solicitacoes.csv"
+        create = lambda cpf: append_to_csv(str(path), {
+            'cpf_cliente': cpf, 'data_hora_solicitacao': "2026-01-01T10:00:00",
+            'limite_atual': 5000.0, 'novo_limite_solicitado': 15000.0, 'status_pedido': "pendente"
+        })
+        create("12345678901")
+        evaluate = score_tools.evaluate_credit_limit_requests
+        writers = []
+
+        def evaluate_while_appending(requests):
+            writers.append(threading.Thread(target=create, args=("98765432100",)))
+            writers[0].start()
+            time.sleep(0.05)
+            return evaluate(requests)
+
+        monkeypatch.setattr(score_tools, "evaluate_credit_limit_requests", evaluate_while_appending)
+        assert review_pending_limit_requests(str(path)) == {"aprovado": 1, "rejeitado": 0}
+        writers[0].join()
+
+        df = read_csv(str(path))
+        assert list(df['cpf_cliente']) == ["12345678901", "98765432100"]
+        assert list(df['status_pedido']) == ["aprovado", "pendente"]
+
+    def test_bands_reload_when_file_changes(self, tmp_path, monkeypatch):
+        """Test edits to score_limite.csv are picked up."""
+        path = tmp_path / "score_limite.csv"
+        path.write_text("score_minimo,score_maximo,limite_minimo,limite_maximo\n0,1000,100,200\n", encoding="utf-8")
+        monkeypatch.setattr(score_tools, "SCORE_LIMITE_CSV", str(path))
+        assert max_limit_for_score(500) == 200
+
+        path.write_text("score_minimo,score_maximo,limite_minimo,limite_maximo\n501,1000,300,4000\n0,500,100,250\n", encoding="utf-8")
+        assert max_limit_for_score(500) == 250
+        assert max_limit_for_score(501) == 4000
+
 
 class TestCSVTools:
     """Test CSV tools."""
@@ -98,6 +371,428 @@ class TestCSVTools:
         assert 'cpf' in df.columns
         assert 'nome' in df.columns
 
+    def test_client_lookup_returns_copy(self):
+        """Test mutating a returned client does not touch the index."""
+        cliente = get_cliente_by_cpf("12345678901")
+        cliente['score'] = 0
+        assert get_cliente_by_cpf("12345678901").get('score') == 750
+
+    def test_update_score_goes_through_index(self, clientes_copy):
+        """Test score updates are visible to readers and persisted."""
+        assert get_cliente_by_cpf("55544433322").get('score') == 600
+        assert update_cliente_score("55544433322", 710.5) is True
+        assert get_cliente_by_cpf("55544433322").get('score') == 710.5
+
+        df = read_csv(str(clientes_copy))
+        assert df.loc[df['cpf'] == "55544433322", 'score'].iloc[0] == 710.5
+        assert list(df['cpf'])[0] == "12345678901"
+
+    def test_rewrite_keeps_file_mode(self, clientes_copy):
+        """Test atomic rewrites keep the permissions of the file they replace."""
+        os.chmod(clientes_copy, 0o644)
+        assert update_cliente_score("55544433322", 700) is True
+        assert os.stat(clientes_copy).st_mode & 0o777 == 0o644
+
+    def test_duplicate_cpf_keeps_first_row(self, clientes_copy):
+        """Test a CPF listed twice resolves to its first row and a score update keeps both rows."""
+        with open(clientes_copy, "a", encoding="utf-8") as f:
+            f.write("12345678901,1990-05-15,Cadastro Repetido,1.00,100\n")
+        assert get_cliente_by_cpf("12345678901").get('nome') == "João Silva"
+
+        rows = len(read_csv(str(clientes_copy)))
+        assert update_cliente_score("12345678901", 800) is True
+        df = read_csv(str(clientes_copy))
+        assert len(df) == rows
+        assert list(df.loc[df['cpf'] == "12345678901", 'score']) == [800, 800]
+
+    def test_update_score_unknown_client(self, clientes_copy):
+        """Test updating a non-existent client."""
+        assert update_cliente_score("99999999999", 500) is False
+
+    def test_index_reloads_when_file_changes(self, clientes_copy):
+        """Test external edits to clientes.csv are picked up."""
+        assert get_cliente_by_cpf("44455566677") is None
+        with open(clientes_copy, "a", encoding="utf-8") as f:
+            f.write("44455566677,2000-01-01,Novo Cliente,1500.00,420\n")
+        assert get_cliente_by_cpf("44455566677").get('nome') == "Novo Cliente"
+
+
+class TestCSVAppend:
+    """Test append-only CSV writes."""
+
+    def test_append_writes_header_once(self, tmp_path):
+        """Test header is written only for a new file."""
+        path = str(tmp_path / "log.csv")
+        assert append_to_csv(path, {'a': 1, 'b': 'x'}) is True
+        assert append_to_csv(path, {'a': 2, 'b': 'y'}) is True
+
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "a,b\n1,x\n2,y\n"
+
+    def test_append_keeps_existing_column_order(self, tmp_path):
+        """Test rows follow the header of an existing file."""
+        path = tmp_path / "log.csv"
+        path.write_text("b,a\ny,2", encoding="utf-8")
+        assert append_to_csv(str(path), {'a': 3, 'b': 'z, w'}, fsync_every=1) is True
+
+        df = read_csv(str(path))
+        assert list(df['b']) == ['y', 'z, w']
+        assert list(df['a']) == [2, 3]
+
+    def test_create_credit_limit_request_appends(self, solicitacoes_tmp):
+        """Test limit requests are appended to the request log."""
+        assert create_credit_limit_request("12345678901", 5000.0, 8000.0) is True
+        assert create_credit_limit_request("98765432100", 8000.0, 9000.0, status="aprovado") is True
+
+        df = read_csv(str(solicitacoes_tmp))
+        assert list(df['cpf_cliente']) == ["12345678901", "98765432100"]
+        assert list(df['status_pedido']) == ["pendente", "aprovado"]
+
+    def test_status_update_rewrites_last_row_in_place(self, solicitacoes_tmp):
+        """Test a pending request at the tail is updated without a rewrite."""
+        create_credit_limit_request("98765432100", 8000.0, 9000.0, status="aprovado")
+        create_credit_limit_request("12345678901", 5000.0, 8000.0)
+        before = solicitacoes_tmp.read_bytes()
+
+        assert update_credit_limit_request_status("12345678901", "rejeitado") is True
+        after = solicitacoes_tmp.read_bytes()
+        assert after.startswith(before[:before.rindex(b"12345678901")])
+
+        df = read_csv(str(solicitacoes_tmp))
+        assert list(df['status_pedido']) == ["aprovado", "rejeitado"]
+
+    def test_status_update_falls_back_to_rewrite(self, solicitacoes_tmp):
+        """Test older requests are still updated after later appends."""
+        create_credit_limit_request("12345678901", 5000.0, 8000.0)
+        create_credit_limit_request("98765432100", 8000.0, 9000.0)
+
+        assert update_credit_limit_request_status("12345678901", "aprovado") is True
+        df = read_csv(str(solicitacoes_tmp))
+        assert list(df['status_pedido']) == ["aprovado", "pendente"]
+
+        # Offsets are dropped after the rewrite; appends keep working
+        create_credit_limit_request("55544433322", 3000.0, 4000.0)
+        assert update_credit_limit_request_status("55544433322", "rejeitado") is True
+        df = read_csv(str(solicitacoes_tmp))
+        assert list(df['status_pedido']) == ["aprovado", "pendente", "rejeitado"]
+
+
+FAKE_RATES = {"BRL": 1.0, "USD": 0.2, "EUR": 0.18, "GBP": 0.16, "JPY": 30.0, "CAD": 0.27, "AUD": 0.3}
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response."""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def fake_rate_api(monkeypatch):
+    """Serve FAKE_RATES instead of calling exchangerate-api, counting calls."""
+    calls = []
+
+    def fake_get(url, timeout=None):
+        calls.append(url)
+        return FakeResponse({"base": "BRL", "rates": FAKE_RATES})
+
+    exchange_tools.clear_rate_cache()
+    monkeypatch.setattr(exchange_tools.requests, "get", fake_get)
+    yield calls
+    exchange_tools.clear_rate_cache()
+
+
+class TestExchangeTools:
+    """Test exchange rate tools."""
+
+    def test_single_fetch_serves_all_currencies(self, fake_rate_api):
+        """Test every supported currency comes from one download."""
+        for currency in ["USD", "EUR", "GBP", "JPY", "CAD", "AUD"]:
+            rate = exchange_tools.get_exchange_rate(currency)
+            assert rate["moeda"] == currency
+            assert rate["taxa"] == pytest.approx(1 / FAKE_RATES[currency])
+
+        assert len(fake_rate_api) == 1
+        assert exchange_tools.get_cache_stats() == {"hits": 5, "misses": 1}
+
+    def test_multiple_rates_single_fetch(self, fake_rate_api):
+        """Test get_multiple_rates uses one table."""
+        rates = exchange_tools.get_multiple_rates(["USD", "EUR", "XYZ"])
+        assert set(rates) == {"USD", "EUR"}
+        assert len(fake_rate_api) == 1
+
+    def test_extract_currencies(self):
+        """Test names, plurals, accents, codes and symbols resolve locally."""
+        assert exchange_tools.extract_currencies("quanto está o euro?") == ["EUR"]
+        assert exchange_tools.extract_currencies("dolares e EUROS") == ["USD", "EUR"]
+        assert exchange_tools.extract_currencies("US$ 100, € 20, £ 5 e ¥ 900") == ["USD", "EUR", "GBP", "JPY"]
+        assert exchange_tools.extract_currencies("dólares canadenses e dólar australiano") == ["CAD", "AUD"]
+        assert exchange_tools.extract_currencies("gbp ou libra esterlina?") == ["GBP"]
+
+    def test_extract_currencies_ignores_non_mentions(self):
+        """Test reais and words containing aliases are not currencies."""
+        assert exchange_tools.extract_currencies("R$ 100") == []
+        assert exchange_tools.extract_currencies("cadê a cotação?") == []
+
+    def test_rate_table_expires(self, fake_rate_api):
+        """Test the table is fetched again after the TTL."""
+        assert exchange_tools.get_rate_table(ttl=60) is not None
+        assert exchange_tools.get_rate_table(ttl=0, wait=True) is not None
+        assert len(fake_rate_api) == 2
+
+    def test_expired_table_served_while_revalidating(self, fake_rate_api, monkeypatch):
+        """Test an expired table is returned at once and refreshed in the background."""
+        assert exchange_tools.get_rate_table() is not None
+        first = exchange_tools.get_fx_health()["last_fetch"]
+
+        def slow_get(url, timeout=None):
+            time.sleep(0.3)
+            fake_rate_api.append(url)
+            return FakeResponse({"rates": dict(FAKE_RATES, USD=0.25)})
+
+        monkeypatch.setattr(exchange_tools.requests, "get", slow_get)
+        start = time.perf_counter()
+        table = exchange_tools.get_rate_table(ttl=0)
+        assert time.perf_counter() - start < 0.1
+        assert table["rates"]["USD"] == 0.2
+
+        deadline = time.time() + 2
+        while len(fake_rate_api) < 2 and time.time() < deadline:
+            time.sleep(0.02)
+        time.sleep(0.05)
+        assert exchange_tools.get_rate_table()["rates"]["USD"] == 0.25
+        assert exchange_tools.get_fx_health()["last_fetch"] != first
+
+    def test_cold_start_served_from_snapshot(self, fake_rate_api, monkeypatch):
+        """Test a restarted process answers from the on-disk snapshot."""
+        assert exchange_tools.get_exchange_rate("EUR") is not None
+        exchange_tools.clear_rate_cache()  # simulate a restart
+
+        def offline_get(url, timeout=None):
+            raise AssertionError("provider must not be called")
+
+        monkeypatch.setattr(exchange_tools.requests, "get", offline_get)
+        rate = exchange_tools.get_exchange_rate("EUR")
+        assert rate["taxa"] == pytest.approx(1 / FAKE_RATES["EUR"])
+        assert exchange_tools.get_cache_stats() == {"hits": 1, "misses": 0}
+
+    def test_background_refresher(self, fake_rate_api, monkeypatch):
+        """Test the refresher renews the table before it expires."""
+        monkeypatch.setattr(exchange_tools, "EXCHANGE_RATE_TTL", 0.5)
+        monkeypatch.setattr(exchange_tools, "EXCHANGE_REFRESH_AHEAD", 0.5)
+        exchange_tools.start_rate_refresher()
+        assert exchange_tools.get_fx_health()["refresher_running"] is True
+
+        time.sleep(0.65)
+        exchange_tools.stop_rate_refresher()
+        assert 2 <= len(fake_rate_api) <= 4
+        assert exchange_tools.get_fx_health()["refresher_running"] is False
+
+
+class TestExchangeResilience:
+    """Test request coalescing and the provider circuit breaker."""
+
+    def test_threads_share_one_fetch(self, monkeypatch):
+        """Test concurrent sync misses trigger one download."""
+        calls = []
+
+        def slow_get(url, timeout=None):
+            calls.append(url)
+            time.sleep(0.2)
+            return FakeResponse({"rates": FAKE_RATES})
+
+        exchange_tools.clear_rate_cache()
+        monkeypatch.setattr(exchange_tools.requests, "get", slow_get)
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: exchange_tools.get_exchange_rate("EUR"), range(8)))
+
+        assert len(calls) == 1
+        assert all(result["moeda"] == "EUR" for result in results)
+        exchange_tools.clear_rate_cache()
+
+    def test_breaker_opens_and_serves_last_good_table(self, monkeypatch):
+        """Test an unhealthy provider is skipped and stale rates are served."""
+        calls = []
+        healthy = {"up": True}
+
+        def flaky_get(url, timeout=None):
+            calls.append(url)
+            if not healthy["up"]:
+                raise exchange_tools.requests.exceptions.ConnectionError("down")
+            return FakeResponse({"rates": FAKE_RATES})
+
+        exchange_tools.clear_rate_cache()
+        monkeypatch.setattr(exchange_tools.requests, "get", flaky_get)
+        monkeypatch.setattr(exchange_tools.circuit_breaker, "failure_threshold", 2)
+        monkeypatch.setattr(exchange_tools.circuit_breaker, "reset_timeout", 60)
+
+        assert exchange_tools.get_rate_table(ttl=0, wait=True) is not None
+        healthy["up"] = False
+        for _ in range(5):
+            table = exchange_tools.get_rate_table(ttl=0, wait=True)
+            assert table["rates"]["USD"] == 0.2
+
+        # Two failures open the breaker; the rest never reach the provider
+        assert len(calls) == 3
+        health = exchange_tools.get_fx_health()
+        assert health["breaker"]["state"] == "open"
+        assert health["failures"] == 2
+        assert health["short_circuited"] == 3
+        assert health["stale_served"] == 5
+
+        # After the reset timeout a single probe closes the breaker again
+        healthy["up"] = True
+        monkeypatch.setattr(exchange_tools.circuit_breaker, "reset_timeout", 0)
+        assert exchange_tools.get_rate_table(ttl=0, wait=True) is not None
+        assert len(calls) == 4
+        assert exchange_tools.get_fx_health()["breaker"]["state"] == "closed"
+        exchange_tools.clear_rate_cache()
+
+    def test_breaker_half_open_allows_one_probe(self):
+        """Test only one caller probes a recovering provider."""
+        breaker = exchange_tools.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.state == "half_open"
+        assert breaker.allow_request() is True
+        assert breaker.allow_request() is False
+        breaker.record_failure()
+        assert breaker.get_stats()["times_opened"] == 2
+
+
+@pytest.fixture
+def fx_stub(monkeypatch):
+    """Point the rate API at a local stub server."""
+    with FxStubServer() as server:
+        monkeypatch.setattr(exchange_tools, "EXCHANGE_API_URL", server.url)
+        exchange_tools.clear_rate_cache()
+        yield server
+    exchange_tools.clear_rate_cache()
+
+
+class TestAsyncExchangeTools:
+    """Test the pooled async rate client against the local stub."""
+
+    def test_async_quote(self, fx_stub):
+        """Test an async quote and cached follow-ups."""
+        async def scenario():
+            usd = await exchange_tools.aget_exchange_rate("USD")
+            rates = await exchange_tools.aget_multiple_rates(["EUR", "JPY"])
+            await exchange_tools.close_http_session()
+            return usd, rates
+
+        usd, rates = asyncio.run(scenario())
+        assert usd["taxa"] == pytest.approx(5.0)
+        assert set(rates) == {"EUR", "JPY"}
+        assert fx_stub.requests == 1
+
+    def test_connections_are_reused(self, fx_stub):
+        """Test sequential fetches share one keep-alive connection."""
+        async def scenario():
+            for _ in range(5):
+                assert await exchange_tools.aget_rate_table(ttl=0, wait=True) is not None
+            await exchange_tools.close_http_session()
+
+        asyncio.run(scenario())
+        assert fx_stub.requests == 5
+        assert fx_stub.connections == 1
+
+    def test_session_closed_with_its_loop(self, fx_stub):
+        """Test one event loop per message (Streamlit) does not leak HTTP sessions."""
+        sessions = []
+
+        async def fetch():
+            assert await exchange_tools.afetch_rate_table() is not None
+            sessions.append(exchange_tools._http_session["session"])
+
+        asyncio.run(fetch())
+        assert sessions[0].closed
+        asyncio.run(fetch())
+        assert sessions[1] is not sessions[0] and sessions[1].closed
+
+    def test_concurrent_misses_share_one_fetch(self, fx_stub):
+        """Test concurrent quotes coalesce into a single provider call."""
+        fx_stub.delay = 0.2
+
+        async def scenario():
+            start = time.perf_counter()
+            tables = await asyncio.gather(*(exchange_tools.aget_rate_table() for _ in range(8)))
+            elapsed = time.perf_counter() - start
+            await exchange_tools.close_http_session()
+            return tables, elapsed
+
+        tables, elapsed = asyncio.run(scenario())
+        assert all(table is not None for table in tables)
+        assert elapsed < 0.6
+        assert fx_stub.requests == 1
+        assert exchange_tools.get_fx_health()["coalesced"] == 7
+
+    def test_parallel_fetches_overlap(self, fx_stub, monkeypatch):
+        """Test independent slow fetches do not block the event loop."""
+        fx_stub.delay = 0.2
+        monkeypatch.setattr(exchange_tools, "EXCHANGE_HTTP_MAX_PER_HOST", 4)
+
+        async def ticker():
+            ticks = 0
+            for _ in range(10):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            return ticks
+
+        async def scenario():
+            start = time.perf_counter()
+            table, ticks = await asyncio.gather(exchange_tools.afetch_rate_table(), ticker())
+            elapsed = time.perf_counter() - start
+            await exchange_tools.close_http_session()
+            return table, ticks, elapsed
+
+        table, ticks, elapsed = asyncio.run(scenario())
+        assert table["USD"] == 0.2
+        assert ticks == 10
+        assert elapsed < 0.4
+
+    def test_async_revalidation_uses_pooled_client(self, fx_stub, tmp_path, monkeypatch):
+        """Test stale tables are revalidated on the loop through aiohttp, not a requests thread."""
+        def no_sync_fetch(url, timeout=None):
+            raise AssertionError("sync client must not be used")
+
+        monkeypatch.setattr(exchange_tools.requests, "get", no_sync_fetch)
+
+        async def scenario():
+            assert await exchange_tools.aget_rate_table() is not None
+            fx_stub.rates["USD"] = 0.25
+            stale = await exchange_tools.aget_rate_table(ttl=0)
+            await asyncio.gather(*exchange_tools._revalidation_tasks)
+            fresh = await exchange_tools.aget_rate_table()
+            return stale, fresh
+
+        stale, fresh = asyncio.run(scenario())
+        assert stale["rates"]["USD"] == 0.2 and fresh["rates"]["USD"] == 0.25
+        assert fx_stub.requests == 2
+        assert not any(thread.name == "fx-revalidate" for thread in threading.enumerate())
+        assert [path.name for path in tmp_path.iterdir()] == ["cotacoes_snapshot.json"]
+
+    def test_lookups_do_not_start_refresher(self, fx_stub):
+        """Test the refresher thread is only started explicitly, at app startup."""
+        assert exchange_tools.get_rate_table() is not None
+        assert exchange_tools.get_fx_health()["refresher_running"] is False
+
+    def test_provider_error_returns_none(self, fx_stub):
+        """Test HTTP errors are reported as a missing quote."""
+        fx_stub.status = 503
+
+        async def scenario():
+            rate = await exchange_tools.aget_exchange_rate("USD")
+            await exchange_tools.close_http_session()
+            return rate
+
+        assert asyncio.run(scenario()) is None
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
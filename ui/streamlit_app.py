@@ -1,13 +1,63 @@
 """Streamlit UI for Banco Ágil."""
 import streamlit as st
 import asyncio
+import threading
 import sys
 import os
 
 # Add src to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.main import BancoAgilApp
+from src.session_manager import SessionManager
+
+
+@st.cache_resource
+def get_session_manager() -> SessionManager:
+    """One manager per server process, shared by every browser session."""
+    manager = SessionManager()
+    manager.warm_up()
+    # Idle sessions expire on schedule, not only when the app is next used
+    get_event_loop().call_soon_threadsafe(manager.start_sweeper)
+    return manager
+
+
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    One event loop for the server process, run in a background thread.
+    Streamlit runs each script in its own thread; sending every coroutine to
+    this loop keeps the pooled exchange HTTP client (bound to its loop) alive
+    across messages instead of rebuilding it for each one.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="banco-agil-loop", daemon=True).start()
+    return loop
+
+
+def run_async(coro):
+    """Run a coroutine on the app's event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+async def _next_chunk(stream):
+    """Next chunk of an async stream, or None when it is exhausted."""
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+def stream_response(manager: SessionManager, session_id: str, prompt: str):
+    """Drive the session's async response stream from Streamlit's synchronous script."""
+    stream = manager.stream_message(session_id, prompt)
+    try:
+        while True:
+            chunk = run_async(_next_chunk(stream))
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        run_async(stream.aclose())
 
 
 # Page configuration
@@ -43,14 +93,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
-if "app" not in st.session_state:
-    st.session_state.app = BancoAgilApp()
+manager = get_session_manager()
+
+# New visitor, or the conversation was evicted after being idle
+if "session_id" not in st.session_state or manager.get_app(st.session_state.session_id) is None:
+    st.session_state.session_id = manager.create_session()
     st.session_state.messages = []
     st.session_state.conversation_started = False
-
-if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
+app = manager.get_app(st.session_state.session_id)
+
 # Header
 st.title("🏦 Banco Ágil")
 st.subheader("Sistema de Atendimento Inteligente ao Cliente")
@@ -62,9 +115,9 @@ with st.sidebar:
     if st.session_state.conversation_started:
         st.info(f"✅ Status: Conversa ativa")
         
-        if st.session_state.app.router.is_authenticated():
+        if app.router.is_authenticated():
             st.success(f"🔐 Autenticado")
-            cpf = st.session_state.app.router.get_authenticated_cpf()
+            cpf = app.router.get_authenticated_cpf()
             st.text(f"CPF: {cpf}")
         else:
             st.warning("🔓 Não autenticado")
@@ -75,7 +128,7 @@ with st.sidebar:
     
     # Statistics
     if st.session_state.chat_history:
-        summary = st.session_state.app.get_conversation_summary()
+        summary = app.get_conversation_summary()
         st.subheader("Estatísticas")
         col1, col2 = st.columns(2)
         with col1:
@@ -89,14 +142,14 @@ with st.sidebar:
     col1, col2 = st.columns(2)
     with col1:
         if st.button("🔄 Nova Conversa", use_container_width=True):
-            st.session_state.app.reset()
+            app.reset()
             st.session_state.conversation_started = False
             st.session_state.chat_history = []
             st.rerun()
     
     with col2:
         if st.button("📥 Exportar Log", use_container_width=True):
-            history = st.session_state.app.get_conversation_history()
+            history = app.get_conversation_history()
             st.download_button(
                 label="Baixar",
                 data=str(history),
@@ -134,14 +187,17 @@ if st.session_state.conversation_started:
             message_placeholder.markdown("⏳ Processando...")
             
             try:
-                # Run async function
-                response = asyncio.run(st.session_state.app.process_user_input(prompt))
+                # Render chunks as the agent streams them
+                response = ""
+                for chunk in stream_response(manager, st.session_state.session_id, prompt):
+                    response += chunk
+                    message_placeholder.markdown(response + "▌")
                 
                 message_placeholder.markdown(response)
                 st.session_state.chat_history.append({"role": "assistant", "content": response})
                 
                 # Check if conversation ended
-                if not st.session_state.app.is_conversation_active():
+                if not app.is_conversation_active():
                     st.info("Conversa encerrada. Clique em 'Nova Conversa' para começar novamente.")
                 
             except Exception as e:
@@ -155,7 +211,7 @@ else:
         if st.button("▶️ Iniciar Conversa", use_container_width=True, type="primary"):
             try:
                 # Start conversation
-                greeting = asyncio.run(st.session_state.app.start_conversation())
+                greeting = run_async(manager.start_conversation(st.session_state.session_id))[1]
                 
                 st.session_state.conversation_started = True
                 st.session_state.chat_history = [